@@ -0,0 +1,100 @@
+"""Baseline: customers, suppliers, invoices, invoice items and forecasts
+
+The schema as the application built it before migrations were introduced
+(create_tables() on startup). Databases created that way already match it:
+mark them with `alembic stamp 0001` once, then `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _party_table(name: str):
+    """customers and suppliers share their columns"""
+    op.create_table(
+        name,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("tax_id", sa.String(50), nullable=True),
+        sa.Column("address", sa.Text(), nullable=True),
+        sa.Column("phone", sa.String(50), nullable=True),
+        sa.Column("email", sa.String(255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(f"ix_{name}_id", name, ["id"])
+    op.create_index(f"ix_{name}_name", name, ["name"])
+    op.create_index(f"ix_{name}_tax_id", name, ["tax_id"])
+
+
+def upgrade():
+    _party_table("customers")
+    _party_table("suppliers")
+
+    op.create_table(
+        "invoices",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_number", sa.String(100), nullable=False),
+        sa.Column("issue_date", sa.Date(), nullable=False),
+        sa.Column("due_date", sa.Date(), nullable=True),
+        sa.Column("subtotal", sa.Float(), nullable=False),
+        sa.Column("tax", sa.Float(), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("customer_id", sa.Integer(), sa.ForeignKey("customers.id"), nullable=False),
+        sa.Column("supplier_id", sa.Integer(), sa.ForeignKey("suppliers.id"), nullable=False),
+        sa.Column("image_path", sa.String(500), nullable=True),
+        sa.Column("raw_text", sa.Text(), nullable=True),
+        sa.Column("ocr_confidence", sa.Float(), nullable=True),
+        sa.Column("extraction_status", sa.String(50), nullable=True),
+        sa.Column("status", sa.String(50), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_invoices_id", "invoices", ["id"])
+    op.create_index("ix_invoices_invoice_number", "invoices", ["invoice_number"])
+    op.create_index("ix_invoices_issue_date", "invoices", ["issue_date"])
+
+    op.create_table(
+        "invoice_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("invoices.id"), nullable=False),
+        sa.Column("description", sa.String(500), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=True),
+        sa.Column("unit_price", sa.Float(), nullable=True),
+        sa.Column("discount", sa.Float(), nullable=True),
+        sa.Column("tax_rate", sa.Float(), nullable=True),
+        sa.Column("tax_amount", sa.Float(), nullable=True),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_invoice_items_id", "invoice_items", ["id"])
+
+    op.create_table(
+        "forecasts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("predicted_payment_date", sa.Date(), nullable=False),
+        sa.Column("confidence_score", sa.Float(), nullable=True),
+        sa.Column("prediction_method", sa.String(100), nullable=True),
+        sa.Column("risk_score", sa.Float(), nullable=True),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_forecasts_id", "forecasts", ["id"])
+    op.create_index("ix_forecasts_predicted_payment_date", "forecasts", ["predicted_payment_date"])
+
+
+def downgrade():
+    for table in ("forecasts", "invoice_items", "invoices", "suppliers", "customers"):
+        op.drop_table(table)
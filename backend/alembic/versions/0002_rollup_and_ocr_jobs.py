@@ -0,0 +1,62 @@
+"""Daily invoice rollup and OCR job tables
+
+- daily_invoice_rollup: per-day invoice totals per (date, status, supplier,
+  customer), maintained alongside invoice writes; built from the invoices on
+  the next startup (rollup_service.ensure_populated)
+- ocr_jobs: background OCR extraction jobs, persisted so queued work survives
+  restarts
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "daily_invoice_rollup",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("status", sa.String(50), nullable=False),
+        sa.Column("supplier_id", sa.Integer(), nullable=False),
+        sa.Column("customer_id", sa.Integer(), nullable=False),
+        sa.Column("sum_total", sa.Float(), nullable=False),
+        sa.Column("sum_tax", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("date", "status", "supplier_id", "customer_id", name="uq_daily_invoice_rollup_key"),
+    )
+    op.create_index("ix_daily_invoice_rollup_id", "daily_invoice_rollup", ["id"])
+    op.create_index("ix_daily_invoice_rollup_date", "daily_invoice_rollup", ["date"])
+    op.create_index("ix_daily_invoice_rollup_supplier_id", "daily_invoice_rollup", ["supplier_id"])
+    op.create_index("ix_daily_invoice_rollup_customer_id", "daily_invoice_rollup", ["customer_id"])
+
+    op.create_table(
+        "ocr_jobs",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("invoice_id", sa.Integer(), sa.ForeignKey("invoices.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("file_path", sa.String(500), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_ocr_jobs_invoice_id", "ocr_jobs", ["invoice_id"])
+    op.create_index("ix_ocr_jobs_status", "ocr_jobs", ["status"])
+
+
+def downgrade():
+    op.drop_table("ocr_jobs")
+    op.drop_table("daily_invoice_rollup")
@@ -0,0 +1,51 @@
+"""Indexes for the invoice query patterns
+
+- (invoice_number, supplier_id): upload dedup lookup; replaces the invoice_number index
+- (customer_id, issue_date), (supplier_id, issue_date): per-customer/supplier listings
+- (status, due_date, total): covers the analytics status breakdown, so it scans
+  the index instead of invoice rows carrying raw OCR text
+- invoice_items.invoice_id, forecasts.invoice_id: item loading, cascades, forecast lookups
+- ocr_jobs (status, created_at): job runner claim query; replaces the status index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_invoices_number_supplier", "invoices", ["invoice_number", "supplier_id"]),
+    ("ix_invoices_customer_issue_date", "invoices", ["customer_id", "issue_date"]),
+    ("ix_invoices_supplier_issue_date", "invoices", ["supplier_id", "issue_date"]),
+    ("ix_invoices_status_due_date_total", "invoices", ["status", "due_date", "total"]),
+    ("ix_invoice_items_invoice_id", "invoice_items", ["invoice_id"]),
+    ("ix_forecasts_invoice_id", "forecasts", ["invoice_id"]),
+    ("ix_ocr_jobs_status_created_at", "ocr_jobs", ["status", "created_at"]),
+]
+
+# Single-column indexes made redundant by a composite index with the same leading column
+REPLACED = [
+    ("ix_invoices_invoice_number", "invoices", ["invoice_number"]),
+    ("ix_ocr_jobs_status", "ocr_jobs", ["status"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+    for name, table, _ in REPLACED:
+        op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    for name, table, columns in REPLACED:
+        op.create_index(name, table, columns)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
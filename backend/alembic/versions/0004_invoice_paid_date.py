@@ -0,0 +1,28 @@
+"""Invoice payment date
+
+invoices.paid_date records when an invoice was paid; the payment-date
+forecast engine learns each customer's payment behavior from it.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("invoices") as batch_op:
+        batch_op.add_column(sa.Column("paid_date", sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("invoices") as batch_op:
+        batch_op.drop_column("paid_date")
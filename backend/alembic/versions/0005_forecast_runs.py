@@ -0,0 +1,62 @@
+"""Forecast runs and current forecasts
+
+- forecast_runs: one row per forecasting pass (model version, as-of date,
+  history size, invoice count)
+- forecasts.run_id: the run that produced a forecast
+- forecasts.is_current: marks each invoice's current forecast, enforced
+  unique per invoice by a partial index (ux_forecasts_current_invoice) that
+  also serves current-forecast reads
+- existing forecasts: the newest one per invoice becomes current
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "forecast_runs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("model_version", sa.String(50), nullable=False),
+        sa.Column("prediction_method", sa.String(100), nullable=True),
+        sa.Column("as_of", sa.Date(), nullable=False),
+        sa.Column("history_size", sa.Integer(), nullable=False),
+        sa.Column("invoice_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_forecast_runs_id", "forecast_runs", ["id"])
+    op.create_index("ix_forecast_runs_created_at", "forecast_runs", ["created_at"])
+
+    with op.batch_alter_table("forecasts") as batch_op:
+        batch_op.add_column(sa.Column("run_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key("fk_forecasts_run_id", "forecast_runs", ["run_id"], ["id"], ondelete="SET NULL")
+        batch_op.add_column(sa.Column("is_current", sa.Boolean(), nullable=False, server_default=sa.text("false")))
+
+    # The newest forecast of every invoice becomes current
+    op.execute("UPDATE forecasts SET is_current = true WHERE id IN (SELECT MAX(id) FROM forecasts GROUP BY invoice_id)")
+
+    op.create_index("ix_forecasts_run_id", "forecasts", ["run_id"])
+    op.create_index(
+        "ux_forecasts_current_invoice", "forecasts", ["invoice_id"], unique=True,
+        sqlite_where=sa.text("is_current = 1"), postgresql_where=sa.text("is_current")
+    )
+
+
+def downgrade():
+    op.drop_index("ux_forecasts_current_invoice", table_name="forecasts")
+    op.drop_index("ix_forecasts_run_id", table_name="forecasts")
+    with op.batch_alter_table("forecasts") as batch_op:
+        batch_op.drop_constraint("fk_forecasts_run_id", type_="foreignkey")
+        batch_op.drop_column("run_id")
+        batch_op.drop_column("is_current")
+    op.drop_table("forecast_runs")
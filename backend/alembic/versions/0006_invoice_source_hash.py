@@ -0,0 +1,31 @@
+"""Invoice source file hash
+
+invoices.source_sha256 holds the SHA-256 of the uploaded scan, so re-uploads
+of the same file are recognized (duplicate_of in upload responses) and reuse
+the stored copy.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("invoices") as batch_op:
+        batch_op.add_column(sa.Column("source_sha256", sa.String(64), nullable=True))
+    op.create_index("ix_invoices_source_sha256", "invoices", ["source_sha256"])
+
+
+def downgrade():
+    op.drop_index("ix_invoices_source_sha256", table_name="invoices")
+    with op.batch_alter_table("invoices") as batch_op:
+        batch_op.drop_column("source_sha256")
@@ -0,0 +1,29 @@
+"""Forecast run kinds
+
+forecast_runs.kind tells batch runs over the open invoices from the daily
+manual runs that collect single-invoice predictions; retention counts batch
+runs only. Existing runs become batch runs.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("forecast_runs") as batch_op:
+        batch_op.add_column(sa.Column("kind", sa.String(20), nullable=False, server_default="batch"))
+
+
+def downgrade():
+    with op.batch_alter_table("forecast_runs") as batch_op:
+        batch_op.drop_column("kind")
@@ -0,0 +1,77 @@
+"""
+Application settings
+Read from environment variables (or a .env file in the working directory);
+see .env.example for the available options.
+"""
+
+import os
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # Database
+    database_url: str = "sqlite:///./invoice_forecast.db"
+    async_database_url: Optional[str] = None  # Defaults to database_url with the async driver
+    db_echo: bool = False  # Log every SQL statement (debugging only)
+    migrate_on_startup: bool = True  # Run alembic upgrade head on startup; False only checks the revision
+
+    # Connection pool (file-based SQLite and PostgreSQL)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800  # seconds, 0 disables
+    db_pool_pre_ping: bool = True
+
+    # PostgreSQL
+    db_statement_timeout_ms: int = 30000  # 0 disables
+
+    # SQLite pragmas applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size: int = 268435456  # bytes
+
+    # OCR worker pool and background jobs
+    ocr_workers: int = max(1, (os.cpu_count() or 2) - 1)
+    ocr_max_queue: int = 32
+    ocr_job_timeout: float = 120
+    ocr_job_max_attempts: int = 3
+    ocr_job_poll_interval: float = 2
+
+    # OCR result cache (content hash of the upload -> extraction result)
+    ocr_cache_enabled: bool = True
+    ocr_cache_path: str = "./ocr_cache.db"
+    ocr_cache_max_mb: int = 256
+
+    # Scans above this resolution are downscaled before OCR preprocessing
+    ocr_target_dpi: int = 300
+
+    # PDF invoices: scanned pages OCRed in parallel per document, pages beyond the limit ignored
+    ocr_pdf_page_workers: int = 2
+    ocr_pdf_max_pages: int = 20
+
+    # Field extraction rule table (YAML); empty uses the bundled app/services/extraction_rules.yaml
+    extraction_rules_path: str = ""
+
+    # Payment forecasts
+    forecast_keep_runs: int = 5  # Superseded forecasts are pruned outside the most recent batch runs
+
+    # Revenue forecasts
+    revenue_forecaster: str = "holt_winters"  # holt_winters or moving_average
+
+    # Analytics response cache
+    analytics_cache_backend: str = "memory"  # memory, sqlite (shared by workers) or none
+    analytics_cache_ttl: float = 300  # seconds
+    analytics_cache_max_entries: int = 1024
+    analytics_cache_path: str = "./analytics_cache.db"  # sqlite backend only
+
+    # Entity resolution
+    entity_match_threshold: float = 0.7  # Minimum trigram similarity for fuzzy name matches
+
+
+settings = Settings()
@@ -1,26 +1,182 @@
 """
 Database configuration and session management
+
+The engine profile depends on the backend (see Settings):
+- SQLite files get a connection pool (one connection per session, so requests
+  are not serialized on a shared connection) and WAL journaling, so readers
+  keep running while a write commits
+- in-memory SQLite keeps a single shared connection (each connection would
+  otherwise see its own empty database)
+- PostgreSQL gets a sized QueuePool with pre-ping and a statement timeout
+
+Routers can use either the synchronous session (get_db) or an AsyncSession
+(get_async_db, aiosqlite / asyncpg) that does not block the event loop. The
+async engine is created on first use, so a missing async driver only affects
+the async routes, not startup.
+
+The schema is owned by the Alembic migrations (alembic/versions): startup runs
+migrate_database(); create_tables() is only for throwaway databases (tests,
+benchmarks).
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 import os
+from typing import Optional
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from .config import settings, Settings
+
+DATABASE_URL = settings.database_url
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Databases created by create_tables() before migrations were introduced have this schema
+BASELINE_REVISION = "0001"
+
+# Async drivers used for the sync URL's backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def to_async_url(database_url: str) -> str:
+    """Same database with the async driver (sqlite+aiosqlite, postgresql+asyncpg)"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def _set_sqlite_pragmas(config: Settings):
+    def on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={config.sqlite_busy_timeout_ms}")
+        cursor.execute(f"PRAGMA cache_size=-{config.sqlite_cache_size_kb}")
+        cursor.execute(f"PRAGMA mmap_size={config.sqlite_mmap_size}")
+        cursor.close()
+    return on_connect
+
+
+def create_db_engine(database_url: str = DATABASE_URL, config: Settings = settings) -> Engine:
+    """Build an engine with the profile for the database backend"""
+    url = make_url(database_url)
+
+    if url.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            return create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                echo=config.db_echo
+            )
+        engine = create_engine(
+            url,
+            # Connections are handed between the event loop and worker threads
+            connect_args={"check_same_thread": False},
+            poolclass=QueuePool,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            echo=config.db_echo
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas(config))
+        return engine
+
+    connect_args = {}
+    if url.get_backend_name() == "postgresql" and config.db_statement_timeout_ms:
+        if url.get_driver_name() in ("psycopg2", "psycopg"):
+            connect_args["options"] = f"-c statement_timeout={config.db_statement_timeout_ms}"
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle or -1,
+        pool_pre_ping=config.db_pool_pre_ping,
+        echo=config.db_echo
+    )
 
-# Database URL - using SQLite for development
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./invoice_forecast.db")
 
-# Create engine with SQLite-specific configurations
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    poolclass=StaticPool if "sqlite" in DATABASE_URL else None,
-    echo=True  # Set to False in production
-)
+def create_async_db_engine(database_url: str = DATABASE_URL, config: Settings = settings) -> AsyncEngine:
+    """Async counterpart of create_db_engine with the same profile"""
+    url = make_url(to_async_url(database_url))
 
-# Create session factory
+    if url.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            # Note: a separate in-memory database from the sync engine's
+            return create_async_engine(url, poolclass=StaticPool, echo=config.db_echo)
+        engine = create_async_engine(
+            url,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            echo=config.db_echo
+        )
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas(config))
+        return engine
+
+    connect_args = {}
+    if url.get_backend_name() == "postgresql" and config.db_statement_timeout_ms:
+        connect_args["server_settings"] = {"statement_timeout": str(config.db_statement_timeout_ms)}
+    return create_async_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle or -1,
+        pool_pre_ping=config.db_pool_pre_ping,
+        echo=config.db_echo
+    )
+
+
+engine = create_db_engine()
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session factory (created on first use)
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Get or create the async engine"""
+    global _async_engine
+    if _async_engine is None:
+        database_url = settings.async_database_url or DATABASE_URL
+        try:
+            _async_engine = create_async_db_engine(database_url)
+        except (ValueError, ImportError) as e:
+            raise RuntimeError(
+                f"Async database routes are unavailable for {make_url(database_url).get_backend_name()}: {e}. "
+                "Install the async driver (aiosqlite, asyncpg) or set ASYNC_DATABASE_URL."
+            ) from e
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def dispose_async_engine():
+    """Close the async engine's connections, if it was ever created"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
 
 def get_db():
     """Dependency to get database session"""
@@ -31,8 +187,55 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+def alembic_config():
+    """Alembic configuration for the application's migrations (no alembic.ini logging setup)"""
+    from alembic.config import Config
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+
+def migrate_database(bind: Optional[Engine] = None, upgrade: Optional[bool] = None) -> str:
+    """
+    Bring the schema to the latest migration (alembic upgrade head), or with
+    upgrade=False (MIGRATE_ON_STARTUP=False) only check that it is there.
+    Databases that predate migrations have to be stamped with the baseline
+    first. Returns the head revision.
+    """
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    bind = bind if bind is not None else engine
+    upgrade = settings.migrate_on_startup if upgrade is None else upgrade
+    config = alembic_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+    with bind.begin() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current == head:
+            return head
+        if current is None and inspect(connection).has_table("invoices"):
+            raise RuntimeError(
+                "The database was created before migrations were introduced: run "
+                f"`alembic stamp {BASELINE_REVISION}` once, then `alembic upgrade head`"
+            )
+        if not upgrade:
+            raise RuntimeError(f"Database schema is at revision {current}, expected {head}: run `alembic upgrade head`")
+        # Migrate on this connection (env.py picks it up), in-memory SQLite included
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    print(f"✅ Database migrated from revision {current} to {head}")
+    return head
+
+
 def create_tables():
-    """Create all tables in the database"""
+    """Create all tables in the database (throwaway databases only, see migrate_database)"""
     from .models import Base
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created successfully!")
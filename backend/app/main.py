@@ -8,7 +8,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 
-from .database import create_tables
+from .database import migrate_database, SessionLocal, dispose_async_engine
+from .services import analytics_cache, rollup_service
+from .services.entity_resolver import get_entity_resolver
+from .services.ocr_worker import get_ocr_pool
+from .services.ocr_jobs import get_job_runner
 from .routers import invoices, customers, forecasts, upload, analytics
 
 # Create FastAPI app
@@ -27,6 +31,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -39,8 +44,25 @@ app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytic
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database tables on startup"""
-    create_tables()
+    """Migrate the database schema and start the background services"""
+    migrate_database()
+    analytics_cache.track_writes()
+    db = SessionLocal()
+    try:
+        rollup_service.ensure_populated(db)
+        get_entity_resolver().warm(db)
+    finally:
+        db.close()
+    get_ocr_pool().start()
+    get_job_runner().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the OCR job runner and worker processes, close database connections"""
+    await get_job_runner().stop()
+    get_ocr_pool().shutdown()
+    await dispose_async_engine()
 
 
 @app.get("/")
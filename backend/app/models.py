@@ -2,7 +2,7 @@
 Database models for Invoice Forecasting System
 """
 
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -45,9 +45,18 @@ class Supplier(Base):
 class Invoice(Base):
     """Invoice model"""
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Upload dedup looks invoices up by number and supplier
+        Index("ix_invoices_number_supplier", "invoice_number", "supplier_id"),
+        # Per-customer / per-supplier listings filter and order by issue date
+        Index("ix_invoices_customer_issue_date", "customer_id", "issue_date"),
+        Index("ix_invoices_supplier_issue_date", "supplier_id", "issue_date"),
+        # Covers the analytics status breakdown (status, overdue check and amount)
+        Index("ix_invoices_status_due_date_total", "status", "due_date", "total"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    invoice_number = Column(String(100), nullable=False, index=True)
+    invoice_number = Column(String(100), nullable=False)
     issue_date = Column(Date, nullable=False, index=True)
     due_date = Column(Date, nullable=True)
     
@@ -65,9 +74,11 @@ class Invoice(Base):
     raw_text = Column(Text, nullable=True)
     ocr_confidence = Column(Float, nullable=True)
     extraction_status = Column(String(50), default="pending")  # pending, completed, failed
+    source_sha256 = Column(String(64), nullable=True, index=True)  # Hash of the uploaded file, flags re-uploads
     
     # Invoice status
     status = Column(String(50), nullable=True)  # pending, overdue, paid, cancelled, void
+    paid_date = Column(Date, nullable=True)  # Payment history for the forecast engine
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -84,7 +95,7 @@ class InvoiceItem(Base):
     __tablename__ = "invoice_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False, index=True)
     
     description = Column(String(500), nullable=False)
     quantity = Column(Float, nullable=True, default=1.0)
@@ -100,12 +111,42 @@ class InvoiceItem(Base):
     invoice = relationship("Invoice", back_populates="items")
 
 
+class ForecastRun(Base):
+    """
+    One forecasting pass and the model that produced it: a batch over the open
+    invoices, or the day's manual run collecting single-invoice predictions
+    """
+    __tablename__ = "forecast_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False, default="batch", server_default="batch")  # batch or manual
+    model_version = Column(String(50), nullable=False)
+    prediction_method = Column(String(100), nullable=True)
+    as_of = Column(Date, nullable=False)
+    history_size = Column(Integer, nullable=False, default=0)  # Paid invoices the model learned from
+    invoice_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    forecasts = relationship("Forecast", back_populates="run")
+
+
 class Forecast(Base):
     """Forecast model for payment predictions"""
     __tablename__ = "forecasts"
+    __table_args__ = (
+        # At most one current forecast per invoice; current-forecast reads are index lookups
+        Index(
+            "ux_forecasts_current_invoice", "invoice_id", unique=True,
+            sqlite_where=text("is_current = 1"), postgresql_where=text("is_current")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, index=True)
+    run_id = Column(
+        Integer, ForeignKey("forecast_runs.id", ondelete="SET NULL", name="fk_forecasts_run_id"), nullable=True, index=True
+    )
+    is_current = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     
     predicted_payment_date = Column(Date, nullable=False, index=True)
     confidence_score = Column(Float, nullable=True)  # 0.0 to 1.0
@@ -118,3 +159,49 @@ class Forecast(Base):
 
     # Relationships - cascade delete when invoice is deleted
     invoice = relationship("Invoice", backref="forecasts")
+    run = relationship("ForecastRun", back_populates="forecasts")
+
+
+class DailyInvoiceRollup(Base):
+    """
+    Per-day invoice totals maintained incrementally alongside invoice writes.
+    One row per (date, status, supplier, customer); status is the lower-cased
+    manual status or an empty string when it is derived from the due date.
+    """
+    __tablename__ = "daily_invoice_rollup"
+    __table_args__ = (
+        UniqueConstraint("date", "status", "supplier_id", "customer_id", name="uq_daily_invoice_rollup_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, nullable=False, index=True)
+    status = Column(String(50), nullable=False, default="")
+    supplier_id = Column(Integer, nullable=False, index=True)
+    customer_id = Column(Integer, nullable=False, index=True)
+
+    sum_total = Column(Float, nullable=False, default=0.0)
+    sum_tax = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class OCRJob(Base):
+    """Background OCR extraction job, persisted so queued work survives restarts"""
+    __tablename__ = "ocr_jobs"
+    __table_args__ = (
+        # The runner claims the oldest queued jobs
+        Index("ix_ocr_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True)  # uuid4 hex
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="SET NULL"), nullable=True, index=True)
+    file_path = Column(String(500), nullable=False)
+
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    progress = Column(Integer, nullable=False, default=0)  # 0 to 100
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON encoded ExtractedInvoiceData
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -3,14 +3,16 @@ Analytics endpoints for financial insights and metrics
 Uses invoice.status field for invoice state tracking (pending, paid, overdue, etc.)
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 
-from ..database import get_db
-from .. import models
+import numpy as np
+
+from ..database import get_async_db
+from ..services import analytics_service, revenue_forecaster
+from ..services.analytics_cache import cached_response
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -45,6 +47,31 @@ class TimeSeriesData(BaseModel):
     label: str
 
 
+class CashFlowPoint(BaseModel):
+    date: str  # First day of the bucket
+    label: str
+    invoice_count: int  # Invoices predicted in this bucket (their payment may slip to a neighbour)
+    expected: float
+    lower: float
+    upper: float  # At most the invoices that can be paid in the bucket
+    at_risk: float  # Expected amount paid more than 30 days late (forecast risk x amount)
+    cumulative_expected: float
+    cumulative_lower: float
+    cumulative_upper: float  # At most the invoices that can be paid by the bucket's end
+
+
+class CashFlowProjection(BaseModel):
+    as_of: date
+    horizon_days: int
+    interval: str
+    band_level: float
+    forecast_invoices: int
+    forecast_amount: float  # Predicted within the horizon; some may be paid after it
+    unforecast_invoices: int  # Open invoices without a current forecast (not projected)
+    unforecast_amount: float
+    points: List[CashFlowPoint]
+
+
 class AnalyticsOverview(BaseModel):
     revenue: RevenueMetrics
     invoices: InvoiceMetrics
@@ -52,342 +79,176 @@ class AnalyticsOverview(BaseModel):
     revenue_forecast: List[TimeSeriesData]
 
 
-def get_invoice_status(invoice, today: date) -> str:
-    """
-    Determine invoice status - uses manual status if set, otherwise calculates from due date
-    """
-    if invoice.status:
-        return invoice.status.lower()
-    
-    # Auto-calculate based on due date
-    if invoice.due_date:
-        if invoice.due_date < today:
-            return "overdue"
-    return "pending"
+def _resolve_period(days: int, start_date_str: Optional[str], end_date_str: Optional[str], today: date):
+    """Resolve the reporting window from either a custom range or a trailing number of days"""
+    if start_date_str and end_date_str:
+        try:
+            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+            return start_date, end_date, (end_date - start_date).days or 1
+        except ValueError:
+            pass
+    return today - timedelta(days=days), today, days
+
+
+def _build_revenue_forecast(daily_revenue, today: date) -> List[TimeSeriesData]:
+    """Cumulative expected revenue from today's daily forecast"""
+    return [
+        TimeSeriesData(
+            date=(today + timedelta(days=i)).isoformat(),
+            value=float(value),
+            label=f"Day {i + 1}"
+        )
+        for i, value in enumerate(np.cumsum(daily_revenue))
+    ]
 
 
 @router.get("/overview")
+@cached_response("overview")
 async def get_analytics_overview(
     days: int = 30,
     start_date_str: Optional[str] = None,
     end_date_str: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get comprehensive analytics overview using invoice.status"""
     
     today = date.today()
-    
-    # Use custom date range if provided
-    if start_date_str and end_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-            days = (end_date - start_date).days or 1
-        except ValueError:
-            start_date = today - timedelta(days=days)
-            end_date = today
-    else:
-        start_date = today - timedelta(days=days)
-        end_date = today
-    
+    start_date, end_date, days = _resolve_period(days, start_date_str, end_date_str, today)
     previous_period_start = start_date - timedelta(days=days)
     
-    # Get all invoices
-    from sqlalchemy.orm import joinedload
-    all_invoices = db.query(models.Invoice).options(
-        joinedload(models.Invoice.items)
-    ).all()
-    
-    # Calculate revenue and invoice counts based on status
-    total_revenue = 0.0
-    paid_revenue = 0.0
-    pending_revenue = 0.0
-    overdue_revenue = 0.0
-    
-    paid_invoices = 0
-    pending_invoices = 0
-    overdue_invoices = 0
+    breakdown = await db.run_sync(analytics_service.status_breakdown, today)
+    summary = await db.run_sync(analytics_service.period_summary, start_date, previous_period_start)
     
-    for invoice in all_invoices:
-        total_revenue += invoice.total
-        status = get_invoice_status(invoice, today)
-        
-        if status == "paid":
-            paid_revenue += invoice.total
-            paid_invoices += 1
-        elif status == "overdue":
-            overdue_revenue += invoice.total
-            overdue_invoices += 1
-        elif status == "cancelled" or status == "void":
-            # Don't count cancelled/void invoices in pending/overdue
-            pass
-        else:  # pending or unknown
-            pending_revenue += invoice.total
-            pending_invoices += 1
-    
-    total_invoices = len(all_invoices)
-    
-    # Previous period revenue for comparison
-    prev_period_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        and_(
-            models.Invoice.issue_date >= previous_period_start,
-            models.Invoice.issue_date < start_date
-        )
-    ).scalar() or 0.0
-    current_period_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        models.Invoice.issue_date >= start_date
-    ).scalar() or 0.0
-    
-    revenue_change = 0.0
-    if prev_period_revenue > 0:
-        revenue_change = ((current_period_revenue - prev_period_revenue) / prev_period_revenue) * 100
-    
-    # Previous period invoice count for comparison
-    prev_period_invoices = db.query(func.count(models.Invoice.id)).filter(
-        and_(
-            models.Invoice.issue_date >= previous_period_start,
-            models.Invoice.issue_date < start_date
-        )
-    ).scalar() or 0
-    invoices_change = 0.0
-    if prev_period_invoices > 0:
-        invoices_change = ((total_invoices - prev_period_invoices) / prev_period_invoices) * 100
+    revenue_change = analytics_service.percent_change(
+        summary["current_period_revenue"], summary["prev_period_revenue"]
+    )
+    invoices_change = analytics_service.percent_change(
+        breakdown["total_invoices"], summary["prev_period_invoices"]
+    )
     
     # Invoice trends (invoices created per day over the period)
-    invoice_trends_data = []
-    for i in range(days):
-        trend_date = start_date + timedelta(days=i)
-        day_invoices = db.query(
-            func.sum(models.Invoice.total),
-            func.count(models.Invoice.id)
-        ).filter(
-            func.date(models.Invoice.issue_date) == trend_date
-        ).first()
-        
-        invoice_trends_data.append({
-            "date": trend_date.isoformat(),
-            "amount": float(day_invoices[0] or 0),
-            "count": int(day_invoices[1] or 0)
-        })
-    
-    # Revenue forecast (next 30 days based on average)
-    # Use total_revenue if current_period_revenue is too small or zero
-    # Calculate average daily revenue from all invoices or current period
-    if current_period_revenue > 0:
-        avg_daily_revenue = current_period_revenue / days if days > 0 else 0
-    else:
-        # Fallback: use total revenue divided by days since first invoice or last 90 days
-        # Get the earliest invoice date
-        earliest_invoice = db.query(func.min(models.Invoice.issue_date)).scalar()
-        if earliest_invoice:
-            days_since_first = (today - earliest_invoice).days
-            if days_since_first > 0:
-                avg_daily_revenue = total_revenue / days_since_first
-            else:
-                avg_daily_revenue = total_revenue / 90 if total_revenue > 0 else 0
-        else:
-            avg_daily_revenue = total_revenue / 90 if total_revenue > 0 else 0
+    invoice_trends_data = await db.run_sync(analytics_service.daily_trends, start_date, days)
     
-    revenue_forecast = []
-    for i in range(30):
-        forecast_date = today + timedelta(days=i)
-        # Forecast is cumulative: expected revenue by that date
-        revenue_forecast.append({
-            "date": forecast_date.isoformat(),
-            "value": avg_daily_revenue * (i + 1),
-            "label": f"Day {i + 1}"
-        })
+    # Revenue forecast (next 30 days)
+    daily_revenue = await db.run_sync(revenue_forecaster.forecast_revenue, today, 30, None, None, days)
     
     return AnalyticsOverview(
         revenue=RevenueMetrics(
-            total_revenue=float(total_revenue),
-            paid_revenue=float(paid_revenue),
-            pending_revenue=float(pending_revenue),
-            overdue_revenue=float(overdue_revenue),
+            total_revenue=breakdown["total_revenue"],
+            paid_revenue=breakdown["paid_revenue"],
+            pending_revenue=breakdown["pending_revenue"],
+            overdue_revenue=breakdown["overdue_revenue"],
             revenue_change_percent=revenue_change
         ),
         invoices=InvoiceMetrics(
-            total_invoices=total_invoices,
-            paid_invoices=paid_invoices,
-            pending_invoices=pending_invoices,
-            overdue_invoices=overdue_invoices,
+            total_invoices=breakdown["total_invoices"],
+            paid_invoices=breakdown["paid_invoices"],
+            pending_invoices=breakdown["pending_invoices"],
+            overdue_invoices=breakdown["overdue_invoices"],
             invoices_change_percent=invoices_change
         ),
         invoice_trends=invoice_trends_data,
-        revenue_forecast=revenue_forecast
+        revenue_forecast=_build_revenue_forecast(daily_revenue, today)
     )
 
 
 @router.get("/invoice-trends")
+@cached_response("invoice-trends")
 async def get_invoice_trends(
     days: int = 30,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get invoice creation trends over time"""
     start_date = date.today() - timedelta(days=days)
-    
-    trends = []
-    for i in range(days):
-        trend_date = start_date + timedelta(days=i)
-        day_invoices = db.query(
-            func.sum(models.Invoice.total),
-            func.count(models.Invoice.id)
-        ).filter(
-            func.date(models.Invoice.issue_date) == trend_date
-        ).first()
-        
-        trends.append(InvoiceTrendData(
-            date=trend_date.isoformat(),
-            amount=float(day_invoices[0] or 0),
-            count=int(day_invoices[1] or 0)
-        ))
-    
-    return trends
+    trends = await db.run_sync(analytics_service.daily_trends, start_date, days)
+    return [InvoiceTrendData(**trend) for trend in trends]
 
 
 @router.get("/revenue")
+@cached_response("revenue")
 async def get_revenue_metrics(
     days: int = 30,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get revenue metrics using invoice.status"""
     today = date.today()
     start_date = today - timedelta(days=days)
     previous_period_start = start_date - timedelta(days=days)
     
-    # Get all invoices and calculate by status
-    all_invoices = db.query(models.Invoice).all()
-    
-    total_revenue = 0.0
-    paid_revenue = 0.0
-    pending_revenue = 0.0
-    overdue_revenue = 0.0
-    
-    for invoice in all_invoices:
-        total_revenue += invoice.total
-        status = get_invoice_status(invoice, today)
-        
-        if status == "paid":
-            paid_revenue += invoice.total
-        elif status == "overdue":
-            overdue_revenue += invoice.total
-        elif status == "cancelled" or status == "void":
-            pass
-        else:
-            pending_revenue += invoice.total
-    
-    # Calculate change
-    prev_period_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        and_(
-            models.Invoice.issue_date >= previous_period_start,
-            models.Invoice.issue_date < start_date
-        )
-    ).scalar() or 0.0
-    current_period_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        models.Invoice.issue_date >= start_date
-    ).scalar() or 0.0
-    
-    revenue_change = 0.0
-    if prev_period_revenue > 0:
-        revenue_change = ((current_period_revenue - prev_period_revenue) / prev_period_revenue) * 100
+    breakdown = await db.run_sync(analytics_service.status_breakdown, today)
+    summary = await db.run_sync(analytics_service.period_summary, start_date, previous_period_start)
     
     return RevenueMetrics(
-        total_revenue=float(total_revenue),
-        paid_revenue=float(paid_revenue),
-        pending_revenue=float(pending_revenue),
-        overdue_revenue=float(overdue_revenue),
-        revenue_change_percent=revenue_change
+        total_revenue=breakdown["total_revenue"],
+        paid_revenue=breakdown["paid_revenue"],
+        pending_revenue=breakdown["pending_revenue"],
+        overdue_revenue=breakdown["overdue_revenue"],
+        revenue_change_percent=analytics_service.percent_change(
+            summary["current_period_revenue"], summary["prev_period_revenue"]
+        )
     )
 
 
 @router.get("/invoices")
+@cached_response("invoices")
 async def get_invoice_metrics(
     days: int = 30,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get invoice metrics using invoice.status"""
     today = date.today()
     start_date = today - timedelta(days=days)
     previous_period_start = start_date - timedelta(days=days)
     
-    # Get all invoices
-    all_invoices = db.query(models.Invoice).all()
-    total_invoices = len(all_invoices)
-    
-    # Calculate metrics by status
-    paid_invoices = 0
-    pending_invoices = 0
-    overdue_invoices = 0
-    
-    for invoice in all_invoices:
-        status = get_invoice_status(invoice, today)
-        
-        if status == "paid":
-            paid_invoices += 1
-        elif status == "overdue":
-            overdue_invoices += 1
-        elif status == "cancelled" or status == "void":
-            pass
-        else:
-            pending_invoices += 1
-    
-    # Calculate change
-    prev_period_invoices = db.query(func.count(models.Invoice.id)).filter(
-        and_(
-            models.Invoice.issue_date >= previous_period_start,
-            models.Invoice.issue_date < start_date
-        )
-    ).scalar() or 0
-    invoices_change = 0.0
-    if prev_period_invoices > 0:
-        invoices_change = ((total_invoices - prev_period_invoices) / prev_period_invoices) * 100
+    breakdown = await db.run_sync(analytics_service.status_breakdown, today)
+    summary = await db.run_sync(analytics_service.period_summary, start_date, previous_period_start)
     
     return InvoiceMetrics(
-        total_invoices=total_invoices,
-        paid_invoices=paid_invoices,
-        pending_invoices=pending_invoices,
-        overdue_invoices=overdue_invoices,
-        invoices_change_percent=invoices_change
+        total_invoices=breakdown["total_invoices"],
+        paid_invoices=breakdown["paid_invoices"],
+        pending_invoices=breakdown["pending_invoices"],
+        overdue_invoices=breakdown["overdue_invoices"],
+        invoices_change_percent=analytics_service.percent_change(
+            breakdown["total_invoices"], summary["prev_period_invoices"]
+        )
     )
 
 
 @router.get("/revenue-forecast")
+@cached_response("revenue-forecast")
 async def get_revenue_forecast(
     days: int = 30,
-    db: Session = Depends(get_db)
+    horizon: int = Query(30, ge=1, le=revenue_forecaster.MAX_FORECAST_HORIZON),
+    customer_id: Optional[int] = None,
+    supplier_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get revenue forecast for next N days"""
+    """
+    Get cumulative revenue forecast for the next `horizon` days
+
+    Portfolio-wide, or for one customer or supplier. `days` is the averaging
+    window used while there is too little history for the seasonal model.
+    """
     today = date.today()
-    start_date = today - timedelta(days=days)
-    
-    # Calculate average daily revenue
-    period_revenue = db.query(func.sum(models.Invoice.total)).filter(
-        models.Invoice.issue_date >= start_date
-    ).scalar() or 0.0
-    
-    # If period revenue is too small, use total revenue from all invoices
-    if period_revenue > 0:
-        avg_daily_revenue = period_revenue / days if days > 0 else 0
-    else:
-        # Fallback: use total revenue divided by days since first invoice
-        total_revenue = db.query(func.sum(models.Invoice.total)).scalar() or 0.0
-        earliest_invoice = db.query(func.min(models.Invoice.issue_date)).scalar()
-        if earliest_invoice:
-            days_since_first = (today - earliest_invoice).days
-            if days_since_first > 0:
-                avg_daily_revenue = total_revenue / days_since_first
-            else:
-                avg_daily_revenue = total_revenue / 90 if total_revenue > 0 else 0
-        else:
-            avg_daily_revenue = total_revenue / 90 if total_revenue > 0 else 0
-    
-    forecast = []
-    for i in range(30):
-        forecast_date = today + timedelta(days=i)
-        forecast.append(TimeSeriesData(
-            date=forecast_date.isoformat(),
-            value=avg_daily_revenue * (i + 1),
-            label=f"Day {i + 1}"
-        ))
-    
-    return forecast
+    daily_revenue = await db.run_sync(
+        revenue_forecaster.forecast_revenue, today, horizon, customer_id, supplier_id, days
+    )
+    return _build_revenue_forecast(daily_revenue, today)
+
+
+@router.get("/cash-flow", response_model=CashFlowProjection)
+@cached_response("cash-flow")
+async def get_cash_flow_projection(
+    days: int = Query(90, ge=1, le=3660),
+    interval: str = Query("day", pattern="^(day|week)$"),
+    band_level: float = Query(0.8, gt=0, lt=1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Projected cash inflow from open invoices over the next N days
+
+    Built from each invoice's current payment forecast (see POST
+    /forecasts/predict-batch), with confidence bands at `band_level`.
+    """
+    return await db.run_sync(analytics_service.cash_flow_projection, date.today(), days, interval, band_level)
@@ -3,27 +3,31 @@ Customer CRUD operations
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..schemas import Customer, CustomerCreate, CustomerUpdate
+from ..services import rollup_service
+from ..services.entity_resolver import get_entity_resolver
 from .. import models
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[Customer])
-async def get_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_customers(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
     """Get all customers with pagination"""
-    customers = db.query(models.Customer).offset(skip).limit(limit).all()
-    return customers
+    customers = await db.scalars(select(models.Customer).order_by(models.Customer.id).offset(skip).limit(limit))
+    return customers.all()
 
 
 @router.get("/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: int, db: Session = Depends(get_db)):
+async def get_customer(customer_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get customer by ID"""
-    customer = db.query(models.Customer).filter(models.Customer.id == customer_id).first()
+    customer = await db.get(models.Customer, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
@@ -36,6 +40,7 @@ async def create_customer(customer: CustomerCreate, db: Session = Depends(get_db
     db.add(db_customer)
     db.commit()
     db.refresh(db_customer)
+    get_entity_resolver().customers.add_entity(db_customer)
     return db_customer
 
 
@@ -52,6 +57,7 @@ async def update_customer(customer_id: int, customer_update: CustomerUpdate, db:
     
     db.commit()
     db.refresh(db_customer)
+    get_entity_resolver().customers.add_entity(db_customer)
     return db_customer
 
 
@@ -89,10 +95,12 @@ async def delete_customer(
             # Delete forecasts
             db.query(models.Forecast).filter(models.Forecast.invoice_id == invoice.id).delete()
             # Delete the invoice
+            rollup_service.remove_invoice(db, invoice)
             db.delete(invoice)
     
     db.delete(db_customer)
     db.commit()
+    get_entity_resolver().customers.remove(customer_id)
     
     if cascade and invoice_count > 0:
         return {"message": f"Customer and {invoice_count} invoice(s) deleted successfully"}
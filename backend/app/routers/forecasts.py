@@ -3,11 +3,15 @@ Forecast CRUD operations
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import true
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import date
 
-from ..database import get_db
-from ..schemas import Forecast, ForecastCreate
+from ..database import get_db, SessionLocal
+from ..schemas import Forecast, ForecastCreate, ForecastRun, ForecastBatchRequest, ForecastBatchResult
+from ..services import forecast_engine
 from .. import models
 
 router = APIRouter()
@@ -20,6 +24,31 @@ async def get_forecasts(skip: int = 0, limit: int = 100, db: Session = Depends(g
     return forecasts
 
 
+@router.get("/current", response_model=List[Forecast])
+async def get_current_forecasts(
+    skip: int = 0,
+    limit: int = 100,
+    start_date: date = None,
+    end_date: date = None,
+    db: Session = Depends(get_db)
+):
+    """Current forecast of every invoice, by predicted payment date (optionally within a date range)"""
+    query = db.query(models.Forecast).filter(models.Forecast.is_current == true())
+    if start_date:
+        query = query.filter(models.Forecast.predicted_payment_date >= start_date)
+    if end_date:
+        query = query.filter(models.Forecast.predicted_payment_date <= end_date)
+    return query.order_by(
+        models.Forecast.predicted_payment_date, models.Forecast.id
+    ).offset(skip).limit(limit).all()
+
+
+@router.get("/runs", response_model=List[ForecastRun])
+async def get_forecast_runs(limit: int = 20, db: Session = Depends(get_db)):
+    """Most recent forecast runs"""
+    return db.query(models.ForecastRun).order_by(models.ForecastRun.id.desc()).limit(limit).all()
+
+
 @router.get("/{forecast_id}", response_model=Forecast)
 async def get_forecast(forecast_id: int, db: Session = Depends(get_db)):
     """Get forecast by ID"""
@@ -38,7 +67,12 @@ async def create_forecast(forecast: ForecastCreate, db: Session = Depends(get_db
     if not invoice:
         raise HTTPException(status_code=400, detail="Invoice not found")
     
-    db_forecast = models.Forecast(**forecast.dict())
+    # A manual forecast becomes the invoice's current one
+    db.query(models.Forecast).filter(
+        models.Forecast.invoice_id == forecast.invoice_id,
+        models.Forecast.is_current == true()
+    ).update({"is_current": False}, synchronize_session=False)
+    db_forecast = models.Forecast(**forecast.dict(), is_current=True)
     db.add(db_forecast)
     db.commit()
     db.refresh(db_forecast)
@@ -47,47 +81,62 @@ async def create_forecast(forecast: ForecastCreate, db: Session = Depends(get_db
 
 @router.get("/invoice/{invoice_id}", response_model=List[Forecast])
 async def get_forecasts_by_invoice(invoice_id: int, db: Session = Depends(get_db)):
-    """Get all forecasts for a specific invoice"""
-    forecasts = db.query(models.Forecast).filter(models.Forecast.invoice_id == invoice_id).all()
+    """Get the forecast history of an invoice, newest first (superseded runs are pruned)"""
+    forecasts = db.query(models.Forecast).filter(
+        models.Forecast.invoice_id == invoice_id
+    ).order_by(models.Forecast.id.desc()).all()
     return forecasts
 
 
+@router.get("/invoice/{invoice_id}/current", response_model=Forecast)
+async def get_current_forecast(invoice_id: int, db: Session = Depends(get_db)):
+    """Get the current forecast of an invoice"""
+    forecast = db.query(models.Forecast).filter(
+        models.Forecast.invoice_id == invoice_id,
+        models.Forecast.is_current == true()
+    ).first()
+    if not forecast:
+        raise HTTPException(status_code=404, detail="Forecast not found")
+    return forecast
+
+
+def _forecast_batch(request: ForecastBatchRequest) -> ForecastBatchResult:
+    db = SessionLocal()
+    try:
+        return forecast_engine.forecast_open_invoices(db, **request.dict())
+    finally:
+        db.close()
+
+
+@router.post("/predict-batch", response_model=ForecastBatchResult)
+async def predict_batch(request: ForecastBatchRequest = ForecastBatchRequest()):
+    """
+    Forecast every pending or overdue invoice (or the filtered subset) in one pass
+
+    The new forecasts form one run and become current; the previous ones are
+    kept as history until retention prunes them.
+    """
+    # Scoring and bulk writes are blocking, keep them off the event loop
+    result = await run_in_threadpool(_forecast_batch, request)
+    print(f"📈 Forecast {result.invoices_scored} open invoices in {result.elapsed_seconds}s "
+          f"({result.rows_per_second} rows/s)")
+    return result
+
+
 @router.post("/predict/{invoice_id}")
 async def predict_payment_date(invoice_id: int, db: Session = Depends(get_db)):
-    """Generate AI prediction for payment date (placeholder for ML integration)"""
+    """Forecast the payment date, confidence and risk from the customer's payment history"""
     
-    # Verify invoice exists
-    invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
-    if not invoice:
+    run = forecast_engine.forecast_invoices(db, [invoice_id])
+    if run is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # TODO: Integrate with ML model when ready
-    # For now, return a placeholder prediction
-    
-    from datetime import date, timedelta
-    import random
-    
-    # Simple placeholder logic - predict payment 30 days after due date
-    predicted_date = invoice.due_date + timedelta(days=30) if invoice.due_date else invoice.issue_date + timedelta(days=30)
-    confidence = random.uniform(0.7, 0.95)  # Random confidence between 70-95%
-    risk_score = random.uniform(0.1, 0.4)   # Random risk between 10-40%
-    
-    forecast_data = ForecastCreate(
-        invoice_id=invoice_id,
-        predicted_payment_date=predicted_date,
-        confidence_score=confidence,
-        prediction_method="STATISTICAL_PLACEHOLDER",
-        risk_score=risk_score,
-        notes="Placeholder prediction - ML model integration pending"
-    )
-    
-    db_forecast = models.Forecast(**forecast_data.dict())
-    db.add(db_forecast)
-    db.commit()
-    db.refresh(db_forecast)
+    db_forecast = db.query(models.Forecast).filter(
+        models.Forecast.invoice_id == invoice_id,
+        models.Forecast.is_current == true()
+    ).first()
     
     return {
         "message": "Prediction generated successfully",
-        "forecast": db_forecast,
-        "note": "This is a placeholder prediction. ML model integration will be added later."
+        "forecast": db_forecast
     }
@@ -2,54 +2,190 @@
 Invoice CRUD operations
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import base64
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Iterator, List, Optional, Tuple
 from datetime import date
 
-from ..database import get_db
-from ..schemas import Invoice, InvoiceCreate, InvoiceUpdate, InvoiceItemCreate, InvoiceItemUpdateRequest
+from ..database import get_db, get_async_db, SessionLocal
+from ..schemas import Invoice, InvoiceCreate, InvoiceUpdate, InvoiceItemCreate, InvoiceItemUpdateRequest, LedgerImportResult
+from ..services import rollup_service
+from ..services.ledger_export import prepare_export, EXPORT_FORMATS, LedgerExportError
+from ..services.ledger_import import import_ledger, LedgerImportError
 from .. import models
 
 router = APIRouter()
 
 
+# Page size used when streaming the whole ledger
+STREAM_CHUNK_SIZE = 500
+
+
+def _encode_cursor(invoice: models.Invoice) -> str:
+    """Opaque keyset cursor pointing after the given invoice in (issue_date, id) order"""
+    raw = f"{invoice.issue_date.isoformat()}|{invoice.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        issue_date, invoice_id = raw.split("|")
+        return date.fromisoformat(issue_date), int(invoice_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _invoice_details():
+    """Loader options for the Invoice response schema (customer, supplier and items)"""
+    return (
+        joinedload(models.Invoice.customer),
+        joinedload(models.Invoice.supplier),
+        selectinload(models.Invoice.items)
+    )
+
+
+def _invoice_list_query(
+    start_date: Optional[date],
+    end_date: Optional[date],
+    cursor: Optional[str],
+    customer_id: Optional[int] = None,
+    supplier_id: Optional[int] = None
+):
+    """Invoices newest first by (issue_date, id), starting after the cursor"""
+    query = select(models.Invoice).options(*_invoice_details())
+    
+    if customer_id is not None:
+        query = query.where(models.Invoice.customer_id == customer_id)
+    if supplier_id is not None:
+        query = query.where(models.Invoice.supplier_id == supplier_id)
+    if start_date:
+        query = query.where(models.Invoice.issue_date >= start_date)
+    if end_date:
+        query = query.where(models.Invoice.issue_date <= end_date)
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            models.Invoice.issue_date < cursor_date,
+            and_(models.Invoice.issue_date == cursor_date, models.Invoice.id < cursor_id)
+        ))
+    
+    return query.order_by(models.Invoice.issue_date.desc(), models.Invoice.id.desc())
+
+
+def _stream_invoices(start_date: Optional[date], end_date: Optional[date], cursor: Optional[str]) -> Iterator[str]:
+    """NDJSON lines for every matching invoice, fetched in chunks from a server-side cursor"""
+    db = SessionLocal()
+    try:
+        query = _invoice_list_query(start_date, end_date, cursor).execution_options(
+            stream_results=True, yield_per=STREAM_CHUNK_SIZE
+        )
+        for invoice in db.scalars(query):
+            yield Invoice.model_validate(invoice).model_dump_json() + "\n"
+    finally:
+        db.close()
+
+
 @router.get("/", response_model=List[Invoice])
 async def get_invoices(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     start_date: date = None,
     end_date: date = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all invoices with optional date filtering"""
-    from sqlalchemy.orm import joinedload
-    
-    query = db.query(models.Invoice).options(
-        joinedload(models.Invoice.customer),
-        joinedload(models.Invoice.supplier),
-        joinedload(models.Invoice.items)
-    )
+    """
+    Get invoices (newest first) with optional date filtering
     
-    if start_date:
-        query = query.filter(models.Invoice.issue_date >= start_date)
-    if end_date:
-        query = query.filter(models.Invoice.issue_date <= end_date)
+    - **cursor**: Continue after the last invoice of the previous page; the next
+      page's cursor is returned in the `X-Next-Cursor` header when more may follow.
+      Prefer it over **skip**, whose cost grows with the offset.
+    - **stream**: Stream every matching invoice as NDJSON (ignores skip and limit)
+    """
+    if stream:
+        if cursor:
+            _decode_cursor(cursor)  # Reject a bad cursor before the stream starts
+        return StreamingResponse(
+            _stream_invoices(start_date, end_date, cursor),
+            media_type="application/x-ndjson"
+        )
     
-    invoices = query.offset(skip).limit(limit).all()
+    query = _invoice_list_query(start_date, end_date, cursor)
+    if skip:
+        query = query.offset(skip)
+    return await _page(db, query, limit, response)
+
+
+async def _page(db: AsyncSession, query, limit: Optional[int], response: Response) -> List[models.Invoice]:
+    """Fetch up to limit invoices, announcing the next page's cursor when the page is full"""
+    if limit is not None:
+        query = query.limit(limit)
+    invoices = (await db.scalars(query)).all()
+    if limit is not None and invoices and len(invoices) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(invoices[-1])
     return invoices
 
 
+@router.post("/import", response_model=LedgerImportResult)
+async def import_invoices(file: UploadFile = File(...)):
+    """
+    Bulk import historical invoices from a CSV, XLSX or Parquet file
+
+    Columns: invoice_number, issue_date and total (or subtotal) are required;
+    due_date, subtotal, tax, status, paid_date, customer_name/customer_tax_id (or
+    customer_id), supplier_name/supplier_tax_id (or supplier_id) and item_*
+    line columns are optional. Rows that fail validation are skipped and
+    reported, the rest are imported.
+    """
+    try:
+        # Parsing and bulk inserts are blocking, keep them off the event loop
+        result = await run_in_threadpool(import_ledger, file.file, file.filename or "")
+    except LedgerImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"📥 Imported {result.invoices_created} invoices ({result.items_created} items) from {file.filename}, "
+          f"{result.rows_failed} rows failed")
+    return result
+
+
+@router.get("/export")
+async def export_invoices(
+    dataset: str = "invoices",
+    format: str = "csv",
+    start_date: date = None,
+    end_date: date = None
+):
+    """
+    Stream the ledger for offline analysis
+
+    - **dataset**: invoices, items or forecasts (filtered by the invoice's issue date)
+    - **format**: csv, parquet or arrow (Arrow IPC stream); parquet and arrow require pyarrow
+    """
+    try:
+        body = prepare_export(dataset, format, start_date, end_date)
+    except LedgerExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{extension}"'}
+    )
+
+
 @router.get("/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
+async def get_invoice(invoice_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get invoice by ID"""
-    from sqlalchemy.orm import joinedload
-    
-    invoice = db.query(models.Invoice).options(
-        joinedload(models.Invoice.customer),
-        joinedload(models.Invoice.supplier),
-        joinedload(models.Invoice.items)
-    ).filter(models.Invoice.id == invoice_id).first()
+    invoice = await db.scalar(
+        select(models.Invoice).options(*_invoice_details()).where(models.Invoice.id == invoice_id)
+    )
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return invoice
@@ -81,6 +217,7 @@ async def create_invoice(invoice: InvoiceCreate, db: Session = Depends(get_db)):
         db_item = models.InvoiceItem(**item_data_dict)
         db.add(db_item)
     
+    rollup_service.add_invoice(db, db_invoice)
     db.commit()
     db.refresh(db_invoice)
     return db_invoice
@@ -95,11 +232,20 @@ async def update_invoice(invoice_id: int, invoice_update: InvoiceUpdate, db: Ses
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
+    rollup_snapshot = rollup_service.snapshot(db_invoice)
+    
     # Update invoice fields (excluding items)
     update_data = invoice_update.dict(exclude_unset=True, exclude={'items'})
     for field, value in update_data.items():
         setattr(db_invoice, field, value)
     
+    # Record when the invoice was paid (payment history for forecasting)
+    if "paid_date" not in update_data and "status" in update_data:
+        if (db_invoice.status or "").lower() == "paid":
+            db_invoice.paid_date = db_invoice.paid_date or date.today()
+        else:
+            db_invoice.paid_date = None
+    
     # Handle items update if provided
     if invoice_update.items is not None:
         # Get existing item IDs
@@ -134,6 +280,7 @@ async def update_invoice(invoice_id: int, invoice_update: InvoiceUpdate, db: Ses
                 models.InvoiceItem.invoice_id == invoice_id
             ).delete(synchronize_session=False)
     
+    rollup_service.replace(db, rollup_snapshot, db_invoice)
     db.commit()
     db.refresh(db_invoice)
     
@@ -154,20 +301,47 @@ async def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
     if not db_invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
+    rollup_service.remove_invoice(db, db_invoice)
     db.delete(db_invoice)
     db.commit()
     return {"message": "Invoice deleted successfully"}
 
 
 @router.get("/customer/{customer_id}", response_model=List[Invoice])
-async def get_invoices_by_customer(customer_id: int, db: Session = Depends(get_db)):
-    """Get all invoices for a specific customer"""
-    invoices = db.query(models.Invoice).filter(models.Invoice.customer_id == customer_id).all()
-    return invoices
+async def get_invoices_by_customer(
+    customer_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    start_date: date = None,
+    end_date: date = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get invoices for a specific customer (newest first)
+    
+    All matching invoices are returned unless **limit** is given; pages then
+    continue with the `X-Next-Cursor` header as in the invoice list.
+    """
+    query = _invoice_list_query(start_date, end_date, cursor, customer_id=customer_id)
+    return await _page(db, query, limit, response)
 
 
 @router.get("/supplier/{supplier_id}", response_model=List[Invoice])
-async def get_invoices_by_supplier(supplier_id: int, db: Session = Depends(get_db)):
-    """Get all invoices for a specific supplier"""
-    invoices = db.query(models.Invoice).filter(models.Invoice.supplier_id == supplier_id).all()
-    return invoices
+async def get_invoices_by_supplier(
+    supplier_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    start_date: date = None,
+    end_date: date = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get invoices for a specific supplier (newest first)
+    
+    All matching invoices are returned unless **limit** is given; pages then
+    continue with the `X-Next-Cursor` header as in the invoice list.
+    """
+    query = _invoice_list_query(start_date, end_date, cursor, supplier_id=supplier_id)
+    return await _page(db, query, limit, response)
@@ -2,21 +2,32 @@
 Upload router for invoice image processing
 """
 
+import asyncio
+import json
 import os
-import shutil
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime, date
 from dateutil import parser as date_parser
 
-from ..database import get_db
-from ..models import Invoice, Supplier, Customer, InvoiceItem
-from ..schemas import InvoiceUploadResponse, ExtractedInvoiceData
-# Lazy import for OCR service to avoid startup errors if easyocr is not installed
-# from ..services.ocr_service import get_ocr_service
+from ..database import get_db, SessionLocal
+from ..models import Invoice, Customer, OCRJob
+from ..schemas import InvoiceUploadResponse, OCRJobStatus
+from ..services import rollup_service
+from ..services.ocr_cache import sha256_stream
+from ..services.invoice_ingest import (
+    get_or_create_supplier,
+    get_or_create_customer,
+    save_extracted_invoice,
+    save_extracted_invoices,
+    create_placeholder_invoice,
+    to_extracted_invoice_data,
+)
+from ..services.ocr_jobs import enqueue_job, job_status, get_job_runner
+from ..services.ocr_worker import get_ocr_pool, OCRQueueFullError, OCRTimeoutError, OCRUnavailableError
 
 router = APIRouter()
 
@@ -24,88 +35,60 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# How many times a batch file waits for OCR queue capacity before giving up
+BATCH_QUEUE_RETRIES = 5
 
-def get_or_create_supplier(db: Session, supplier_data: dict) -> Supplier:
-    """Get existing supplier or create new one"""
-    # Try to find by tax_id first
-    if supplier_data.get("tax_id"):
-        supplier = db.query(Supplier).filter(
-            Supplier.tax_id == supplier_data["tax_id"]
-        ).first()
-        if supplier:
-            # Update fields if provided
-            if supplier_data.get("name") and not supplier.name:
-                supplier.name = supplier_data["name"]
-            if supplier_data.get("address") and not supplier.address:
-                supplier.address = supplier_data["address"]
-            if supplier_data.get("phone") and not supplier.phone:
-                supplier.phone = supplier_data["phone"]
-            if supplier_data.get("email") and not supplier.email:
-                supplier.email = supplier_data["email"]
-            db.commit()
-            return supplier
-    
-    # Try to find by name
-    if supplier_data.get("name"):
-        supplier = db.query(Supplier).filter(
-            Supplier.name.ilike(f"%{supplier_data['name']}%")
-        ).first()
-        if supplier:
-            return supplier
-    
-    # Create new supplier
-    supplier = Supplier(
-        name=supplier_data.get("name") or "Unknown Supplier",
-        tax_id=supplier_data.get("tax_id"),
-        address=supplier_data.get("address"),
-        phone=supplier_data.get("phone"),
-        email=supplier_data.get("email")
-    )
-    db.add(supplier)
-    db.commit()
-    db.refresh(supplier)
-    return supplier
-
-
-def get_or_create_customer(db: Session, customer_data: dict) -> Customer:
-    """Get existing customer or create new one"""
-    # Try to find by tax_id first
-    if customer_data.get("tax_id"):
-        customer = db.query(Customer).filter(
-            Customer.tax_id == customer_data["tax_id"]
-        ).first()
-        if customer:
-            return customer
-    
-    # Try to find by name
-    if customer_data.get("name"):
-        customer = db.query(Customer).filter(
-            Customer.name.ilike(f"%{customer_data['name']}%")
-        ).first()
-        if customer:
-            return customer
-    
-    # Create new customer with default name if no info available
-    customer = Customer(
-        name=customer_data.get("name") or "Unknown Customer",
-        tax_id=customer_data.get("tax_id"),
-        address=customer_data.get("address")
-    )
-    db.add(customer)
-    db.commit()
-    db.refresh(customer)
-    return customer
+
+def _save_upload(file: UploadFile, file_path: Path) -> str:
+    """Write an uploaded file to disk, returning the SHA-256 of its bytes"""
+    with open(file_path, "wb") as buffer:
+        return sha256_stream(file.file, buffer)
+
+
+def _find_duplicate(db: Session, content_hash: str, file_path: Path) -> Tuple[Path, Optional[int]]:
+    """
+    First invoice uploaded from identical bytes, if any. Its stored file is
+    reused and the new copy removed; returns the file path to use and the
+    original invoice ID.
+    """
+    original = db.query(Invoice.id, Invoice.image_path).filter(
+        Invoice.source_sha256 == content_hash
+    ).order_by(Invoice.id).first()
+    if original is None:
+        return file_path, None
+    if original.image_path and os.path.exists(original.image_path) and Path(original.image_path) != file_path:
+        os.remove(file_path)
+        file_path = Path(original.image_path)
+    return file_path, original.id
+
+
+def _duplicate_note(duplicate_of: Optional[int]) -> str:
+    return f" (duplicate of invoice {duplicate_of})" if duplicate_of else ""
+
+
+def _remove_image(db: Session, invoice: Invoice):
+    """Delete an invoice's image file unless another invoice shares it (re-uploads reuse the stored file)"""
+    if not invoice.image_path or not os.path.exists(invoice.image_path):
+        return
+    shared = db.query(Invoice.id).filter(
+        Invoice.image_path == invoice.image_path, Invoice.id != invoice.id
+    ).first()
+    if shared is None:
+        os.remove(invoice.image_path)
 
 
 @router.post("/invoice", response_model=InvoiceUploadResponse)
 async def upload_invoice(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    background: bool = False
 ):
     """
     Upload and process invoice image
     
     - **file**: Invoice image file (PNG, JPG, JPEG)
+    - **background**: Return immediately with a job ID and extract in the background
+      (poll `GET /upload/jobs/{job_id}` for progress)
     - Returns extracted invoice data and saves to database
     """
     # Validate file type
@@ -124,25 +107,41 @@ async def upload_invoice(
     file_path = UPLOAD_DIR / safe_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = _save_upload(file, file_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    file_path, duplicate_of = _find_duplicate(db, content_hash, file_path)
+    
+    if background:
+        invoice = create_placeholder_invoice(db, file_path, timestamp)
+        invoice.source_sha256 = content_hash
+        job = enqueue_job(db, invoice, file_path)
+        db.commit()
+        get_job_runner().notify()
+        return InvoiceUploadResponse(
+            success=True,
+            message=f"Invoice queued for extraction{_duplicate_note(duplicate_of)}",
+            invoice_id=invoice.id,
+            job_id=job.id,
+            duplicate_of=duplicate_of
+        )
     
     try:
-        # Initialize OCR service (lazy import)
+        # Process invoice with OCR in the worker pool (or the OCR result cache)
         try:
-            from ..services.ocr_service import get_ocr_service
-            ocr_service = get_ocr_service()
-        except ImportError as e:
+            extracted_data = await get_ocr_pool().process_invoice(str(file_path), content_hash=content_hash)
+        except OCRQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        except OCRUnavailableError as e:
+            raise HTTPException(status_code=503, detail=f"OCR service not available: {str(e)}")
+        except OCRTimeoutError as e:
+            failed_invoice = create_placeholder_invoice(db, file_path, timestamp, extraction_status="failed")
+            failed_invoice.source_sha256 = content_hash
+            db.commit()
             raise HTTPException(
-                status_code=503,
-                detail=f"OCR service not available. Please install easyocr: {str(e)}"
+                status_code=504,
+                detail=f"{str(e)}. Invoice {failed_invoice.id} was saved with extraction_status=failed."
             )
-        
-        # Process invoice with OCR
-        try:
-            extracted_data = ocr_service.process_invoice(str(file_path))
         except Exception as ocr_error:
             import traceback
             error_trace = traceback.format_exc()
@@ -153,104 +152,9 @@ async def upload_invoice(
                 detail=f"OCR processing failed: {str(ocr_error)}"
             )
         
-        # Get or create supplier
-        supplier = get_or_create_supplier(db, extracted_data.get("supplier", {}))
-        
-        # Get or create customer
-        customer = get_or_create_customer(db, extracted_data.get("customer", {}))
-        
-        # Check if invoice already exists
-        existing_invoice = None
-        if extracted_data.get("invoice_number"):
-            existing_invoice = db.query(Invoice).filter(
-                Invoice.invoice_number == extracted_data["invoice_number"],
-                Invoice.supplier_id == supplier.id
-            ).first()
-        
-        # Helper function to parse date safely
-        def parse_date_safe(date_value):
-            if date_value is None:
-                return None
-            if isinstance(date_value, datetime):
-                return date_value.date()
-            if isinstance(date_value, date):
-                return date_value
-            if isinstance(date_value, str):
-                try:
-                    # Try parsing common date formats
-                    parsed = date_parser.parse(date_value, dayfirst=True)
-                    return parsed.date()
-                except:
-                    return None
-            return None
-        
-        # Get dates safely - OCR service returns date objects or None
-        issue_date_raw = extracted_data.get("issue_date")
-        due_date_raw = extracted_data.get("due_date")
-        
-        issue_date = parse_date_safe(issue_date_raw) if issue_date_raw else datetime.now().date()
-        due_date = parse_date_safe(due_date_raw) if due_date_raw else None
-        
-        # Ensure issue_date is never None (required field)
-        if issue_date is None:
-            issue_date = datetime.now().date()
-        
-        if existing_invoice:
-            # Update existing invoice
-            invoice = existing_invoice
-            invoice.issue_date = issue_date
-            invoice.due_date = due_date or invoice.due_date
-            invoice.subtotal = extracted_data.get("amounts", {}).get("subtotal", 0.0) or 0.0
-            invoice.tax = extracted_data.get("amounts", {}).get("tax", 0.0) or 0.0
-            invoice.total = extracted_data.get("amounts", {}).get("total", 0.0) or 0.0
-            invoice.image_path = str(file_path)
-            invoice.raw_text = extracted_data.get("raw_text")
-            invoice.ocr_confidence = extracted_data.get("ocr_confidence")
-            invoice.extraction_status = "completed"
-        else:
-            # Create new invoice
-            invoice = Invoice(
-                invoice_number=extracted_data.get("invoice_number") or f"INV-{timestamp}",
-                issue_date=issue_date,
-                due_date=due_date,
-                subtotal=extracted_data.get("amounts", {}).get("subtotal", 0.0) or 0.0,
-                tax=extracted_data.get("amounts", {}).get("tax", 0.0) or 0.0,
-                total=extracted_data.get("amounts", {}).get("total", 0.0) or 0.0,
-                customer_id=customer.id,
-                supplier_id=supplier.id,
-                image_path=str(file_path),
-                raw_text=extracted_data.get("raw_text"),
-                ocr_confidence=extracted_data.get("ocr_confidence"),
-                extraction_status="completed"
-            )
-            db.add(invoice)
-            db.flush()  # Get invoice ID
-        
-        # Add invoice items if any
-        items_data = extracted_data.get("items", [])
-        if items_data:
-            # Delete existing items if updating
-            if existing_invoice:
-                db.query(InvoiceItem).filter(
-                    InvoiceItem.invoice_id == invoice.id
-                ).delete()
-            
-            for item_data in items_data:
-                try:
-                    item = InvoiceItem(
-                        invoice_id=invoice.id,
-                        description=item_data.get("description", "") or "",
-                        quantity=float(item_data.get("quantity", 1.0)) if item_data.get("quantity") is not None else 1.0,
-                        unit_price=float(item_data.get("unit_price", 0.0)) if item_data.get("unit_price") is not None else None,
-                        discount=float(item_data.get("discount", 0.0)) if item_data.get("discount") is not None else 0.0,
-                        tax_rate=float(item_data.get("tax_rate", 0.0)) if item_data.get("tax_rate") is not None else 0.0,
-                        tax_amount=float(item_data.get("tax_amount", 0.0)) if item_data.get("tax_amount") is not None else 0.0,
-                        total=float(item_data.get("total", 0.0)) if item_data.get("total") is not None else 0.0
-                    )
-                    db.add(item)
-                except (ValueError, TypeError) as e:
-                    print(f"Warning: Could not add invoice item: {e}")
-                    # Continue with other items
+        entity_matches = {}
+        invoice = save_extracted_invoice(db, extracted_data, file_path, timestamp, matches=entity_matches)
+        invoice.source_sha256 = content_hash
         
         try:
             db.commit()
@@ -264,25 +168,19 @@ async def upload_invoice(
             )
         
         # Prepare response
-        response_data = ExtractedInvoiceData(
-            invoice_number=extracted_data.get("invoice_number"),
-            issue_date=extracted_data.get("issue_date"),
-            due_date=extracted_data.get("due_date"),
-            amounts=extracted_data.get("amounts", {}),
-            supplier=extracted_data.get("supplier", {}),
-            customer=extracted_data.get("customer", {}),
-            items=extracted_data.get("items", []),
-            raw_text=extracted_data.get("raw_text"),
-            ocr_confidence=extracted_data.get("ocr_confidence")
-        )
+        response_data = to_extracted_invoice_data(extracted_data)
         
         return InvoiceUploadResponse(
             success=True,
-            message="Invoice processed and saved successfully",
+            message=f"Invoice processed and saved successfully{_duplicate_note(duplicate_of)}",
             invoice_id=invoice.id,
-            extracted_data=response_data
+            extracted_data=response_data,
+            entity_matches=entity_matches,
+            duplicate_of=duplicate_of
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -303,32 +201,169 @@ async def upload_invoice(
         )
 
 
+async def _extract_batch_entry(entry: dict, slots: asyncio.Semaphore) -> dict:
+    """OCR one saved batch file, waiting for queue capacity instead of failing the file"""
+    pool = get_ocr_pool()
+    async with slots:
+        for attempt in range(BATCH_QUEUE_RETRIES):
+            try:
+                entry["extracted"] = await pool.process_invoice(
+                    str(entry["file_path"]), content_hash=entry["content_hash"]
+                )
+                entry.pop("error", None)
+                return entry
+            except OCRQueueFullError as e:
+                entry["error"] = str(e)
+                await asyncio.sleep(1 + attempt)
+            except OCRTimeoutError as e:
+                entry["error"] = str(e)
+                entry["timed_out"] = True
+                return entry
+            except Exception as e:
+                entry["error"] = f"OCR processing failed: {str(e)}"
+                return entry
+    return entry
+
+
+async def _run_batch_pipeline(entries: List[dict]) -> AsyncIterator[dict]:
+    """
+    Batch pipeline: OCR fan-out across the worker pool, then entity resolution and
+    a bulk insert of all extracted invoices and items in a single transaction.
+    Yields one event per file as its extraction completes, then one per saved file.
+    """
+    slots = asyncio.Semaphore(get_ocr_pool().workers)
+    pending = [_extract_batch_entry(entry, slots) for entry in entries if "error" not in entry]
+    for finished in asyncio.as_completed(pending):
+        entry = await finished
+        yield {
+            "stage": "extracted",
+            "index": entry["index"],
+            "filename": entry["filename"],
+            "success": "error" not in entry,
+            "message": entry.get("error") or "Extraction completed"
+        }
+    
+    extracted = [entry for entry in entries if "extracted" in entry]
+    timed_out = [entry for entry in entries if entry.get("timed_out")]
+    db = SessionLocal()
+    try:
+        entity_matches = []
+        invoices = save_extracted_invoices(
+            db, [(entry["extracted"], entry["file_path"], entry["timestamp"]) for entry in extracted],
+            matches=entity_matches
+        )
+        for entry, matches in zip(extracted, entity_matches):
+            entry["entity_matches"] = matches
+        for entry in timed_out:
+            invoices.append(create_placeholder_invoice(
+                db, entry["file_path"], entry["timestamp"], extraction_status="failed"
+            ))
+        for entry, invoice in zip(extracted + timed_out, invoices):
+            invoice.source_sha256 = entry["content_hash"]
+        db.commit()
+        for entry, invoice in zip(extracted + timed_out, invoices):
+            entry["invoice_id"] = invoice.id
+    except Exception as db_error:
+        db.rollback()
+        print(f"Database error while saving batch: {db_error}")
+        for entry in extracted:
+            entry.pop("extracted")
+            entry["error"] = f"Database error while saving invoice: {str(db_error)}"
+    finally:
+        db.close()
+    
+    for entry in entries:
+        if "invoice_id" in entry and "extracted" in entry:
+            response = InvoiceUploadResponse(
+                success=True,
+                message=f"Invoice processed and saved successfully{_duplicate_note(entry.get('duplicate_of'))}",
+                invoice_id=entry["invoice_id"],
+                extracted_data=to_extracted_invoice_data(entry["extracted"]),
+                entity_matches=entry.get("entity_matches"),
+                duplicate_of=entry.get("duplicate_of")
+            )
+        elif "invoice_id" in entry:
+            response = InvoiceUploadResponse(
+                success=False,
+                message=f"Error processing {entry['filename']}: {entry['error']}. "
+                        f"Invoice was saved with extraction_status=failed.",
+                invoice_id=entry["invoice_id"]
+            )
+        else:
+            response = InvoiceUploadResponse(
+                success=False,
+                message=f"Error processing {entry['filename']}: {entry['error']}"
+            )
+        yield {"stage": "saved", "index": entry["index"], "filename": entry["filename"], **response.model_dump(mode="json")}
+
+
 @router.post("/invoices/batch", response_model=List[InvoiceUploadResponse])
 async def upload_invoices_batch(
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    stream: bool = False
 ):
     """
     Upload and process multiple invoice images
     
     - **files**: List of invoice image files
+    - **stream**: Stream progress as NDJSON: an `extracted` event per file as OCR
+      finishes, then a `saved` event per file once the batch is committed
     - Returns list of extracted invoice data
     """
-    results = []
-    
-    for file in files:
-        try:
-            result = await upload_invoice(file, db)
-            results.append(result)
-        except Exception as e:
-            results.append(InvoiceUploadResponse(
-                success=False,
-                message=f"Error processing {file.filename}: {str(e)}"
-            ))
+    allowed_extensions = {".png", ".jpg", ".jpeg", ".pdf"}
     
+    # Stage 1: save every file before OCR starts (identical files share one stored copy)
+    entries = []
+    stored = {}
+    db = SessionLocal()
+    try:
+        for index, file in enumerate(files):
+            entry = {"index": index, "filename": file.filename}
+            entries.append(entry)
+            if Path(file.filename).suffix.lower() not in allowed_extensions:
+                entry["error"] = f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                continue
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            file_path = UPLOAD_DIR / f"{timestamp}_{index}_{file.filename}"
+            try:
+                content_hash = _save_upload(file, file_path)
+            except Exception as e:
+                entry["error"] = f"Error saving file: {str(e)}"
+                continue
+            if content_hash in stored:
+                os.remove(file_path)
+                file_path = stored[content_hash]
+            else:
+                file_path, entry["duplicate_of"] = _find_duplicate(db, content_hash, file_path)
+                stored[content_hash] = file_path
+            entry["timestamp"] = timestamp
+            entry["file_path"] = file_path
+            entry["content_hash"] = content_hash
+    finally:
+        db.close()
+    
+    if stream:
+        async def ndjson():
+            async for event in _run_batch_pipeline(entries):
+                yield json.dumps(event) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    results = [None] * len(entries)
+    async for event in _run_batch_pipeline(entries):
+        if event["stage"] == "saved":
+            results[event["index"]] = InvoiceUploadResponse(**event)
     return results
 
 
+@router.get("/jobs/{job_id}", response_model=OCRJobStatus)
+async def get_upload_job(job_id: str, db: Session = Depends(get_db)):
+    """Get progress and result of a background extraction job"""
+    job = db.query(OCRJob).filter(OCRJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
 @router.get("/invoice-image/{invoice_id}")
 async def get_invoice_image_info(invoice_id: int, db: Session = Depends(get_db)):
     """Get invoice image information"""
@@ -384,11 +419,10 @@ async def upload_invoice_image(
         )
     
     # Delete old image if exists
-    if invoice.image_path and os.path.exists(invoice.image_path):
-        try:
-            os.remove(invoice.image_path)
-        except Exception as e:
-            print(f"Warning: Could not delete old image file: {e}")
+    try:
+        _remove_image(db, invoice)
+    except Exception as e:
+        print(f"Warning: Could not delete old image file: {e}")
     
     # Save new file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -396,13 +430,13 @@ async def upload_invoice_image(
     file_path = UPLOAD_DIR / safe_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = _save_upload(file, file_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
     
     # Update invoice with new image path
     invoice.image_path = str(file_path)
+    invoice.source_sha256 = content_hash
     db.commit()
     db.refresh(invoice)
     
@@ -421,13 +455,12 @@ async def delete_invoice_image(invoice_id: int, db: Session = Depends(get_db)):
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Delete the image file if it exists
-    if invoice.image_path and os.path.exists(invoice.image_path):
-        try:
-            os.remove(invoice.image_path)
-        except Exception as e:
-            # Log error but don't fail - file might already be deleted
-            print(f"Warning: Could not delete image file: {e}")
+    # Delete the image file if it exists (and no other invoice shares it)
+    try:
+        _remove_image(db, invoice)
+    except Exception as e:
+        # Log error but don't fail - file might already be deleted
+        print(f"Warning: Could not delete image file: {e}")
     
     # Clear image path from database
     invoice.image_path = None
@@ -464,24 +497,20 @@ async def process_ocr_only(
     file_path = UPLOAD_DIR / safe_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = _save_upload(file, file_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
     
     try:
-        # Initialize OCR service (lazy import)
+        # Process invoice with OCR in the worker pool (or the OCR result cache)
         try:
-            from ..services.ocr_service import get_ocr_service
-            ocr_service = get_ocr_service()
-        except ImportError as e:
-            raise HTTPException(
-                status_code=503,
-                detail=f"OCR service not available: {str(e)}"
-            )
-        
-        # Process invoice with OCR
-        extracted_data = ocr_service.process_invoice(str(file_path))
+            extracted_data = await get_ocr_pool().process_invoice(str(file_path), content_hash=content_hash)
+        except OCRQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        except OCRUnavailableError as e:
+            raise HTTPException(status_code=503, detail=f"OCR service not available: {str(e)}")
+        except OCRTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
         
         # Format dates as strings for JSON response
         def format_date(d):
@@ -502,6 +531,7 @@ async def process_ocr_only(
             "raw_text": extracted_data.get("raw_text", ""),
             "ocr_confidence": extracted_data.get("ocr_confidence", 0),
             "ocr_backend": extracted_data.get("ocr_backend", "unknown"),
+            "preprocessing": extracted_data.get("preprocessing"),
             "temp_file_path": str(file_path)  # Keep track of the temp file
         }
         
@@ -553,10 +583,10 @@ async def save_invoice_with_data(
     file_path = UPLOAD_DIR / safe_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        content_hash = _save_upload(file, file_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    file_path, duplicate_of = _find_duplicate(db, content_hash, file_path)
     
     try:
         # Get or create customer
@@ -605,16 +635,20 @@ async def save_invoice_with_data(
             customer_id=customer.id,
             supplier_id=supplier.id,
             image_path=str(file_path),
-            extraction_status="completed"
+            extraction_status="completed",
+            source_sha256=content_hash
         )
         db.add(invoice)
+        db.flush()
+        rollup_service.add_invoice(db, invoice)
         db.commit()
         db.refresh(invoice)
         
         return {
             "success": True,
-            "message": "Invoice saved successfully",
-            "invoice_id": invoice.id
+            "message": f"Invoice saved successfully{_duplicate_note(duplicate_of)}",
+            "invoice_id": invoice.id,
+            "duplicate_of": duplicate_of
         }
         
     except HTTPException:
@@ -3,7 +3,7 @@ Pydantic schemas for API validation
 """
 
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import date, datetime
 
 
@@ -139,6 +139,7 @@ class InvoiceUpdate(BaseModel):
     customer_id: Optional[int] = None
     supplier_id: Optional[int] = None
     status: Optional[str] = None  # pending, overdue, paid, cancelled, void
+    paid_date: Optional[date] = None  # Defaults to today when status becomes paid
     items: Optional[List[InvoiceItemUpdateRequest]] = None  # If provided, replace all items
 
 
@@ -149,6 +150,7 @@ class Invoice(InvoiceBase):
     ocr_confidence: Optional[float] = None
     extraction_status: str = "pending"
     status: Optional[str] = None
+    paid_date: Optional[date] = None
     created_at: datetime
     updated_at: datetime
     items: List[InvoiceItem] = []
@@ -172,10 +174,49 @@ class ExtractedInvoiceData(BaseModel):
     ocr_confidence: Optional[float] = None
 
 
+class LedgerImportRowError(BaseModel):
+    row: int  # 1-based data row (header excluded)
+    invoice_number: Optional[str] = None
+    error: str
+
+
+class LedgerImportResult(BaseModel):
+    rows_read: int = 0
+    rows_failed: int = 0
+    invoices_created: int = 0
+    items_created: int = 0
+    errors: List[LedgerImportRowError] = []
+    errors_truncated: bool = False
+    elapsed_seconds: float = 0.0
+
+
+class EntityMatch(BaseModel):
+    entity_id: int
+    name: str
+    method: str  # tax_id, name, fuzzy, created
+    score: float  # 1.0 for exact matches, trigram similarity for fuzzy ones
+
+
 class InvoiceUploadResponse(BaseModel):
     success: bool
     message: str
     invoice_id: Optional[int] = None
+    job_id: Optional[str] = None
+    extracted_data: Optional[ExtractedInvoiceData] = None
+    entity_matches: Optional[Dict[str, EntityMatch]] = None  # supplier / customer
+    duplicate_of: Optional[int] = None  # First invoice uploaded from the same file
+
+
+class OCRJobStatus(BaseModel):
+    id: str
+    status: str  # queued, running, completed, failed
+    progress: int
+    invoice_id: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
     extracted_data: Optional[ExtractedInvoiceData] = None
 
 
@@ -204,8 +245,43 @@ class ForecastUpdate(BaseModel):
 
 class Forecast(ForecastBase):
     id: int
+    run_id: Optional[int] = None
+    is_current: bool = False
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class ForecastBatchRequest(BaseModel):
+    """Filters for a batch forecast; without any, every pending or overdue invoice is forecast"""
+    invoice_ids: Optional[List[int]] = None
+    customer_id: Optional[int] = None
+    supplier_id: Optional[int] = None
+    due_before: Optional[date] = None
+
+
+class ForecastRun(BaseModel):
+    id: int
+    kind: str = "batch"  # batch or manual (the day's single-invoice predictions)
+    model_version: str
+    prediction_method: Optional[str] = None
+    as_of: date
+    history_size: int
+    invoice_count: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ForecastBatchResult(BaseModel):
+    run_id: int
+    as_of: date
+    history_size: int = 0  # Paid invoices the payment profiles were learned from
+    invoices_scored: int = 0
+    forecasts_superseded: int = 0  # Previous current forecasts of the scored invoices
+    forecasts_pruned: int = 0  # Superseded forecasts removed by retention
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
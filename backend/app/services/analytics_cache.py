@@ -0,0 +1,279 @@
+"""
+Analytics response cache
+Dashboard loads fire several analytics requests with the same parameters;
+their encoded JSON responses are cached under (endpoint, parameters, today,
+data version), so a repeat load is a dictionary lookup.
+
+The data version is bumped after every committed session that wrote to a
+table analytics read (ANALYTICS_TABLES), whatever the write path: invoice,
+customer and upload routes, ledger imports, background OCR jobs, forecast
+runs. Entries of older versions are never read again and age out of the LRU.
+
+Backends (ANALYTICS_CACHE_BACKEND):
+- memory: in-process LRU with TTL (one worker)
+- sqlite: the same LRU in front of a shared SQLite file holding the version
+  counter and the responses, so several workers invalidate each other
+- none: caching disabled
+The TTL bounds staleness from writes the hooks cannot see (other processes
+without the shared backend, manual SQL).
+"""
+
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+ANALYTICS_TABLES = {"invoices", "customers", "suppliers", "forecasts", "daily_invoice_rollup"}
+WRITES_FLAG = "analytics_writes"
+
+
+class MemoryCache:
+    """Thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, body = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCacheStore:
+    """Version counter and responses shared by all workers through one SQLite file"""
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analytics_cache "
+            "(key TEXT PRIMARY KEY, body BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_analytics_cache_expires ON analytics_cache (expires)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analytics_cache_version "
+            "(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO analytics_cache_version (id, version) VALUES (1, 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def version(self) -> int:
+        return self._conn().execute("SELECT version FROM analytics_cache_version WHERE id = 1").fetchone()[0]
+
+    def bump(self):
+        self._conn().execute("UPDATE analytics_cache_version SET version = version + 1 WHERE id = 1")
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Body and remaining lifetime of a live entry"""
+        row = self._conn().execute(
+            "SELECT body, expires FROM analytics_cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1] - time.time()
+
+    def set(self, key: str, body: bytes):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO analytics_cache (key, body, expires) VALUES (?, ?, ?)",
+                     (key, body, now + self.ttl))
+        # Expired entries, then the oldest beyond max_entries
+        conn.execute("DELETE FROM analytics_cache WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM analytics_cache WHERE key IN (SELECT key FROM analytics_cache "
+            "ORDER BY expires DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM analytics_cache")
+
+
+class AnalyticsCache:
+    """Response cache keyed by endpoint, parameters, date and data version"""
+
+    def __init__(self, backend: str = "memory", ttl: float = 300, max_entries: int = 1024,
+                 path: Optional[str] = None):
+        self.enabled = backend != "none"
+        self.local = MemoryCache(max_entries, ttl)
+        self.shared = SqliteCacheStore(path, max_entries, ttl) if backend == "sqlite" else None
+        self._version = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> int:
+        return self.shared.version() if self.shared is not None else self._version
+
+    def invalidate(self):
+        """Make every cached response stale (called after analytics data changed)"""
+        if self.shared is not None:
+            self.shared.bump()
+        else:
+            with self._lock:
+                self._version += 1
+
+    def key(self, endpoint: str, params: Dict) -> str:
+        arguments = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{endpoint}?{arguments}|{date.today().isoformat()}|v{self.version()}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        body = self.local.get(key)
+        if body is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                body, remaining = entry
+                self.local.set(key, body, remaining)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def set(self, key: str, body: bytes):
+        self.local.set(key, body)
+        if self.shared is not None:
+            self.shared.set(key, body)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+# Global analytics cache
+_analytics_cache = None
+
+
+def get_analytics_cache() -> AnalyticsCache:
+    """Get or create analytics cache instance"""
+    global _analytics_cache
+    if _analytics_cache is None:
+        _analytics_cache = AnalyticsCache(
+            backend=settings.analytics_cache_backend,
+            ttl=settings.analytics_cache_ttl,
+            max_entries=settings.analytics_cache_max_entries,
+            path=settings.analytics_cache_path
+        )
+    return _analytics_cache
+
+
+def _encode(result) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(
+        jsonable_encoder(result), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def cached_response(endpoint: str) -> Callable:
+    """
+    Cache an async analytics endpoint's JSON response
+
+    The endpoint's query parameters (everything but the `db` session) form the
+    cache key; hits are returned as pre-encoded JSON without touching the database.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            cache = get_analytics_cache()
+            if not cache.enabled:
+                return await func(**kwargs)
+            key = cache.key(endpoint, {name: value for name, value in kwargs.items() if name != "db"})
+            body = cache.get(key)
+            status = "hit"
+            if body is None:
+                body = _encode(await func(**kwargs))
+                cache.set(key, body)
+                status = "miss"
+            return Response(content=body, media_type="application/json", headers={"X-Cache": status})
+        return wrapper
+    return decorator
+
+
+def _is_analytics_table(table) -> bool:
+    return getattr(table, "name", None) in ANALYTICS_TABLES
+
+
+def _after_flush(session: Session, _flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if _is_analytics_table(getattr(instance, "__table__", None)):
+            session.info[WRITES_FLAG] = True
+            return
+
+
+def _on_execute(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    statement = orm_execute_state.statement
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and _is_analytics_table(getattr(statement, "table", None)):
+        orm_execute_state.session.info[WRITES_FLAG] = True
+
+
+def _after_commit(session: Session):
+    if session.info.pop(WRITES_FLAG, False):
+        get_analytics_cache().invalidate()
+
+
+def _after_rollback(session: Session):
+    session.info.pop(WRITES_FLAG, None)
+
+
+_tracking = False
+
+
+def track_writes(session_class=Session):
+    """Invalidate the cache after commits that changed analytics data (sync and async sessions)"""
+    global _tracking
+    if _tracking:
+        return
+    event.listen(session_class, "after_flush", _after_flush)
+    event.listen(session_class, "do_orm_execute", _on_execute)
+    event.listen(session_class, "after_commit", _after_commit)
+    event.listen(session_class, "after_rollback", _after_rollback)
+    _tracking = True
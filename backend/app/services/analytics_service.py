@@ -0,0 +1,244 @@
+"""
+Analytics aggregation queries
+Status buckets are computed in SQL over the invoices table; period totals and
+daily trends are read from the daily rollup (see rollup_service), so every
+analytics endpoint costs a constant number of queries.
+"""
+
+from datetime import date, timedelta
+from statistics import NormalDist
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import and_, case, func, literal, true
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Manually set statuses that are excluded from the pending/overdue buckets
+CLOSED_STATUSES = ("cancelled", "void")
+
+CASH_FLOW_INTERVALS = {"day": 1, "week": 7}
+# Forecasts without a confidence score are treated as a coin flip (widest band)
+DEFAULT_FORECAST_CONFIDENCE = 0.5
+
+
+def invoice_status_expr(today: date):
+    """
+    SQL equivalent of the invoice status rule:
+    use the manual status if set, otherwise derive it from the due date
+    """
+    Invoice = models.Invoice
+    return case(
+        (and_(Invoice.status.is_not(None), Invoice.status != ""), func.lower(Invoice.status)),
+        (and_(Invoice.due_date.is_not(None), Invoice.due_date < today), literal("overdue")),
+        else_=literal("pending"),
+    )
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
+def status_breakdown(db: Session, today: date) -> Dict[str, float]:
+    """
+    Aggregate revenue and counts per status bucket in a single pass over the
+    invoices table (the derived overdue status depends on today's date, so it
+    cannot come from the rollup)
+    """
+    Invoice = models.Invoice
+    status = invoice_status_expr(today)
+    is_paid = status == "paid"
+    is_overdue = status == "overdue"
+    is_pending = and_(~is_paid, ~is_overdue, status.not_in(CLOSED_STATUSES))
+
+    row = db.query(
+        func.count(Invoice.id).label("total_invoices"),
+        func.coalesce(func.sum(Invoice.total), 0).label("total_revenue"),
+        _sum_if(is_paid, Invoice.total).label("paid_revenue"),
+        _sum_if(is_pending, Invoice.total).label("pending_revenue"),
+        _sum_if(is_overdue, Invoice.total).label("overdue_revenue"),
+        _sum_if(is_paid, 1).label("paid_invoices"),
+        _sum_if(is_pending, 1).label("pending_invoices"),
+        _sum_if(is_overdue, 1).label("overdue_invoices"),
+    ).one()
+
+    breakdown = dict(row._mapping)
+    for key in ("total_revenue", "paid_revenue", "pending_revenue", "overdue_revenue"):
+        breakdown[key] = float(breakdown[key] or 0.0)
+    for key in ("total_invoices", "paid_invoices", "pending_invoices", "overdue_invoices"):
+        breakdown[key] = int(breakdown[key] or 0)
+    return breakdown
+
+
+def period_summary(db: Session, start_date: date, previous_period_start: date) -> Dict:
+    """
+    Current/previous period comparisons, all-time revenue and the earliest
+    issue date, read from the daily rollup
+    """
+    Rollup = models.DailyInvoiceRollup
+    in_previous_period = and_(Rollup.date >= previous_period_start, Rollup.date < start_date)
+    in_current_period = Rollup.date >= start_date
+
+    row = db.query(
+        func.coalesce(func.sum(Rollup.sum_total), 0).label("total_revenue"),
+        _sum_if(in_previous_period, Rollup.sum_total).label("prev_period_revenue"),
+        _sum_if(in_current_period, Rollup.sum_total).label("current_period_revenue"),
+        _sum_if(in_previous_period, Rollup.count).label("prev_period_invoices"),
+        func.min(Rollup.date).label("earliest_issue_date"),
+    ).one()
+
+    summary = dict(row._mapping)
+    for key in ("total_revenue", "prev_period_revenue", "current_period_revenue"):
+        summary[key] = float(summary[key] or 0.0)
+    summary["prev_period_invoices"] = int(summary["prev_period_invoices"] or 0)
+    return summary
+
+
+def daily_trends(db: Session, start_date: date, days: int) -> List[Dict]:
+    """Invoice amount and count per issue day, one GROUP BY over the rollup for the whole window"""
+    Rollup = models.DailyInvoiceRollup
+    end_date = start_date + timedelta(days=days)
+    rows = db.query(
+        Rollup.date,
+        func.sum(Rollup.sum_total),
+        func.sum(Rollup.count),
+    ).filter(
+        Rollup.date >= start_date,
+        Rollup.date < end_date,
+    ).group_by(Rollup.date).all()
+
+    by_day = {day: (amount, count) for day, amount, count in rows}
+    trends = []
+    for i in range(days):
+        trend_date = start_date + timedelta(days=i)
+        amount, count = by_day.get(trend_date, (0, 0))
+        trends.append({
+            "date": trend_date.isoformat(),
+            "amount": float(amount or 0),
+            "count": int(count or 0),
+        })
+    return trends
+
+
+def percent_change(current: float, previous: float) -> float:
+    if previous > 0:
+        return ((current - previous) / previous) * 100
+    return 0.0
+
+
+def cash_flow_projection(db: Session, today: date, horizon_days: int, interval: str = "day",
+                         band_level: float = 0.8) -> Dict:
+    """
+    Expected cash inflow from open invoices, bucketed by their current
+    forecast's predicted payment date
+
+    Timing model: an invoice pays its full amount once, in its predicted bucket
+    with probability `confidence` c, otherwise in the bucket before or after
+    ((1 - c) / 2 each; dates already in the past count for today, and a bucket
+    past the horizon is paid after it). With p the chance an invoice lands in a
+    bucket and F the chance it is paid by the bucket's end, a bucket has mean
+    sum(amount * p) and variance sum(amount^2 * p * (1 - p)), the running total
+    mean sum(amount * F) and variance sum(amount^2 * F * (1 - F)) (independent
+    invoices). Bands are mean ± z * sd, clamped to what can be paid at all.
+
+    p and F are polynomials in c, so one GROUP BY per predicted date (open
+    invoices outer-joined to their current forecast) returning the amount
+    moments is all NumPy needs; np.add.at spreads them over the buckets.
+    """
+    Invoice, Forecast = models.Invoice, models.Forecast
+    step = CASH_FLOW_INTERVALS[interval]
+    buckets = (horizon_days + step - 1) // step
+    # One bucket past the horizon: its invoices may still pay in the last bucket
+    end_date = today + timedelta(days=(buckets + 1) * step - 1)
+    confidence = func.coalesce(Forecast.confidence_score, DEFAULT_FORECAST_CONFIDENCE)
+    squared = Invoice.total * Invoice.total
+
+    rows = db.query(
+        Forecast.predicted_payment_date,
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total), 0),
+        func.coalesce(func.sum(Invoice.total * confidence), 0),
+        func.coalesce(func.sum(squared), 0),
+        func.coalesce(func.sum(squared * confidence), 0),
+        func.coalesce(func.sum(squared * confidence * confidence), 0),
+        func.coalesce(func.sum(Invoice.total * func.coalesce(Forecast.risk_score, 0)), 0),
+    ).outerjoin(
+        Forecast, and_(Forecast.invoice_id == Invoice.id, Forecast.is_current == true())
+    ).filter(
+        invoice_status_expr(today).in_(("pending", "overdue")),
+        Invoice.paid_date.is_(None),
+        func.coalesce(Forecast.predicted_payment_date, today) <= end_date,
+    ).group_by(Forecast.predicted_payment_date).all()
+
+    unforecast = [row for row in rows if row[0] is None]
+    rows = [row for row in rows if row[0] is not None]
+    # Buckets -1 .. buckets + 1 are stored at offset 1; bucket -1 is folded into today
+    size = buckets + 3
+    count = np.zeros(size, dtype=np.int64)
+    amount, expected, at_risk, moment, moment_sq, cumulative_variance = (np.zeros(size) for _ in range(6))
+    if rows:
+        days_out = np.array([(row[0] - today).days for row in rows])
+        index = np.clip(days_out, 0, None) // step + 1
+        n, total, total_c, sq, sq_c, sq_cc, risk = (np.array([row[i] for row in rows], dtype=float) for i in range(1, 8))
+        miss, miss_sq = (total - total_c) / 2, (sq - 2 * sq_c + sq_cc) / 4  # amount * (1-c)/2 and its square
+        np.add.at(count, index, n.astype(np.int64))
+        np.add.at(amount, index, total)
+        np.add.at(at_risk, index, risk)
+        for offset, mean, first, second in ((-1, miss, (sq - sq_c) / 2, miss_sq), (0, total_c, sq_c, sq_cc),
+                                            (1, miss, (sq - sq_c) / 2, miss_sq)):
+            np.add.at(expected, index + offset, mean)
+            np.add.at(moment, index + offset, first)  # sum(amount^2 * p)
+            np.add.at(moment_sq, index + offset, second)  # sum(amount^2 * p^2)
+        # F * (1 - F) = (1 - c^2) / 4 in the buckets before and at the prediction, 0 elsewhere
+        np.add.at(cumulative_variance, index - 1, (sq - sq_cc) / 4)
+        np.add.at(cumulative_variance, index, (sq - sq_cc) / 4)
+
+        # Invoices predicted for today or earlier are paid today with p = (1 + c) / 2,
+        # and ((1 + c) / 2)^2 = c^2 + ((1 - c) / 2)^2 + c * (1 - c)
+        expected[1] += expected[0]
+        moment[1] += moment[0]
+        moment_sq[1] += moment_sq[0] + np.sum((sq_c - sq_cc)[index == 1])
+
+    window = slice(1, buckets + 1)
+    # What can be paid at all: invoices within one bucket of this one, or of this one and earlier
+    reachable = np.convolve(amount, np.ones(3), mode="same")[window]
+    reachable_by = np.cumsum(amount)[2:buckets + 2]
+    paid_by = np.cumsum(amount)[:buckets]  # Certainly paid: predicted two buckets back or more
+    count, at_risk = count[window], at_risk[window]
+    expected = expected[window]
+    variance = np.clip(moment - moment_sq, 0, None)[window]
+    cumulative = np.cumsum(expected)
+    cumulative_variance = np.clip(cumulative_variance[window], 0, None)
+
+    z = NormalDist().inv_cdf(0.5 + band_level / 2)
+    spread = z * np.sqrt(variance)
+    cumulative_spread = z * np.sqrt(cumulative_variance)
+
+    points = []
+    for i in range(buckets):
+        start = today + timedelta(days=i * step)
+        points.append({
+            "date": start.isoformat(),
+            "label": f"Day {i + 1}" if step == 1 else f"Week {i + 1}",
+            "invoice_count": int(count[i]),
+            "expected": float(expected[i]),
+            "lower": float(max(expected[i] - spread[i], 0.0)),
+            "upper": float(min(expected[i] + spread[i], reachable[i])),
+            "at_risk": float(at_risk[i]),
+            "cumulative_expected": float(cumulative[i]),
+            "cumulative_lower": float(max(cumulative[i] - cumulative_spread[i], paid_by[i])),
+            "cumulative_upper": float(min(cumulative[i] + cumulative_spread[i], reachable_by[i])),
+        })
+
+    return {
+        "as_of": today,
+        "horizon_days": horizon_days,
+        "interval": interval,
+        "band_level": band_level,
+        "forecast_invoices": int(count.sum()),
+        "forecast_amount": float(amount[window].sum()),
+        "unforecast_invoices": int(unforecast[0][1]) if unforecast else 0,
+        "unforecast_amount": float(unforecast[0][2]) if unforecast else 0.0,
+        "points": points,
+    }
@@ -0,0 +1,245 @@
+"""
+In-process entity resolution index
+Maps tax IDs and normalized names of suppliers and customers to row IDs so
+uploads resolve entities with dictionary lookups instead of ILIKE scans.
+Names that miss the exact maps (typically OCR-garbled) are matched against a
+trigram inverted index with a similarity threshold.
+
+The index is warmed at startup and kept current by the write paths (uploads and
+the customers router). A miss still falls back to an exact, indexed tax ID or
+name lookup, so rows created by other worker processes are picked up; the
+normalized-name matching only covers rows this process has indexed.
+"""
+
+import math
+import re
+import threading
+from typing import Dict, FrozenSet, Optional, Set, Tuple, Type
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Customer, Supplier
+
+# Trailing legal-form tokens (after case and diacritic folding) that do not identify a company
+LEGAL_SUFFIX_TOKENS = {
+    "as", "anonim", "sirketi", "sirket", "ltd", "sti", "ltdsti", "limited",
+    "tic", "ticaret", "san", "sanayi", "ve", "inc", "llc", "co", "corp", "gmbh",
+}
+
+# Minimum trigram similarity (Dice coefficient) for a fuzzy name match
+ENTITY_MATCH_THRESHOLD = settings.entity_match_threshold
+
+_ASCII_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_NON_DIGITS = re.compile(r"\D")
+
+
+def turkish_casefold(text: str) -> str:
+    """Lower-case with Turkish rules (I -> ı, İ -> i)"""
+    return text.replace("I", "ı").replace("İ", "i").lower()
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    Normalized company name used as the index key: Turkish case folding,
+    diacritics folded to ASCII, punctuation removed and legal suffixes
+    (A.Ş., LTD. ŞTİ., ...) stripped from the end
+    """
+    if not name:
+        return ""
+    folded = turkish_casefold(name).translate(_ASCII_FOLD)
+    folded = folded.replace(".", "")
+    tokens = _PUNCTUATION.sub(" ", folded).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIX_TOKENS:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def normalize_tax_id(tax_id: Optional[str]) -> str:
+    return _NON_DIGITS.sub("", tax_id or "")
+
+
+def name_trigrams(name_key: str) -> FrozenSet[str]:
+    """Trigrams of a normalized name, each word padded like pg_trgm ("  ab", " ab", "ab ")"""
+    grams = set()
+    for word in name_key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class EntityIndex:
+    """Tax ID and normalized name maps for one entity table"""
+
+    def __init__(self, model: Type):
+        self.model = model
+        self.by_tax_id: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.by_trigram: Dict[str, Set[int]] = {}
+        self._keys: Dict[int, Tuple[str, str]] = {}
+        self._trigrams: Dict[int, FrozenSet[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, entity_id: int, name: Optional[str], tax_id: Optional[str]):
+        with self._lock:
+            self.remove(entity_id)
+            tax_key = normalize_tax_id(tax_id)
+            name_key = normalize_name(name)
+            if tax_key:
+                self.by_tax_id.setdefault(tax_key, entity_id)
+            if name_key:
+                self.by_name.setdefault(name_key, entity_id)
+                grams = name_trigrams(name_key)
+                for gram in grams:
+                    self.by_trigram.setdefault(gram, set()).add(entity_id)
+                self._trigrams[entity_id] = grams
+            self._keys[entity_id] = (tax_key, name_key)
+
+    def add_entity(self, entity):
+        self.add(entity.id, entity.name, entity.tax_id)
+
+    def remove(self, entity_id: int):
+        with self._lock:
+            tax_key, name_key = self._keys.pop(entity_id, ("", ""))
+            if tax_key and self.by_tax_id.get(tax_key) == entity_id:
+                del self.by_tax_id[tax_key]
+            if name_key and self.by_name.get(name_key) == entity_id:
+                del self.by_name[name_key]
+            for gram in self._trigrams.pop(entity_id, ()):
+                postings = self.by_trigram.get(gram)
+                if postings is not None:
+                    postings.discard(entity_id)
+                    if not postings:
+                        del self.by_trigram[gram]
+
+    def clear(self):
+        with self._lock:
+            self.by_tax_id.clear()
+            self.by_name.clear()
+            self.by_trigram.clear()
+            self._keys.clear()
+            self._trigrams.clear()
+
+    def warm(self, db: Session):
+        """Load every row's id, name and tax ID (no full ORM objects)"""
+        rows = db.query(self.model.id, self.model.name, self.model.tax_id).all()
+        with self._lock:
+            self.clear()
+            for entity_id, name, tax_id in rows:
+                self.add(entity_id, name, tax_id)
+
+    def _load(self, db: Session, entity_id: Optional[int]):
+        """Fetch an indexed row, evicting it if it no longer exists (deleted or rolled back)"""
+        if entity_id is None:
+            return None
+        entity = db.get(self.model, entity_id)
+        if entity is None:
+            self.remove(entity_id)
+        return entity
+
+    def find_by_tax_id(self, db: Session, tax_id: Optional[str]):
+        tax_key = normalize_tax_id(tax_id)
+        if not tax_key:
+            return None
+        entity = self._load(db, self.by_tax_id.get(tax_key))
+        if entity is None:
+            # Indexed column lookup catches rows written by other processes
+            entity = db.query(self.model).filter(self.model.tax_id == tax_id).first()
+            if entity is not None:
+                self.add_entity(entity)
+        return entity
+
+    def find_by_name(self, db: Session, name: Optional[str]):
+        name_key = normalize_name(name)
+        if not name_key:
+            return None
+        entity = self._load(db, self.by_name.get(name_key))
+        if entity is None:
+            # Exact match on the indexed name column for rows written by other processes
+            entity = db.query(self.model).filter(self.model.name == name).first()
+            if entity is not None:
+                self.add_entity(entity)
+        return entity
+
+    def similar(self, name: Optional[str], tax_id: Optional[str] = None,
+                threshold: float = ENTITY_MATCH_THRESHOLD) -> Tuple[Optional[int], float]:
+        """
+        Best fuzzy match for a name as (entity id, trigram Dice similarity).
+
+        Prefix filtering: a row reaching the threshold shares at least
+        ceil(t * |q| / (2 - t)) of the query's trigrams, so it must contain one of
+        the |q| - that + 1 rarest ones; only those posting lists are read. A row
+        whose tax ID contradicts the given one is never matched.
+        """
+        query = name_trigrams(normalize_name(name))
+        if not query:
+            return None, 0.0
+        tax_key = normalize_tax_id(tax_id)
+        min_shared = max(1, math.ceil(threshold * len(query) / (2 - threshold)))
+        with self._lock:
+            postings = sorted((self.by_trigram.get(gram, ()) for gram in query), key=len)
+            candidates = set().union(*postings[:len(query) - min_shared + 1])
+
+            best_id, best_score = None, 0.0
+            for entity_id in candidates:
+                candidate_tax_key = self._keys[entity_id][0]
+                if tax_key and candidate_tax_key and candidate_tax_key != tax_key:
+                    continue
+                grams = self._trigrams[entity_id]
+                score = 2 * len(query & grams) / (len(query) + len(grams))
+                if score > best_score:
+                    best_id, best_score = entity_id, score
+        return best_id, best_score
+
+    def resolve(self, db: Session, name: Optional[str], tax_id: Optional[str],
+                threshold: float = ENTITY_MATCH_THRESHOLD) -> Tuple[Optional[object], str, float]:
+        """
+        Find the row for extracted entity data as (entity, method, score), trying
+        tax ID, then normalized name, then fuzzy name match. Method is "tax_id",
+        "name" or "fuzzy"; when nothing matched the entity is None, the method
+        "none" and the score the best similarity seen.
+        """
+        entity = self.find_by_tax_id(db, tax_id)
+        if entity is not None:
+            return entity, "tax_id", 1.0
+        entity = self.find_by_name(db, name)
+        if entity is not None:
+            return entity, "name", 1.0
+        entity_id, score = self.similar(name, tax_id, threshold)
+        if entity_id is not None and score >= threshold:
+            entity = self._load(db, entity_id)
+            if entity is not None:
+                return entity, "fuzzy", score
+        return None, "none", score
+
+
+class EntityResolver:
+    """Resolution indexes for suppliers and customers"""
+
+    def __init__(self):
+        self.suppliers = EntityIndex(Supplier)
+        self.customers = EntityIndex(Customer)
+
+    def warm(self, db: Session):
+        self.suppliers.warm(db)
+        self.customers.warm(db)
+        print(f"✅ Entity resolver warmed ({len(self.suppliers)} suppliers, {len(self.customers)} customers)")
+
+    def index_for(self, model: Type) -> EntityIndex:
+        return self.suppliers if model is Supplier else self.customers
+
+
+# Global instance (warmed on application startup)
+_resolver_instance = None
+
+
+def get_entity_resolver() -> EntityResolver:
+    """Get or create the entity resolver"""
+    global _resolver_instance
+    if _resolver_instance is None:
+        _resolver_instance = EntityResolver()
+    return _resolver_instance
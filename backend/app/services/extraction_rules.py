@@ -0,0 +1,237 @@
+"""
+Declarative extraction rules for the OCR field parsers
+The regexes behind InvoiceOCRService's field extractors live in a YAML rule
+table (extraction_rules.yaml, or EXTRACTION_RULES_PATH) so new invoice layouts
+can be supported by editing rules instead of code.
+
+Rules are compiled once, at import. A field's patterns are tried in priority
+order and the first leftmost match that passes the field's checks wins. Each
+pattern's longest required ASCII literal (e.g. "fatura" in Fatura\s*No) is
+derived from the parsed regex; patterns whose literal does not occur in the
+case-folded text are skipped without running the regex. The folded text is
+computed once per invoice and shared by all fields.
+
+The table's content hash is part of the OCR cache fingerprint, so uploads
+seen before a rule change are extracted again with the new rules.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from ..config import settings
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "extraction_rules.yaml")
+MIN_LITERAL_LENGTH = 3
+
+# Non-ASCII characters IGNORECASE matches against ASCII letters
+_ASCII_FOLDS = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+def _flags(names: List[str]) -> int:
+    flags = 0
+    for name in names or []:
+        flags |= getattr(re, name.upper())
+    return flags
+
+
+def fold(text: str) -> str:
+    """Case-folded text: contains a rule's literal whenever the rule can match"""
+    return text.translate(_ASCII_FOLDS).lower()
+
+
+def _literal_runs(items, runs: List[str]):
+    run = []
+    for op, av in items:
+        name = str(op)
+        if name == "LITERAL" and av < 128:
+            run.append(chr(av))
+            continue
+        runs.append("".join(run))
+        run = []
+        if name == "SUBPATTERN":
+            _literal_runs(av[-1], runs)
+        elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") and av[0] >= 1:
+            _literal_runs(av[2], runs)
+        elif name == "ATOMIC_GROUP":
+            _literal_runs(av, runs)
+        # Alternatives, optional parts, classes and assertions guarantee no literal
+    runs.append("".join(run))
+
+
+def required_literal(pattern: str, flags: int = 0) -> Optional[str]:
+    """Longest ASCII literal every match of the pattern contains (case-folded), if any"""
+    try:
+        runs = []
+        _literal_runs(sre_parse.parse(pattern, flags), runs)
+    except Exception:
+        return None
+    literal = max(runs, key=len).lower()
+    return literal if len(literal) >= MIN_LITERAL_LENGTH else None
+
+
+class Cleanup:
+    """A substitution applied to captured values"""
+
+    def __init__(self, pattern: str, replace: str = "", flags: Optional[List[str]] = None):
+        self.regex = re.compile(pattern, _flags(flags))
+        self.replace = replace
+
+    def __call__(self, value: str) -> str:
+        return self.regex.sub(self.replace, value)
+
+
+class FieldRule:
+    """
+    One extracted field: patterns in priority order (each capturing the value
+    in its first group, or as a whole when it has none) and the cleanups and
+    checks applied to candidates
+    """
+
+    def __init__(self, name: str, patterns: List[str], flags: Optional[List[str]] = None,
+                 cleanup: Optional[List[Cleanup]] = None, reject: Optional[List[str]] = None,
+                 min_length: int = 0, section: str = "all"):
+        self.name = name
+        self.flags = _flags(flags)
+        self.patterns = [re.compile(pattern, self.flags) for pattern in patterns]
+        self.cleanup = cleanup or []
+        self.reject = {value.upper() for value in reject or []}
+        self.min_length = min_length
+        self.section = section
+
+        self.literals = [required_literal(pattern, self.flags) for pattern in patterns]
+        # All patterns as one alternation, each wrapped in one outer group (all())
+        self.sequence = re.compile("|".join(f"({pattern})" for pattern in patterns), self.flags)
+        self._alternatives: Dict[int, int] = {}
+        group = 1
+        for index, compiled in enumerate(self.patterns):
+            self._alternatives[group] = index
+            group += 1 + compiled.groups
+
+    def clean(self, value: Optional[str]) -> Optional[str]:
+        """Cleaned candidate, or None when it fails the rule's checks"""
+        if value is None:
+            return None
+        value = value.strip()
+        for cleanup in self.cleanup:
+            value = cleanup(value)
+        value = value.strip()
+        if len(value) < self.min_length or value.upper() in self.reject:
+            return None
+        return value
+
+    def first(self, text: str, accept: Optional[Callable[[str], object]] = None,
+              folded: Optional[str] = None):
+        """
+        Value of the highest-priority pattern whose leftmost match passes the
+        checks (and `accept`, which converts a candidate or returns None)
+
+        `folded` is fold() of the text or of a text containing it; patterns
+        whose required literal it lacks cannot match and are skipped.
+        """
+        for pattern, literal in zip(self.patterns, self.literals):
+            if literal is not None and folded is not None and literal not in folded:
+                continue
+            match = pattern.search(text)
+            if match is None:
+                continue
+            value = self.clean(match.group(1 if pattern.groups else 0))
+            if value is not None and accept is not None:
+                value = accept(value)
+            if value is not None:
+                return value
+        return None
+
+    def all(self, text: str) -> List[str]:
+        """Cleaned values of all non-overlapping matches, in text order"""
+        values = []
+        for match in self.sequence.finditer(text):
+            group = match.lastindex
+            value = self.clean(match.group(group + 1 if self.patterns[self._alternatives[group]].groups else group))
+            if value is not None:
+                values.append(value)
+        return values
+
+
+class ExtractionRules:
+    """The compiled rule table"""
+
+    def __init__(self, fields: Dict[str, FieldRule], party_separator: re.Pattern, layout: Optional[Dict] = None,
+                 digest: str = ""):
+        self.fields = fields
+        self.party_separator = party_separator
+        # Phrases for the layout-aware extraction (compiled by ocr_layout)
+        self.layout = layout or {}
+        # Content hash of the rule table: cached extractions made with other rules are not reused
+        self.digest = digest
+        # The extractors run one after another on the same text: fold and split it once
+        self._last: Tuple[Optional[str], str, Optional[Tuple[str, str]]] = (None, "", None)
+
+    def folded(self, text: str) -> str:
+        last_text, folded, _ = self._last
+        if last_text is not text:
+            folded = fold(text)
+            self._last = (text, folded, None)
+        return folded
+
+    def __getitem__(self, name: str) -> FieldRule:
+        return self.fields[name]
+
+    def section(self, name: str, text: str) -> str:
+        """The part of the text the field's rule applies to"""
+        section = self.fields[name].section
+        if section == "all":
+            return text
+        supplier, customer = self.split_parties(text)
+        return supplier if section == "supplier" else customer
+
+    def first(self, name: str, text: str, accept: Optional[Callable[[str], object]] = None):
+        # The section is part of the text, so the text's literals are a superset of its
+        return self.fields[name].first(self.section(name, text), accept, self.folded(text))
+
+    def all(self, name: str, text: str) -> List[str]:
+        return self.fields[name].all(self.section(name, text))
+
+    def split_parties(self, text: str) -> Tuple[str, str]:
+        """
+        Supplier and customer sections: the text before and after the party
+        separator ("SAYIN"), or the two halves of the text without one
+        """
+        last_text, folded, parties = self._last
+        if last_text is text and parties is not None:
+            return parties
+        match = self.party_separator.search(text)
+        if match:
+            parties = text[:match.start()], text[match.end():]
+        else:
+            parties = text[:len(text) // 2], text[len(text) // 2:]
+        if last_text is text:
+            self._last = (text, folded, parties)
+        return parties
+
+    @classmethod
+    def load(cls, path: str) -> "ExtractionRules":
+        with open(path, encoding="utf-8") as handle:
+            table = yaml.safe_load(handle)
+        cleanups = {name: Cleanup(**spec) for name, spec in table.get("cleanups", {}).items()}
+        fields = {}
+        for name, spec in table["fields"].items():
+            spec = dict(spec)
+            spec["cleanup"] = [cleanups[cleanup] for cleanup in spec.get("cleanup", [])]
+            fields[name] = FieldRule(name, **spec)
+        separator = table["sections"]["party_separator"]
+        # Of the parsed table, so comment and formatting edits keep the cache
+        digest = hashlib.sha256(json.dumps(table, sort_keys=True, default=str).encode()).hexdigest()
+        return cls(fields, re.compile(separator["pattern"], _flags(separator.get("flags"))), table.get("layout"), digest)
+
+
+RULES = ExtractionRules.load(settings.extraction_rules_path or DEFAULT_RULES_PATH)
@@ -0,0 +1,459 @@
+"""
+Payment-date forecast engine
+Learns each customer's payment behavior from the paid invoice history in one
+vectorized pandas pass, then forecasts payment date, confidence and risk for
+any number of open invoices at once with NumPy.
+
+Behavior is measured as lateness: paid_date - due_date in days (invoices
+without a due date are due DEFAULT_TERMS_DAYS after issue). Per customer:
+- the lateness distribution (median, 10th/90th percentiles)
+- the overdue rate (share paid after the due date)
+- amount quartiles, and a portfolio-wide lateness offset per amount quartile
+  (large invoices of a customer tend to be paid later than small ones)
+
+Customer statistics are shrunk toward the portfolio-wide ones with weight
+n / (n + PRIOR_WEIGHT), so customers with a handful of paid invoices borrow
+strength from the rest and new customers get the portfolio behavior.
+
+Outputs are calibrated against the history they were learned from:
+- confidence: share of payments that landed within CONFIDENCE_WINDOW_DAYS of
+  the predicted lateness
+- risk: probability of being paid more than SEVERE_LATE_DAYS after the due date
+Invoices already overdue are forecast from the history conditioned on being at
+least that late (the tail of the lateness distribution).
+"""
+
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, false, func, insert, or_, select, true, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..schemas import ForecastBatchResult
+from .analytics_service import invoice_status_expr
+
+DEFAULT_TERMS_DAYS = 30
+CONFIDENCE_WINDOW_DAYS = 7
+SEVERE_LATE_DAYS = 30
+PRIOR_WEIGHT = 5.0
+PREDICTION_METHOD = "PAYMENT_BEHAVIOR"
+NO_HISTORY_METHOD = "PAYMENT_TERMS"
+MODEL_VERSION = "payment-behavior-1"  # Recorded on every forecast run; bump when the model changes
+
+# Open invoices scored per batch by forecast_open_invoices
+FORECAST_BATCH_SIZE = 5000
+OPEN_STATUSES = ("pending", "overdue")
+# Run kinds: a batch over the open invoices, or the day's single-invoice predictions
+BATCH_RUN = "batch"
+MANUAL_RUN = "manual"
+# Retention: superseded forecasts are kept for the most recent batch runs (and the manual runs since)
+FORECAST_KEEP_RUNS = settings.forecast_keep_runs
+
+# Used only while there is no payment history at all
+NO_HISTORY_PRIORS = {"lateness": 0.0, "hit_rate": 0.5, "severe_rate": 0.1, "overdue_rate": 0.5}
+
+HISTORY_COLUMNS = ["customer_id", "issue_date", "due_date", "paid_date", "total"]
+INVOICE_COLUMNS = ["invoice_id", "customer_id", "issue_date", "due_date", "total"]
+
+
+def _as_datetime(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, errors="coerce")
+
+
+def _effective_due(frame: pd.DataFrame) -> pd.Series:
+    issue = _as_datetime(frame["issue_date"])
+    return _as_datetime(frame["due_date"]).fillna(issue + pd.Timedelta(days=DEFAULT_TERMS_DAYS))
+
+
+def _amount_bucket(total: np.ndarray, p25: np.ndarray, p50: np.ndarray, p75: np.ndarray) -> np.ndarray:
+    """Quartile (0-3) of each amount within its customer's amount distribution"""
+    return (total > p25).astype(int) + (total > p50).astype(int) + (total > p75).astype(int)
+
+
+class PaymentProfiles:
+    """Per-customer payment behavior plus the portfolio-wide distribution"""
+
+    def __init__(self, customers: pd.DataFrame, lateness: np.ndarray, amount_offsets: np.ndarray, overall: Dict[str, float]):
+        self.customers = customers  # indexed by customer_id, shrunk statistics
+        self.lateness = lateness  # sorted portfolio lateness (days)
+        self.amount_offsets = amount_offsets  # lateness offset per amount quartile
+        self.overall = overall
+
+    @property
+    def history_size(self) -> int:
+        return len(self.lateness)
+
+    def survival(self, days: np.ndarray) -> np.ndarray:
+        """Share of historical payments more than `days` late"""
+        if not len(self.lateness):
+            return np.where(days < SEVERE_LATE_DAYS, NO_HISTORY_PRIORS["severe_rate"], 0.0)
+        return (len(self.lateness) - np.searchsorted(self.lateness, days, side="right")) / len(self.lateness)
+
+
+def build_profiles(history: pd.DataFrame) -> PaymentProfiles:
+    """
+    Learn payment behavior from paid invoices
+    (columns: customer_id, issue_date, due_date, paid_date, total)
+    """
+    history = history.dropna(subset=["paid_date"])
+    lateness = (_as_datetime(history["paid_date"]) - _effective_due(history)).dt.days.to_numpy(dtype=float)
+    frame = pd.DataFrame({
+        "customer_id": history["customer_id"].to_numpy(),
+        "lateness": lateness,
+        "total": history["total"].to_numpy(dtype=float),
+    }).dropna(subset=["lateness"])
+
+    if frame.empty:
+        overall = dict(NO_HISTORY_PRIORS)
+        customers = pd.DataFrame(columns=["n", "lateness", "lateness_p10", "lateness_p90", "hit_rate", "severe_rate",
+                                          "overdue_rate", "amount_p25", "amount_p50", "amount_p75"])
+        return PaymentProfiles(customers, np.array([]), np.zeros(4), overall)
+
+    groups = frame.groupby("customer_id")
+    median = groups["lateness"].transform("median")
+    frame["hit"] = (frame["lateness"] - median).abs() <= CONFIDENCE_WINDOW_DAYS
+    frame["severe"] = frame["lateness"] > SEVERE_LATE_DAYS
+    frame["overdue"] = frame["lateness"] > 0
+
+    stats = groups.agg(
+        n=("lateness", "size"),
+        lateness=("lateness", "median"),
+        hit_rate=("hit", "mean"),
+        severe_rate=("severe", "mean"),
+        overdue_rate=("overdue", "mean"),
+    )
+    stats[["lateness_p10", "lateness_p90"]] = groups["lateness"].quantile([0.1, 0.9]).unstack().to_numpy()
+    stats[["amount_p25", "amount_p50", "amount_p75"]] = groups["total"].quantile([0.25, 0.5, 0.75]).unstack().to_numpy()
+
+    sorted_lateness = np.sort(frame["lateness"].to_numpy())
+    overall_median = float(np.median(sorted_lateness))
+    overall = {
+        "lateness": overall_median,
+        "hit_rate": float((np.abs(sorted_lateness - overall_median) <= CONFIDENCE_WINDOW_DAYS).mean()),
+        "severe_rate": float(frame["severe"].mean()),
+        "overdue_rate": float(frame["overdue"].mean()),
+    }
+
+    # Lateness offset of each amount quartile relative to the customer's usual lateness
+    bucket = _amount_bucket(
+        frame["total"].to_numpy(),
+        *(frame["customer_id"].map(stats[column]).to_numpy() for column in ("amount_p25", "amount_p50", "amount_p75"))
+    )
+    residual = frame["lateness"].to_numpy() - median.to_numpy()
+    amount_offsets = pd.Series(residual).groupby(bucket).median().reindex(range(4), fill_value=0.0).to_numpy()
+
+    # Shrink customer statistics toward the portfolio
+    weight = stats["n"] / (stats["n"] + PRIOR_WEIGHT)
+    for column in ("lateness", "hit_rate", "severe_rate", "overdue_rate"):
+        stats[column] = weight * stats[column] + (1 - weight) * overall[column]
+
+    return PaymentProfiles(stats, sorted_lateness, amount_offsets, overall)
+
+
+def predict(profiles: PaymentProfiles, invoices: pd.DataFrame, as_of: Optional[date] = None) -> pd.DataFrame:
+    """
+    Forecast payment for open invoices
+    (columns: invoice_id, customer_id, issue_date, due_date, total)
+
+    Returns invoice_id, predicted_payment_date, confidence_score, risk_score and
+    history_count (paid invoices of the customer behind the forecast).
+    """
+    as_of = pd.Timestamp(as_of or date.today())
+    overall = profiles.overall
+    known = profiles.customers.reindex(invoices["customer_id"].to_numpy())
+
+    def feature(column: str) -> np.ndarray:
+        return known[column].to_numpy(dtype=float)
+
+    history_count = np.nan_to_num(feature("n")).astype(int)
+    has_history = history_count > 0
+    lateness = np.where(has_history, feature("lateness"), overall["lateness"])
+    hit_rate = np.where(has_history, feature("hit_rate"), overall["hit_rate"])
+    severe_rate = np.where(has_history, feature("severe_rate"), overall["severe_rate"])
+
+    totals = invoices["total"].to_numpy(dtype=float)
+    quartiles = [np.where(has_history, feature(column), np.inf) for column in ("amount_p25", "amount_p50", "amount_p75")]
+    lateness = lateness + np.where(has_history, profiles.amount_offsets[_amount_bucket(totals, *quartiles)], 0.0)
+
+    due = _effective_due(invoices)
+    days_overdue = (as_of - due).dt.days.to_numpy(dtype=float)
+    customer_offset = lateness - overall["lateness"]
+    confidence = hit_rate.copy()
+    risk = severe_rate.copy()
+
+    # Already later than the usual lateness: forecast from the tail of the distribution
+    overdue = days_overdue >= lateness
+    if overdue.any():
+        d = days_overdue[overdue]
+        sorted_lateness = profiles.lateness
+        n = len(sorted_lateness)
+        if n:
+            start = np.searchsorted(sorted_lateness, d, side="right")
+            tail_size = n - start
+            tail_median = np.where(
+                tail_size > 0,
+                sorted_lateness[np.minimum(start + tail_size // 2, n - 1)],
+                d + CONFIDENCE_WINDOW_DAYS
+            )
+            expected = np.maximum(tail_median + customer_offset[overdue], d + 1)
+            low = np.maximum(expected - CONFIDENCE_WINDOW_DAYS, d)
+            in_window = (np.searchsorted(sorted_lateness, expected + CONFIDENCE_WINDOW_DAYS, side="right")
+                         - np.searchsorted(sorted_lateness, low, side="right"))
+            tail_hit = np.where(tail_size > 0, in_window / np.maximum(tail_size, 1), overall["hit_rate"])
+            confidence[overdue] = tail_hit * hit_rate[overdue] / max(overall["hit_rate"], 1e-9)
+        else:
+            expected = d + 1
+        lateness[overdue] = expected
+
+        survival = profiles.survival(d)
+        conditional = np.where(
+            survival > 0,
+            profiles.survival(np.maximum(d, SEVERE_LATE_DAYS)) / np.where(survival > 0, survival, 1),
+            1.0
+        )
+        risk[overdue] = conditional * severe_rate[overdue] / max(overall["severe_rate"], 1e-9)
+
+    predicted = due + pd.to_timedelta(np.round(lateness), unit="D")
+    return pd.DataFrame({
+        "invoice_id": invoices["invoice_id"].to_numpy(),
+        "predicted_payment_date": predicted.dt.date.to_numpy(),
+        "confidence_score": np.clip(confidence, 0.0, 1.0).round(4),
+        "risk_score": np.clip(risk, 0.0, 1.0).round(4),
+        "history_count": history_count,
+    })
+
+
+def forecast_notes(history_count: int, profiles: PaymentProfiles) -> str:
+    if history_count:
+        return f"Based on {history_count} paid invoices from this customer"
+    if profiles.history_size:
+        return f"No payment history for this customer; based on {profiles.history_size} paid invoices"
+    return f"No payment history yet; assumes payment on the due date ({DEFAULT_TERMS_DAYS}-day terms if unset)"
+
+
+def load_history(db: Session) -> pd.DataFrame:
+    """Paid invoices with a payment date"""
+    Invoice = models.Invoice
+    rows = db.execute(
+        select(Invoice.customer_id, Invoice.issue_date, Invoice.due_date, Invoice.paid_date, Invoice.total)
+        .where(Invoice.paid_date.is_not(None))
+    ).all()
+    return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+
+def load_invoices(db: Session, invoice_ids: Iterable[int]) -> pd.DataFrame:
+    Invoice = models.Invoice
+    rows = db.execute(
+        select(Invoice.id, Invoice.customer_id, Invoice.issue_date, Invoice.due_date, Invoice.total)
+        .where(Invoice.id.in_(list(invoice_ids)))
+    ).all()
+    return pd.DataFrame(rows, columns=INVOICE_COLUMNS)
+
+
+class ProfileCache:
+    """Profiles are rebuilt only when the payment history changes"""
+
+    def __init__(self):
+        self._profiles: Optional[PaymentProfiles] = None
+        self._fingerprint = None
+
+    def get(self, db: Session) -> PaymentProfiles:
+        Invoice = models.Invoice
+        fingerprint = tuple(db.execute(
+            select(func.count(Invoice.id), func.max(Invoice.updated_at)).where(Invoice.paid_date.is_not(None))
+        ).one())
+        if self._profiles is None or fingerprint != self._fingerprint:
+            self._profiles = build_profiles(load_history(db))
+            self._fingerprint = fingerprint
+        return self._profiles
+
+    def clear(self):
+        self._profiles = None
+        self._fingerprint = None
+
+
+# Global profile cache
+_profile_cache = None
+
+
+def get_profile_cache() -> ProfileCache:
+    """Get or create profile cache instance"""
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileCache()
+    return _profile_cache
+
+
+def forecast_rows(profiles: PaymentProfiles, invoices: pd.DataFrame, as_of: Optional[date] = None) -> List[dict]:
+    """Forecast table values for the given invoices"""
+    method = PREDICTION_METHOD if profiles.history_size else NO_HISTORY_METHOD
+    return [
+        {
+            "invoice_id": int(row.invoice_id),
+            "predicted_payment_date": row.predicted_payment_date,
+            "confidence_score": float(row.confidence_score),
+            "prediction_method": method,
+            "risk_score": float(row.risk_score),
+            "notes": forecast_notes(int(row.history_count), profiles),
+        }
+        for row in predict(profiles, invoices, as_of).itertuples(index=False)
+    ]
+
+
+def start_run(db: Session, profiles: PaymentProfiles, as_of: date, kind: str = BATCH_RUN) -> models.ForecastRun:
+    """Record a forecasting pass (flushed, the caller commits)"""
+    run = models.ForecastRun(
+        kind=kind,
+        model_version=MODEL_VERSION,
+        prediction_method=PREDICTION_METHOD if profiles.history_size else NO_HISTORY_METHOD,
+        as_of=as_of,
+        history_size=profiles.history_size,
+        invoice_count=0
+    )
+    db.add(run)
+    db.flush()
+    return run
+
+
+def manual_run(db: Session, profiles: PaymentProfiles, as_of: date) -> models.ForecastRun:
+    """The manual run single-invoice predictions of the as-of date (and model version) are folded into"""
+    ForecastRun = models.ForecastRun
+    run = db.execute(
+        select(ForecastRun)
+        .where(ForecastRun.kind == MANUAL_RUN, ForecastRun.as_of == as_of, ForecastRun.model_version == MODEL_VERSION)
+        .order_by(ForecastRun.id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+    return run or start_run(db, profiles, as_of, kind=MANUAL_RUN)
+
+
+def write_forecasts(db: Session, run: models.ForecastRun, rows: List[dict]) -> int:
+    """
+    Make the given forecasts current: demote each invoice's current forecast
+    and bulk insert the new ones; returns the number of superseded forecasts
+    """
+    if not rows:
+        return 0
+    Forecast = models.Forecast
+    superseded = db.execute(
+        update(Forecast)
+        .where(Forecast.invoice_id.in_([row["invoice_id"] for row in rows]), Forecast.is_current == true())
+        .values(is_current=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    now = datetime.utcnow()
+    db.execute(insert(Forecast), [
+        {**row, "run_id": run.id, "is_current": True, "created_at": now, "updated_at": now} for row in rows
+    ])
+    run.invoice_count += len(rows)
+    return superseded
+
+
+def prune_runs(db: Session, keep: int = FORECAST_KEEP_RUNS) -> int:
+    """
+    Retention: delete superseded forecasts of runs older than the `keep` most
+    recent batch runs (manual runs in between are kept with them), then runs
+    left without forecasts; current forecasts are never deleted.
+    Returns the number of forecasts deleted.
+    """
+    Forecast, ForecastRun = models.Forecast, models.ForecastRun
+    # Run ids grow over time, so the window is everything from the oldest kept batch run on
+    cutoff = db.execute(
+        select(ForecastRun.id).where(ForecastRun.kind == BATCH_RUN)
+        .order_by(ForecastRun.id.desc()).offset(max(keep, 1) - 1).limit(1)
+    ).scalar()
+    if cutoff is None:
+        return 0
+    pruned = db.execute(
+        delete(Forecast)
+        .where(Forecast.is_current == false(), or_(Forecast.run_id.is_(None), Forecast.run_id < cutoff))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.execute(
+        delete(ForecastRun)
+        .where(ForecastRun.id < cutoff, ~select(Forecast.id).where(Forecast.run_id == ForecastRun.id).exists())
+        .execution_options(synchronize_session=False)
+    )
+    return pruned
+
+
+def forecast_invoices(db: Session, invoice_ids: List[int], as_of: Optional[date] = None) -> Optional[models.ForecastRun]:
+    """
+    Forecast the given invoices (committed) into the day's manual run; None when
+    none of them exist. Retention is left to the batch runs.
+    """
+    profiles = get_profile_cache().get(db)
+    invoices = load_invoices(db, invoice_ids)
+    if invoices.empty:
+        return None
+    as_of = as_of or date.today()
+    run = manual_run(db, profiles, as_of)
+    write_forecasts(db, run, forecast_rows(profiles, invoices, as_of))
+    db.commit()
+    return run
+
+
+def _open_invoices_query(as_of: date, invoice_ids: Optional[List[int]], customer_id: Optional[int],
+                         supplier_id: Optional[int], due_before: Optional[date]):
+    """Pending or overdue invoices (the analytics status rule), optionally filtered"""
+    Invoice = models.Invoice
+    query = select(Invoice.id, Invoice.customer_id, Invoice.issue_date, Invoice.due_date, Invoice.total).where(
+        invoice_status_expr(as_of).in_(OPEN_STATUSES),
+        Invoice.paid_date.is_(None)
+    )
+    if invoice_ids is not None:
+        query = query.where(Invoice.id.in_(invoice_ids))
+    if customer_id is not None:
+        query = query.where(Invoice.customer_id == customer_id)
+    if supplier_id is not None:
+        query = query.where(Invoice.supplier_id == supplier_id)
+    if due_before is not None:
+        query = query.where(Invoice.due_date <= due_before)
+    return query.order_by(Invoice.id)
+
+
+def forecast_open_invoices(
+    db: Session,
+    invoice_ids: Optional[List[int]] = None,
+    customer_id: Optional[int] = None,
+    supplier_id: Optional[int] = None,
+    due_before: Optional[date] = None,
+    as_of: Optional[date] = None,
+    batch_size: int = FORECAST_BATCH_SIZE
+) -> ForecastBatchResult:
+    """
+    Forecast every open invoice (or a filtered subset) and upsert the results
+
+    Invoices are read in id order, batch_size at a time (keyset pagination);
+    each batch is scored in one vectorized pass and committed on its own. All
+    batches belong to one forecast run; superseded runs are pruned at the end.
+    """
+    started = time.perf_counter()
+    as_of = as_of or date.today()
+    profiles = get_profile_cache().get(db)
+    query = _open_invoices_query(as_of, invoice_ids, customer_id, supplier_id, due_before)
+    run = start_run(db, profiles, as_of)
+    result = ForecastBatchResult(run_id=run.id, as_of=as_of, history_size=profiles.history_size)
+
+    last_id = 0
+    while True:
+        rows = db.execute(query.where(models.Invoice.id > last_id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        invoices = pd.DataFrame(rows, columns=INVOICE_COLUMNS)
+        result.forecasts_superseded += write_forecasts(db, run, forecast_rows(profiles, invoices, as_of))
+        db.commit()
+        result.invoices_scored += len(invoices)
+
+    result.forecasts_pruned = prune_runs(db)
+    db.commit()
+
+    result.elapsed_seconds = round(time.perf_counter() - started, 3)
+    result.rows_per_second = round(result.invoices_scored / max(result.elapsed_seconds, 1e-3), 1)
+    return result
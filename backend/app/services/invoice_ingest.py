@@ -0,0 +1,338 @@
+"""
+Invoice ingestion helpers
+Turns OCR extraction results into Invoice rows. Shared by the upload endpoints
+and the background OCR job worker.
+"""
+
+from datetime import datetime, date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dateutil import parser as date_parser
+from sqlalchemy.orm import Session
+
+from ..models import Invoice, Supplier, Customer, InvoiceItem
+from ..schemas import ExtractedInvoiceData, EntityMatch
+from . import rollup_service
+from .entity_resolver import get_entity_resolver
+
+
+def resolve_supplier(db: Session, supplier_data: dict) -> Tuple[Supplier, EntityMatch]:
+    """Get existing supplier or create new one (flushed, the caller commits), with how it was matched"""
+    index = get_entity_resolver().suppliers
+    supplier, method, score = index.resolve(db, supplier_data.get("name"), supplier_data.get("tax_id"))
+
+    if supplier and method == "tax_id":
+        # Update fields if provided
+        if supplier_data.get("name") and not supplier.name:
+            supplier.name = supplier_data["name"]
+            index.add_entity(supplier)
+        if supplier_data.get("address") and not supplier.address:
+            supplier.address = supplier_data["address"]
+        if supplier_data.get("phone") and not supplier.phone:
+            supplier.phone = supplier_data["phone"]
+        if supplier_data.get("email") and not supplier.email:
+            supplier.email = supplier_data["email"]
+
+    if supplier is None:
+        # Create new supplier
+        supplier = Supplier(
+            name=supplier_data.get("name") or "Unknown Supplier",
+            tax_id=supplier_data.get("tax_id"),
+            address=supplier_data.get("address"),
+            phone=supplier_data.get("phone"),
+            email=supplier_data.get("email")
+        )
+        db.add(supplier)
+        db.flush()
+        index.add_entity(supplier)
+        method = "created"
+
+    return supplier, EntityMatch(entity_id=supplier.id, name=supplier.name, method=method, score=score)
+
+
+def resolve_customer(db: Session, customer_data: dict) -> Tuple[Customer, EntityMatch]:
+    """Get existing customer or create new one (flushed, the caller commits), with how it was matched"""
+    index = get_entity_resolver().customers
+    customer, method, score = index.resolve(db, customer_data.get("name"), customer_data.get("tax_id"))
+
+    if customer is None:
+        # Create new customer with default name if no info available
+        customer = Customer(
+            name=customer_data.get("name") or "Unknown Customer",
+            tax_id=customer_data.get("tax_id"),
+            address=customer_data.get("address")
+        )
+        db.add(customer)
+        db.flush()
+        index.add_entity(customer)
+        method = "created"
+
+    return customer, EntityMatch(entity_id=customer.id, name=customer.name, method=method, score=score)
+
+
+def get_or_create_supplier(db: Session, supplier_data: dict) -> Supplier:
+    """Get existing supplier or create new one (flushed, the caller commits)"""
+    return resolve_supplier(db, supplier_data)[0]
+
+
+def get_or_create_customer(db: Session, customer_data: dict) -> Customer:
+    """Get existing customer or create new one (flushed, the caller commits)"""
+    return resolve_customer(db, customer_data)[0]
+
+
+def parse_date_safe(date_value) -> Optional[date]:
+    """Parse a date, datetime or day-first date string, returning None when it cannot be parsed"""
+    if date_value is None:
+        return None
+    if isinstance(date_value, datetime):
+        return date_value.date()
+    if isinstance(date_value, date):
+        return date_value
+    if isinstance(date_value, str):
+        try:
+            # Try parsing common date formats
+            parsed = date_parser.parse(date_value, dayfirst=True)
+            return parsed.date()
+        except:
+            return None
+    return None
+
+
+def _build_item(invoice_id: int, item_data: dict) -> InvoiceItem:
+    return InvoiceItem(
+        invoice_id=invoice_id,
+        description=item_data.get("description", "") or "",
+        quantity=float(item_data.get("quantity", 1.0)) if item_data.get("quantity") is not None else 1.0,
+        unit_price=float(item_data.get("unit_price", 0.0)) if item_data.get("unit_price") is not None else None,
+        discount=float(item_data.get("discount", 0.0)) if item_data.get("discount") is not None else 0.0,
+        tax_rate=float(item_data.get("tax_rate", 0.0)) if item_data.get("tax_rate") is not None else 0.0,
+        tax_amount=float(item_data.get("tax_amount", 0.0)) if item_data.get("tax_amount") is not None else 0.0,
+        total=float(item_data.get("total", 0.0)) if item_data.get("total") is not None else 0.0
+    )
+
+
+def _extracted_fields(extracted_data: Dict, file_path: Path) -> Dict:
+    """Invoice column values taken from an OCR extraction result"""
+    # Get dates safely - OCR service returns date objects or None
+    amounts = extracted_data.get("amounts", {})
+    return {
+        "issue_date": parse_date_safe(extracted_data.get("issue_date")) or datetime.now().date(),
+        "due_date": parse_date_safe(extracted_data.get("due_date")),
+        "subtotal": amounts.get("subtotal", 0.0) or 0.0,
+        "tax": amounts.get("tax", 0.0) or 0.0,
+        "total": amounts.get("total", 0.0) or 0.0,
+        "image_path": str(file_path),
+        "raw_text": extracted_data.get("raw_text"),
+        "ocr_confidence": extracted_data.get("ocr_confidence"),
+        "extraction_status": "completed",
+    }
+
+
+def _apply_fields(invoice: Invoice, fields: Dict):
+    """Update an existing invoice, keeping its due date when none was extracted"""
+    for field, value in fields.items():
+        if field == "due_date" and value is None:
+            continue
+        setattr(invoice, field, value)
+
+
+def _build_items(invoice_id: int, items_data: List[dict]) -> List[InvoiceItem]:
+    items = []
+    for item_data in items_data:
+        try:
+            items.append(_build_item(invoice_id, item_data))
+        except (ValueError, TypeError) as e:
+            print(f"Warning: Could not add invoice item: {e}")
+            # Continue with other items
+    return items
+
+
+def save_extracted_invoice(
+    db: Session,
+    extracted_data: Dict,
+    file_path: Path,
+    timestamp: Optional[str] = None,
+    placeholder: Optional[Invoice] = None,
+    matches: Optional[Dict[str, EntityMatch]] = None
+) -> Invoice:
+    """
+    Create or update the invoice described by an OCR extraction result.
+
+    An invoice with the same number from the same supplier is updated in place.
+    When a pending placeholder invoice is given (background OCR jobs), it is
+    filled in, or removed if the scan turned out to duplicate an existing invoice.
+    How the supplier and customer were matched is stored in `matches` if given.
+    The caller commits.
+    """
+    # Get or create supplier
+    supplier, supplier_match = resolve_supplier(db, extracted_data.get("supplier", {}))
+
+    # Get or create customer
+    customer, customer_match = resolve_customer(db, extracted_data.get("customer", {}))
+    if matches is not None:
+        matches.update(supplier=supplier_match, customer=customer_match)
+
+    # Check if invoice already exists
+    existing_invoice = None
+    if extracted_data.get("invoice_number"):
+        query = db.query(Invoice).filter(
+            Invoice.invoice_number == extracted_data["invoice_number"],
+            Invoice.supplier_id == supplier.id
+        )
+        if placeholder is not None:
+            query = query.filter(Invoice.id != placeholder.id)
+        existing_invoice = query.first()
+
+    fields = _extracted_fields(extracted_data, file_path)
+
+    if existing_invoice and placeholder is not None:
+        # The scan duplicates a known invoice, drop the placeholder
+        rollup_service.remove_invoice(db, placeholder)
+        db.delete(placeholder)
+
+    invoice = existing_invoice or placeholder
+    if invoice is not None:
+        # Update existing invoice (or fill in the placeholder)
+        rollup_snapshot = rollup_service.snapshot(invoice)
+        if extracted_data.get("invoice_number"):
+            invoice.invoice_number = extracted_data["invoice_number"]
+        if invoice is placeholder:
+            invoice.customer_id = customer.id
+            invoice.supplier_id = supplier.id
+        _apply_fields(invoice, fields)
+        rollup_service.replace(db, rollup_snapshot, invoice)
+    else:
+        # Create new invoice
+        invoice = Invoice(
+            invoice_number=extracted_data.get("invoice_number") or f"INV-{timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            customer_id=customer.id,
+            supplier_id=supplier.id,
+            **fields
+        )
+        db.add(invoice)
+        db.flush()  # Get invoice ID
+        rollup_service.add_invoice(db, invoice)
+
+    # Add invoice items if any
+    items_data = extracted_data.get("items", [])
+    if items_data:
+        # Delete existing items if updating
+        if existing_invoice:
+            db.query(InvoiceItem).filter(
+                InvoiceItem.invoice_id == invoice.id
+            ).delete()
+        db.add_all(_build_items(invoice.id, items_data))
+
+    return invoice
+
+
+def save_extracted_invoices(
+    db: Session,
+    batch: List[Tuple[Dict, Path, str]],
+    matches: Optional[List[Dict[str, EntityMatch]]] = None
+) -> List[Invoice]:
+    """
+    Bulk version of save_extracted_invoice for (extracted_data, file_path, timestamp)
+    entries: one duplicate lookup for the whole batch, one batched INSERT for new
+    invoices and one for their items. Returns invoices in input order (and appends
+    each entry's supplier/customer matches to `matches` if given); the caller commits.
+    """
+    resolved = []
+    for extracted_data, file_path, timestamp in batch:
+        supplier, supplier_match = resolve_supplier(db, extracted_data.get("supplier", {}))
+        customer, customer_match = resolve_customer(db, extracted_data.get("customer", {}))
+        if matches is not None:
+            matches.append({"supplier": supplier_match, "customer": customer_match})
+        resolved.append((extracted_data, file_path, timestamp, supplier.id, customer.id))
+
+    # Single duplicate lookup for every invoice number in the batch
+    numbers = {entry[0]["invoice_number"] for entry in resolved if entry[0].get("invoice_number")}
+    known: Dict[Tuple[str, int], Invoice] = {}
+    if numbers:
+        for existing in db.query(Invoice).filter(Invoice.invoice_number.in_(numbers)):
+            known.setdefault((existing.invoice_number, existing.supplier_id), existing)
+
+    snapshots = {}
+    new_invoices = []
+    results = []
+    items_by_invoice = {}
+    for extracted_data, file_path, timestamp, supplier_id, customer_id in resolved:
+        fields = _extracted_fields(extracted_data, file_path)
+        number = extracted_data.get("invoice_number")
+        invoice = known.get((number, supplier_id)) if number else None
+        if invoice is not None:
+            if invoice.id is not None and invoice.id not in snapshots:
+                snapshots[invoice.id] = rollup_service.snapshot(invoice)
+            _apply_fields(invoice, fields)
+        else:
+            invoice = Invoice(
+                invoice_number=number or f"INV-{timestamp}",
+                customer_id=customer_id,
+                supplier_id=supplier_id,
+                **fields
+            )
+            new_invoices.append(invoice)
+            if number:
+                known[(number, supplier_id)] = invoice
+        results.append(invoice)
+        if extracted_data.get("items"):
+            # The last scan of a repeated invoice provides its items
+            items_by_invoice[id(invoice)] = (invoice, extracted_data["items"])
+
+    db.add_all(new_invoices)
+    db.flush()  # One batched INSERT for all new invoices
+
+    # Items of re-uploaded invoices are replaced, as in save_extracted_invoice
+    replaced_ids = {invoice.id for invoice, _ in items_by_invoice.values() if invoice.id in snapshots}
+    if replaced_ids:
+        db.query(InvoiceItem).filter(
+            InvoiceItem.invoice_id.in_(replaced_ids)
+        ).delete(synchronize_session=False)
+    for invoice, items_data in items_by_invoice.values():
+        db.add_all(_build_items(invoice.id, items_data))
+
+    for invoice in new_invoices:
+        rollup_service.add_invoice(db, invoice)
+    for invoice_id, rollup_snapshot in snapshots.items():
+        rollup_service.replace(db, rollup_snapshot, db.get(Invoice, invoice_id))
+
+    return results
+
+
+def create_placeholder_invoice(
+    db: Session,
+    file_path: Path,
+    timestamp: str,
+    extraction_status: str = "pending"
+) -> Invoice:
+    """Save an invoice for a scan whose fields are not (or could not be) extracted yet"""
+    supplier = get_or_create_supplier(db, {"name": "Unknown Supplier"})
+    customer = get_or_create_customer(db, {"name": "Unknown Customer"})
+    invoice = Invoice(
+        invoice_number=f"INV-{timestamp}",
+        issue_date=datetime.now().date(),
+        customer_id=customer.id,
+        supplier_id=supplier.id,
+        image_path=str(file_path),
+        extraction_status=extraction_status
+    )
+    db.add(invoice)
+    db.flush()
+    rollup_service.add_invoice(db, invoice)
+    return invoice
+
+
+def to_extracted_invoice_data(extracted_data: Dict) -> ExtractedInvoiceData:
+    """Build the API representation of an OCR extraction result"""
+    return ExtractedInvoiceData(
+        invoice_number=extracted_data.get("invoice_number"),
+        issue_date=extracted_data.get("issue_date"),
+        due_date=extracted_data.get("due_date"),
+        amounts=extracted_data.get("amounts", {}),
+        supplier=extracted_data.get("supplier", {}),
+        customer=extracted_data.get("customer", {}),
+        items=extracted_data.get("items", []),
+        raw_text=extracted_data.get("raw_text"),
+        ocr_confidence=extracted_data.get("ocr_confidence")
+    )
@@ -0,0 +1,213 @@
+"""
+Bulk ledger export
+Streams invoices, invoice items or forecasts as CSV, Parquet or Arrow IPC.
+Rows come straight from a server-side cursor as plain Core tuples (no ORM
+objects, no Pydantic models) and are encoded one batch at a time, so memory
+stays bounded by the batch size whatever the table size.
+
+The invoices export uses the import's column names (customer_name,
+supplier_tax_id, ...), so an export can be loaded back with
+POST /invoices/import.
+"""
+
+import csv
+import io
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, select
+from sqlalchemy.sql import Select
+
+from ..database import engine
+from ..models import Invoice, InvoiceItem, Customer, Supplier, Forecast
+
+EXPORT_BATCH_SIZE = 50000
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class LedgerExportError(Exception):
+    """Raised for an export that cannot be produced (unknown dataset or format, missing pyarrow)"""
+
+
+def _date_filter(query: Select, start_date: Optional[date], end_date: Optional[date]) -> Select:
+    if start_date:
+        query = query.where(Invoice.issue_date >= start_date)
+    if end_date:
+        query = query.where(Invoice.issue_date <= end_date)
+    return query
+
+
+def _invoices_query(start_date: Optional[date], end_date: Optional[date]) -> Select:
+    query = select(
+        Invoice.id,
+        Invoice.invoice_number,
+        Invoice.issue_date,
+        Invoice.due_date,
+        Invoice.subtotal,
+        Invoice.tax,
+        Invoice.total,
+        Invoice.status,
+        Invoice.paid_date,
+        Invoice.extraction_status,
+        Invoice.customer_id,
+        Customer.name.label("customer_name"),
+        Customer.tax_id.label("customer_tax_id"),
+        Invoice.supplier_id,
+        Supplier.name.label("supplier_name"),
+        Supplier.tax_id.label("supplier_tax_id"),
+        Invoice.created_at,
+    ).outerjoin(Customer, Invoice.customer_id == Customer.id).outerjoin(Supplier, Invoice.supplier_id == Supplier.id)
+    return _date_filter(query, start_date, end_date).order_by(Invoice.id)
+
+
+def _items_query(start_date: Optional[date], end_date: Optional[date]) -> Select:
+    query = select(
+        InvoiceItem.id,
+        InvoiceItem.invoice_id,
+        InvoiceItem.description,
+        InvoiceItem.quantity,
+        InvoiceItem.unit_price,
+        InvoiceItem.discount,
+        InvoiceItem.tax_rate,
+        InvoiceItem.tax_amount,
+        InvoiceItem.total,
+    )
+    if start_date or end_date:
+        query = _date_filter(query.join(Invoice, InvoiceItem.invoice_id == Invoice.id), start_date, end_date)
+    return query.order_by(InvoiceItem.id)
+
+
+def _forecasts_query(start_date: Optional[date], end_date: Optional[date]) -> Select:
+    query = select(
+        Forecast.id,
+        Forecast.invoice_id,
+        Forecast.run_id,
+        Forecast.is_current,
+        Forecast.predicted_payment_date,
+        Forecast.confidence_score,
+        Forecast.prediction_method,
+        Forecast.risk_score,
+        Forecast.created_at,
+    )
+    if start_date or end_date:
+        query = _date_filter(query.join(Invoice, Forecast.invoice_id == Invoice.id), start_date, end_date)
+    return query.order_by(Forecast.id)
+
+
+EXPORT_DATASETS: Dict[str, Callable[[Optional[date], Optional[date]], Select]] = {
+    "invoices": _invoices_query,
+    "items": _items_query,
+    "forecasts": _forecasts_query,
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise LedgerExportError("Parquet and Arrow exports require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _arrow_schema(pa, query: Select):
+    fields = []
+    for column in query.selected_columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _csv_batches(columns: List[str], partitions) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _arrow_batches(fmt: str, schema, partitions) -> Iterator[bytes]:
+    pa = _import_pyarrow()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for rows in partitions:
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        if fmt == "parquet":
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        else:
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def prepare_export(dataset: str, fmt: str, start_date: Optional[date] = None,
+                   end_date: Optional[date] = None) -> Iterator[bytes]:
+    """
+    Validate an export request and return its byte stream
+
+    Validation happens here, before the first byte is sent, so that errors can
+    still become a 400 response; the query only runs once the stream is consumed.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise LedgerExportError(f"Unknown dataset. Allowed: {', '.join(EXPORT_DATASETS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise LedgerExportError(f"Unknown format. Allowed: {', '.join(EXPORT_FORMATS)}")
+    query = EXPORT_DATASETS[dataset](start_date, end_date)
+    schema = _arrow_schema(_import_pyarrow(), query) if fmt != "csv" else None
+
+    def stream() -> Iterator[bytes]:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(query)
+            partitions = result.partitions()
+            if fmt == "csv":
+                yield from _csv_batches(list(result.keys()), partitions)
+            else:
+                yield from _arrow_batches(fmt, schema, partitions)
+
+    return stream()
@@ -0,0 +1,375 @@
+"""
+Bulk ledger import
+Loads historical invoices from CSV, XLSX or Parquet files in fixed-size chunks:
+each chunk is validated with vectorized pandas operations, its customers and
+suppliers are resolved through an in-memory map, and its invoices and items
+are written with one bulk INSERT each and committed on their own, so memory
+stays bounded by the chunk size whatever the file size.
+
+One row per invoice, or several consecutive rows with the same invoice number
+and supplier for an invoice with several line items (invoice columns are taken
+from the first row). Invoices that already exist are reported and skipped.
+"""
+
+import time
+from contextlib import closing
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Invoice, InvoiceItem, Customer, Supplier
+from ..schemas import LedgerImportResult, LedgerImportRowError
+from . import rollup_service
+from .invoice_ingest import resolve_customer, resolve_supplier
+
+IMPORT_CHUNK_SIZE = 5000
+# Row errors returned in the response; further errors are only counted
+MAX_REPORTED_ERRORS = 1000
+
+SUPPORTED_EXTENSIONS = {".csv", ".xlsx", ".parquet"}
+
+# Accepted alternative column names (after lower-casing, spaces -> underscores)
+COLUMN_ALIASES = {
+    "invoice_no": "invoice_number",
+    "number": "invoice_number",
+    "date": "issue_date",
+    "invoice_date": "issue_date",
+    "amount": "total",
+    "customer": "customer_name",
+    "supplier": "supplier_name",
+    "description": "item_description",
+}
+
+TEXT_COLUMNS = ["invoice_number", "status", "customer_name", "customer_tax_id", "supplier_name", "supplier_tax_id"]
+AMOUNT_COLUMNS = ["subtotal", "tax", "total"]
+ITEM_AMOUNT_COLUMNS = ["item_quantity", "item_unit_price", "item_discount", "item_tax_rate", "item_tax_amount", "item_total"]
+ID_COLUMNS = ["customer_id", "supplier_id"]
+
+
+class LedgerImportError(Exception):
+    """Raised when a ledger file cannot be read at all (format, encoding, missing columns)"""
+
+
+def _read_csv(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    yield from reader
+
+
+def _read_xlsx(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else "" for name in header]
+        batch = []
+        for row in rows:
+            if any(value is not None for value in row):
+                batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def _read_parquet(file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise LedgerImportError("Parquet import requires pyarrow (pip install pyarrow)")
+    for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def read_chunks(file: BinaryIO, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield the rows of a ledger file as DataFrames of at most chunk_size rows"""
+    extension = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    readers = {".csv": _read_csv, ".xlsx": _read_xlsx, ".parquet": _read_parquet}
+    if extension not in readers:
+        raise LedgerImportError(f"Unsupported file type. Allowed: {', '.join(sorted(SUPPORTED_EXTENSIONS))}")
+    try:
+        yield from readers[extension](file, chunk_size)
+    except LedgerImportError:
+        raise
+    except Exception as e:
+        raise LedgerImportError(f"Could not read {filename}: {str(e)}")
+
+
+def _normalize_columns(chunk: pd.DataFrame) -> pd.DataFrame:
+    renamed = {}
+    for column in chunk.columns:
+        name = str(column).strip().lower().replace(" ", "_")
+        renamed[column] = COLUMN_ALIASES.get(name, name)
+    return chunk.rename(columns=renamed)
+
+
+def _text(chunk: pd.DataFrame, column: str) -> pd.Series:
+    if column not in chunk:
+        return pd.Series("", index=chunk.index, dtype=object)
+    return chunk[column].astype("string").fillna("").str.strip().astype(object)
+
+
+def _numbers(chunk: pd.DataFrame, column: str) -> Tuple[pd.Series, pd.Series]:
+    """Parsed values and a mask of non-empty values that are not numbers"""
+    raw = _text(chunk, column)
+    values = pd.to_numeric(raw.where(raw != ""), errors="coerce")
+    return values, (raw != "") & values.isna()
+
+
+def _dates(chunk: pd.DataFrame, column: str) -> Tuple[pd.Series, pd.Series]:
+    """ISO dates first, then day-first formats (31.12.2024, 31/12/2024)"""
+    if column in chunk and pd.api.types.is_datetime64_any_dtype(chunk[column]):
+        parsed = chunk[column]
+        return parsed, pd.Series(False, index=chunk.index)
+    raw = _text(chunk, column).map(lambda value: value[:10] if len(value) >= 10 and value[4:5] == "-" else value)
+    present = raw != ""
+    parsed = pd.to_datetime(raw.where(present), format="ISO8601", errors="coerce")
+    retry = present & parsed.isna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw[retry], dayfirst=True, format="mixed", errors="coerce")
+    return parsed, present & parsed.isna()
+
+
+def _invoice_runs(chunk: pd.DataFrame) -> pd.Series:
+    """Number consecutive rows of the same invoice (invoice number and supplier) alike"""
+    keys = _text(chunk, "invoice_number")
+    for column in ("supplier_name", "supplier_tax_id", "supplier_id"):
+        keys = keys + "\x1f" + _text(chunk, column)
+    return (keys != keys.shift()).cumsum()
+
+
+def _optional(value):
+    return None if pd.isna(value) else value
+
+
+class LedgerImporter:
+    """Imports one ledger file; entity lookups are memoized for the whole file"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.result = LedgerImportResult()
+        self._entity_ids: Dict[tuple, int] = {}
+        self._next_row = 1
+
+    def _error(self, row: int, invoice_number: Optional[str], error: str):
+        self.result.rows_failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(LedgerImportRowError(row=row, invoice_number=invoice_number or None, error=error))
+        else:
+            self.result.errors_truncated = True
+
+    def _entity_id(self, model, explicit_id, name: str, tax_id: str) -> Optional[int]:
+        """Resolve (or create) a customer/supplier, memoized by its raw identifying values"""
+        memo_key = (model.__tablename__, explicit_id, name, tax_id)
+        if memo_key in self._entity_ids:
+            return self._entity_ids[memo_key]
+        entity = self.db.get(model, int(explicit_id)) if explicit_id is not None else None
+        if entity is not None:
+            entity_id = entity.id
+        elif explicit_id is not None and not (name or tax_id):
+            entity_id = None
+        else:
+            # No id, or an id from another database (an export) with the name and tax ID alongside
+            resolve = resolve_supplier if model is Supplier else resolve_customer
+            entity, _ = resolve(self.db, {"name": name or None, "tax_id": tax_id or None})
+            entity_id = entity.id
+        self._entity_ids[memo_key] = entity_id
+        return entity_id
+
+    def _validate(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Typed columns plus an `error` column (empty for valid rows)"""
+        frame = pd.DataFrame({"source_row": chunk["source_row"]}, index=chunk.index)
+        errors = pd.Series("", index=chunk.index, dtype=object)
+        runs = _invoice_runs(chunk)
+        # Invoice columns are only read (and checked) on the first line of an invoice
+        first_line = runs != runs.shift()
+
+        def flag(mask: pd.Series, message: str):
+            errors[mask & (errors == "")] = message
+
+        for column in TEXT_COLUMNS:
+            frame[column] = _text(chunk, column)
+        flag(frame["invoice_number"] == "", "Missing invoice_number")
+
+        frame["issue_date"], invalid = _dates(chunk, "issue_date")
+        flag(first_line & frame["issue_date"].isna(), "Missing or invalid issue_date")
+        frame["due_date"], invalid = _dates(chunk, "due_date")
+        flag(first_line & invalid, "Invalid due_date")
+        frame["paid_date"], invalid = _dates(chunk, "paid_date")
+        flag(first_line & invalid, "Invalid paid_date")
+
+        for column in AMOUNT_COLUMNS:
+            frame[column], invalid = _numbers(chunk, column)
+            flag(first_line & invalid, f"Invalid {column}")
+        frame["total"] = frame["total"].fillna(frame["subtotal"] + frame["tax"].fillna(0))
+        flag(first_line & frame["total"].isna(), "Missing total (or subtotal)")
+
+        for column in ITEM_AMOUNT_COLUMNS + ID_COLUMNS:
+            frame[column], invalid = _numbers(chunk, column)
+            flag(invalid, f"Invalid {column}")
+        frame["item_description"] = _text(chunk, "item_description")
+
+        # Further lines of an invoice that failed are skipped with it
+        first_error = errors.where(first_line).groupby(runs).transform("first")
+        flag(~first_line & (first_error != ""), "Invoice line skipped: first line of the invoice is invalid")
+
+        frame["error"] = errors
+        return frame
+
+    def _import_chunk(self, chunk: pd.DataFrame):
+        frame = self._validate(chunk)
+        for row in frame[frame["error"] != ""].itertuples(index=False):
+            self._error(row.source_row, row.invoice_number, row.error)
+        frame = frame[frame["error"] == ""]
+        if frame.empty:
+            return
+
+        db = self.db
+        try:
+            supplier_ids = [
+                self._entity_id(Supplier, _optional(row.supplier_id), row.supplier_name, row.supplier_tax_id)
+                for row in frame.itertuples(index=False)
+            ]
+            customer_ids = [
+                self._entity_id(Customer, _optional(row.customer_id), row.customer_name, row.customer_tax_id)
+                for row in frame.itertuples(index=False)
+            ]
+            frame = frame.assign(supplier_key=supplier_ids, customer_key=customer_ids)
+
+            # Existing invoices (earlier chunks are already committed)
+            numbers = frame["invoice_number"].unique().tolist()
+            existing = set(db.execute(
+                select(Invoice.invoice_number, Invoice.supplier_id).where(Invoice.invoice_number.in_(numbers))
+            ).all())
+
+            invoice_rows: List[dict] = []
+            item_rows: List[Tuple[tuple, dict]] = []
+            deltas: Dict[tuple, List[float]] = {}
+            # Rows reported above are not reported again if the chunk fails to commit
+            reported = set()
+            previous_key = skipped_key = None
+            for row in frame.itertuples(index=False):
+                if pd.isna(row.supplier_key) or pd.isna(row.customer_key):
+                    missing = "supplier_id" if pd.isna(row.supplier_key) else "customer_id"
+                    self._error(row.source_row, row.invoice_number, f"Unknown {missing}")
+                    reported.add(row.source_row)
+                    continue
+                key = (row.invoice_number, int(row.supplier_key))
+                if key != previous_key:
+                    previous_key = key
+                    if key in existing:
+                        skipped_key = key
+                        self._error(row.source_row, row.invoice_number, "Invoice already exists")
+                        reported.add(row.source_row)
+                        continue
+                    existing.add(key)
+                    status = row.status.lower() or None
+                    invoice_rows.append({
+                        "invoice_number": row.invoice_number,
+                        "issue_date": row.issue_date.date(),
+                        "due_date": row.due_date.date() if not pd.isna(row.due_date) else None,
+                        "paid_date": row.paid_date.date() if not pd.isna(row.paid_date) else None,
+                        "subtotal": float(_optional(row.subtotal) or 0.0),
+                        "tax": float(_optional(row.tax) or 0.0),
+                        "total": float(row.total),
+                        "customer_id": int(row.customer_key),
+                        "supplier_id": int(row.supplier_key),
+                        "status": status,
+                        "extraction_status": "completed",
+                    })
+                    bucket = deltas.setdefault(
+                        (row.issue_date.date(), rollup_service.rollup_status(status), int(row.supplier_key), int(row.customer_key)),
+                        [0.0, 0.0, 0]
+                    )
+                    bucket[0] += float(row.total)
+                    bucket[1] += float(_optional(row.tax) or 0.0)
+                    bucket[2] += 1
+                elif key == skipped_key:
+                    # Further line of an invoice that was skipped as a duplicate
+                    self._error(row.source_row, row.invoice_number, "Invoice already exists")
+                    reported.add(row.source_row)
+                    continue
+                if row.item_description or not pd.isna(row.item_total):
+                    item_rows.append((key, {
+                        "description": row.item_description,
+                        "quantity": float(_optional(row.item_quantity) or 1.0),
+                        "unit_price": _optional(row.item_unit_price),
+                        "discount": float(_optional(row.item_discount) or 0.0),
+                        "tax_rate": float(_optional(row.item_tax_rate) or 0.0),
+                        "tax_amount": float(_optional(row.item_tax_amount) or 0.0),
+                        "total": float(_optional(row.item_total) or 0.0),
+                    }))
+
+            if invoice_rows:
+                # RETURNING the natural key instead of relying on row order: ordered RETURNING
+                # (sort_by_parameter_order) degrades to one statement per row on SQLite
+                invoice_ids = {
+                    (number, supplier_id): invoice_id
+                    for invoice_id, number, supplier_id in db.execute(
+                        insert(Invoice).returning(Invoice.id, Invoice.invoice_number, Invoice.supplier_id),
+                        invoice_rows
+                    )
+                }
+                if item_rows:
+                    db.execute(insert(InvoiceItem), [
+                        {**item, "invoice_id": invoice_ids[key]} for key, item in item_rows
+                    ])
+                rollup_service.apply_deltas(db, deltas)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Entities created in this chunk were rolled back with it
+            self._entity_ids.clear()
+            for row in frame.itertuples(index=False):
+                if row.source_row not in reported:
+                    self._error(row.source_row, row.invoice_number, f"Database error: {str(e)}")
+            return
+
+        self.result.invoices_created += len(invoice_rows)
+        self.result.items_created += len(item_rows)
+
+    def run(self, chunks: Iterator[pd.DataFrame]) -> LedgerImportResult:
+        started = time.perf_counter()
+        pending = None
+        for chunk in chunks:
+            chunk = _normalize_columns(chunk)
+            if self._next_row == 1 and "invoice_number" not in chunk:
+                raise LedgerImportError("Missing required column: invoice_number")
+            chunk["source_row"] = range(self._next_row, self._next_row + len(chunk))
+            self._next_row += len(chunk)
+            self.result.rows_read += len(chunk)
+            if chunk.empty:
+                continue
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+
+            # Hold back the last invoice, its lines may continue in the next chunk
+            runs = _invoice_runs(chunk)
+            last_run = runs == runs.iloc[-1]
+            pending = chunk[last_run]
+            if not last_run.all():
+                self._import_chunk(chunk[~last_run])
+        if pending is not None and not pending.empty:
+            self._import_chunk(pending)
+
+        self.result.elapsed_seconds = round(time.perf_counter() - started, 3)
+        return self.result
+
+
+def import_ledger(file: BinaryIO, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> LedgerImportResult:
+    """Import a CSV, XLSX or Parquet ledger file (blocking, run it off the event loop)"""
+    db = SessionLocal()
+    try:
+        with closing(read_chunks(file, filename, chunk_size)) as chunks:
+            return LedgerImporter(db).run(chunks)
+    finally:
+        db.close()
@@ -0,0 +1,147 @@
+"""
+Content-addressed OCR result cache
+Re-uploads of the same scan skip preprocessing and OCR: extraction results
+are stored in a local SQLite file under the SHA-256 of the file bytes plus the
+OCR configuration that produced them (backend, languages and
+PREPROCESS_VERSION, reported by the worker processes), so changing any of
+those never serves a stale result.
+
+The store is bounded by the total size of the cached results; the least
+recently used entries are evicted first.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import BinaryIO, Dict, Optional
+
+from ..config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Extraction result fields holding dates (stored as ISO strings)
+DATE_FIELDS = ("issue_date", "due_date")
+
+
+def sha256_stream(source: BinaryIO, sink: Optional[BinaryIO] = None) -> str:
+    """SHA-256 of a stream, optionally copying it to `sink` in the same pass"""
+    digest = hashlib.sha256()
+    while True:
+        chunk = source.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        if sink is not None:
+            sink.write(chunk)
+    return digest.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as handle:
+        return sha256_stream(handle)
+
+
+def _encode(result: Dict) -> str:
+    return json.dumps(result, default=lambda value: value.isoformat() if isinstance(value, date) else str(value))
+
+
+def _decode(payload: str) -> Dict:
+    result = json.loads(payload)
+    for field in DATE_FIELDS:
+        if isinstance(result.get(field), str):
+            result[field] = date.fromisoformat(result[field])
+    return result
+
+
+class OCRResultCache:
+    """Extraction results by (content hash, OCR fingerprint), LRU-evicted above max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        if enabled:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                "key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, result TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_used ON ocr_cache (last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(content_hash: str, fingerprint: str) -> str:
+        return f"{content_hash}:{fingerprint}"
+
+    def get(self, content_hash: str, fingerprint: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        key = self.key(content_hash, fingerprint)
+        conn = self._conn()
+        row = conn.execute("SELECT result FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        conn.execute("UPDATE ocr_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return _decode(row[0])
+
+    def put(self, content_hash: str, fingerprint: str, result: Dict):
+        if not self.enabled:
+            return
+        payload = _encode(result)
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO ocr_cache (key, sha256, result, size, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.key(content_hash, fingerprint), content_hash, payload, len(payload), now, now)
+        )
+        # Keep the most recently used entries that fit in max_bytes
+        conn.execute(
+            "DELETE FROM ocr_cache WHERE key IN (SELECT key FROM ("
+            "SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM ocr_cache"
+            ") WHERE running > ?)", (self.max_bytes,)
+        )
+
+    def stats(self) -> Dict:
+        entries, size = (0, 0)
+        if self.enabled:
+            entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return {"enabled": self.enabled, "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        if self.enabled:
+            self._conn().execute("DELETE FROM ocr_cache")
+
+
+# Global OCR result cache
+_ocr_cache = None
+
+
+def get_ocr_cache() -> OCRResultCache:
+    """Get or create OCR result cache instance"""
+    global _ocr_cache
+    if _ocr_cache is None:
+        _ocr_cache = OCRResultCache(
+            settings.ocr_cache_path,
+            settings.ocr_cache_max_mb * 1024 * 1024,
+            enabled=settings.ocr_cache_enabled
+        )
+    return _ocr_cache
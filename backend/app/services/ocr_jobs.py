@@ -0,0 +1,219 @@
+"""
+Background OCR jobs
+Uploads in job mode are saved as pending invoices plus a row in the ocr_jobs
+table; this runner claims queued jobs, extracts them in the OCR worker pool and
+fills in the invoice. The table is the queue, so pending work survives restarts.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Set
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models import Invoice, OCRJob
+from ..schemas import ExtractedInvoiceData, OCRJobStatus
+from . import invoice_ingest
+from .ocr_worker import get_ocr_pool, OCRQueueFullError, OCR_WORKERS
+
+OCR_JOB_MAX_ATTEMPTS = settings.ocr_job_max_attempts
+OCR_JOB_POLL_INTERVAL = settings.ocr_job_poll_interval
+
+
+def enqueue_job(db: Session, invoice: Invoice, file_path: Path) -> OCRJob:
+    """Queue OCR extraction for a pending invoice (the caller commits)"""
+    job = OCRJob(
+        id=uuid.uuid4().hex,
+        invoice_id=invoice.id,
+        file_path=str(file_path),
+        status="queued",
+        progress=0
+    )
+    db.add(job)
+    return job
+
+
+def job_status(job: OCRJob) -> OCRJobStatus:
+    """API representation of a job, including the extraction result once completed"""
+    return OCRJobStatus(
+        id=job.id,
+        status=job.status,
+        progress=job.progress,
+        invoice_id=job.invoice_id,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        extracted_data=ExtractedInvoiceData.model_validate_json(job.result) if job.result else None
+    )
+
+
+class OCRJobRunner:
+    """Polls the ocr_jobs table and processes queued jobs with bounded concurrency"""
+
+    def __init__(self, concurrency: int = OCR_WORKERS, poll_interval: float = OCR_JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._active: Set[asyncio.Task] = set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._recover()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            for task in list(self._active):
+                task.cancel()
+            await asyncio.gather(self._task, *self._active, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        """Wake the runner after new jobs were committed"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _recover(self):
+        """Jobs left running by a previous process go back to the queue"""
+        db = SessionLocal()
+        try:
+            recovered = db.query(OCRJob).filter(OCRJob.status == "running").update(
+                {"status": "queued", "progress": 0}, synchronize_session=False
+            )
+            db.commit()
+            if recovered:
+                print(f"♻️ Requeued {recovered} interrupted OCR job(s)")
+        finally:
+            db.close()
+
+    def _claim(self, limit: int) -> list:
+        """
+        Mark up to `limit` queued jobs as running and return their IDs
+
+        Each job is claimed with a conditional UPDATE (WHERE status = 'queued'):
+        when several app workers poll the same table, only the one whose update
+        hits the row gets the job.
+        """
+        db = SessionLocal()
+        try:
+            candidates = db.query(OCRJob.id, OCRJob.attempts, OCRJob.invoice_id).filter(
+                OCRJob.status == "queued"
+            ).order_by(OCRJob.created_at).limit(limit).all()
+            claimed = []
+            now = datetime.utcnow()
+            for job_id, attempts, invoice_id in candidates:
+                still_queued = db.query(OCRJob).filter(OCRJob.id == job_id, OCRJob.status == "queued")
+                if attempts + 1 > OCR_JOB_MAX_ATTEMPTS:
+                    failed = still_queued.update({
+                        "status": "failed",
+                        "attempts": OCRJob.attempts + 1,
+                        "error": "Maximum number of attempts exceeded",
+                        "finished_at": now
+                    }, synchronize_session=False)
+                    if failed == 1 and invoice_id:
+                        db.query(Invoice).filter(Invoice.id == invoice_id).update(
+                            {"extraction_status": "failed"}, synchronize_session=False
+                        )
+                    continue
+                if still_queued.update({
+                    "status": "running",
+                    "attempts": OCRJob.attempts + 1,
+                    "progress": 10,
+                    "started_at": now
+                }, synchronize_session=False) == 1:
+                    claimed.append(job_id)
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            free_slots = self.concurrency - len(self._active)
+            if free_slots > 0:
+                for job_id in self._claim(free_slots):
+                    task = asyncio.create_task(self._process(job_id))
+                    self._active.add(task)
+                    task.add_done_callback(self._active.discard)
+                    task.add_done_callback(lambda _task: self.notify())
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = db.query(OCRJob).filter(OCRJob.id == job_id).first()
+            try:
+                extracted_data = await get_ocr_pool().process_invoice(job.file_path)
+            except OCRQueueFullError:
+                # Shared pool is busy with synchronous uploads, try again on the next poll
+                job.status = "queued"
+                job.progress = 0
+                job.attempts -= 1
+                db.commit()
+                await asyncio.sleep(self.poll_interval)
+                return
+            except Exception as e:
+                self._fail(db, job, f"OCR processing failed: {str(e)}")
+                db.commit()
+                return
+
+            job.progress = 80
+            placeholder = db.query(Invoice).filter(Invoice.id == job.invoice_id).first() if job.invoice_id else None
+            if placeholder is None:
+                self._fail(db, job, "Invoice was deleted before extraction finished")
+                db.commit()
+                return
+
+            invoice = invoice_ingest.save_extracted_invoice(
+                db, extracted_data, Path(job.file_path), placeholder=placeholder
+            )
+            job.invoice_id = invoice.id
+            job.result = invoice_ingest.to_extracted_invoice_data(extracted_data).model_dump_json()
+            job.status = "completed"
+            job.progress = 100
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"OCR job {job_id} failed: {e}")
+            job = db.query(OCRJob).filter(OCRJob.id == job_id).first()
+            if job is not None:
+                self._fail(db, job, f"Error saving invoice: {str(e)}")
+                db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _fail(db: Session, job: OCRJob, error: str):
+        job.status = "failed"
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        if job.invoice_id:
+            db.query(Invoice).filter(Invoice.id == job.invoice_id).update(
+                {"extraction_status": "failed"}, synchronize_session=False
+            )
+
+
+# Global instance (started on application startup)
+_job_runner_instance = None
+
+
+def get_job_runner() -> OCRJobRunner:
+    """Get or create the OCR job runner"""
+    global _job_runner_instance
+    if _job_runner_instance is None:
+        _job_runner_instance = OCRJobRunner()
+    return _job_runner_instance
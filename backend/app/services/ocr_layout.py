@@ -0,0 +1,346 @@
+"""
+Layout-aware invoice extraction from OCR word boxes
+Keeps what the OCR engine knows about each word's position (its box, and
+Tesseract's block and line numbers) instead of flattening the page into one
+string, and reads the page the way it is printed:
+
+- rows: words whose vertical centres lie within half a line height of each
+  other, ordered left to right
+- cells: runs of words in a row separated by less than CELL_GAP line heights
+- line items: the row whose words match the rule table's column headers
+  ("Miktar", "Birim Fiyat", "KDV Oranı", ...) fixes the column spans; the rows
+  below it, up to the totals block, are split into cells and each cell is
+  assigned to the column it overlaps
+- key-value pairs: the value of a label ("Fatura No", "Ödenecek Tutar", ...)
+  is the first parseable text right of it on the same row or in the cell
+  just below it
+
+Word attributes are parallel NumPy arrays, so grouping, column assignment and
+the label searches are array operations rather than per-word Python loops.
+Pages are kept as separate layouts (coordinates of a PDF text layer and of an
+OCRed page are not comparable).
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .extraction_rules import RULES
+from ..schemas import InvoiceItemCreate
+
+ROW_TOLERANCE = 0.5  # Line heights between word centres that still share a row
+CELL_GAP = 1.0  # Line heights of horizontal space that separate two cells
+MAX_VALUE_DISTANCE = 25.0  # Line heights between a label and a value on its right
+MAX_VALUE_BELOW = 2.5  # Line heights between a label and a value under it
+MIN_HEADER_COLUMNS = 3  # Matched column headers that make a row the item table header
+
+_FOLDS = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_EDGE_PUNCTUATION = ":;,.()[]|*#\"'"
+_NUMBER = re.compile(r"\d[\d.,]*")
+_AMOUNT = re.compile(r"(?<![%\d.,])\d[\d.,]*(?![\d.,]*\s*%)")  # Not a percentage
+_DATE = re.compile(r"\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}|\d{4}-\d{2}-\d{2}")
+
+
+def fold_word(word: str) -> str:
+    """Lower-case, ASCII-folded word without surrounding punctuation"""
+    return word.replace("İ", "i").lower().translate(_FOLDS).strip(_EDGE_PUNCTUATION)
+
+
+def _phrases(spec: Dict[str, List[str]]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """(name, folded words) for every phrase, longest first"""
+    phrases = [(name, tuple(fold_word(word) for word in phrase.split()))
+               for name, values in (spec or {}).items() for phrase in values]
+    return sorted(phrases, key=lambda item: -len(" ".join(item[1])))
+
+
+ITEM_COLUMNS = _phrases(RULES.layout.get("item_columns"))
+ITEM_TABLE_END = _phrases({"end": RULES.layout.get("item_table_end", [])})
+KEY_LABELS = {name: [phrase for _, phrase in _phrases({name: labels})]
+              for name, labels in RULES.layout.get("key_values", {}).items()}
+
+
+class Layout:
+    """
+    The words of one page with their boxes, as parallel arrays, plus the row
+    and cell structure derived from them
+    """
+
+    def __init__(self, text: Sequence[str], left, top, width, height, conf=None, block=None, line=None):
+        self.text = np.asarray(text, dtype=object)
+        self.left = np.asarray(left, dtype=np.float64)
+        self.top = np.asarray(top, dtype=np.float64)
+        self.right = self.left + np.asarray(width, dtype=np.float64)
+        self.bottom = self.top + np.asarray(height, dtype=np.float64)
+        count = len(self.text)
+        self.conf = np.asarray(conf if conf is not None else np.ones(count), dtype=np.float64)
+        self.block = np.asarray(block if block is not None else np.zeros(count), dtype=np.int64)
+        self.line = np.asarray(line if line is not None else np.zeros(count), dtype=np.int64)
+        self.folded = np.array([fold_word(word) for word in self.text], dtype=object)
+        self.line_height = float(np.median(self.bottom - self.top)) if count else 0.0
+        self._group()
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @classmethod
+    def from_tesseract(cls, data: Dict, min_confidence: float = 30) -> "Layout":
+        """Words of pytesseract.image_to_data(..., output_type=DICT) above min_confidence"""
+        conf = np.asarray(data["conf"], dtype=np.float64)
+        text = np.asarray(data["text"], dtype=object)
+        keep = np.flatnonzero((conf > min_confidence) & np.array([bool(str(word).strip()) for word in text], dtype=bool))
+        block = np.asarray(data["block_num"]) * 1000 + np.asarray(data["par_num"])
+        return cls([str(word) for word in text[keep]],
+                   np.asarray(data["left"])[keep], np.asarray(data["top"])[keep],
+                   np.asarray(data["width"])[keep], np.asarray(data["height"])[keep],
+                   conf[keep] / 100.0, block[keep], np.asarray(data["line_num"])[keep])
+
+    @classmethod
+    def from_pdf_words(cls, words: List[tuple]) -> "Layout":
+        """Words of a PDF text layer: PyMuPDF page.get_text("words") tuples"""
+        if not words:
+            return cls([], [], [], [], [])
+        x0, y0, x1, y1 = (np.array([word[i] for word in words], dtype=np.float64) for i in range(4))
+        return cls([word[4] for word in words], x0, y0, x1 - x0, y1 - y0,
+                   block=[word[5] for word in words], line=[word[6] for word in words])
+
+    @classmethod
+    def from_easyocr(cls, results: List[tuple], min_confidence: float = 0.3) -> "Layout":
+        """Text segments of easyocr readtext(): (corner points, text, confidence)"""
+        results = [result for result in results if result[2] > min_confidence and result[1].strip()]
+        if not results:
+            return cls([], [], [], [], [])
+        corners = np.array([result[0] for result in results], dtype=np.float64)  # (n, 4, 2)
+        low, high = corners.min(axis=1), corners.max(axis=1)
+        return cls([result[1] for result in results], low[:, 0], low[:, 1],
+                   high[:, 0] - low[:, 0], high[:, 1] - low[:, 1], [result[2] for result in results])
+
+    def _group(self):
+        """Rows, reading order and cells"""
+        count = len(self)
+        self.row = np.zeros(count, dtype=np.int64)
+        self.order = np.arange(count)
+        self.cell = np.zeros(count, dtype=np.int64)
+        self.cells: List[np.ndarray] = []
+        self.rows: List[np.ndarray] = []
+        self.cell_end = self.cell_row = np.zeros(0, dtype=np.int64)
+        self.cell_left = self.cell_right = self.cell_top = np.zeros(0)
+        if count == 0:
+            return
+
+        # A row ends where the next centre (top to bottom) is half a line lower
+        centre = (self.top + self.bottom) / 2
+        by_centre = np.argsort(centre, kind="stable")
+        breaks = np.diff(centre[by_centre]) > self.line_height * ROW_TOLERANCE
+        self.row[by_centre] = np.concatenate(([0], np.cumsum(breaks)))
+        self.order = np.lexsort((self.left, self.row))
+
+        # A cell ends at a row change or a gap wider than CELL_GAP line heights
+        ordered_row = self.row[self.order]
+        gaps = self.left[self.order[1:]] - self.right[self.order[:-1]]
+        new_cell = (np.diff(ordered_row) != 0) | (gaps > self.line_height * CELL_GAP)
+        cell_of = np.concatenate(([0], np.cumsum(new_cell)))
+        self.cell[self.order] = cell_of
+        self.cells = np.split(self.order, np.flatnonzero(new_cell) + 1)
+        starts = np.concatenate(([0], np.flatnonzero(new_cell) + 1))
+        self.cell_end = np.append(starts[1:], count)  # Reading-order position after each cell
+        self.cell_left = np.minimum.reduceat(self.left[self.order], starts)
+        self.cell_right = np.maximum.reduceat(self.right[self.order], starts)
+        self.cell_top = np.minimum.reduceat(self.top[self.order], starts)
+        self.cell_row = ordered_row[starts]
+        self.rows = np.split(self.order, np.flatnonzero(np.diff(ordered_row)) + 1)
+
+    def words(self, indices) -> str:
+        return " ".join(self.text[indices])
+
+    def find(self, phrase: Tuple[str, ...]) -> np.ndarray:
+        """Reading-order positions where the phrase starts (its words consecutive on one row)"""
+        size = len(phrase)
+        count = len(self) - size + 1
+        if count <= 0:
+            return np.empty(0, dtype=np.int64)
+        tokens = self.folded[self.order]
+        rows = self.row[self.order]
+        match = tokens[:count] == phrase[0]
+        for offset in range(1, size):
+            match &= tokens[offset:offset + count] == phrase[offset]
+        match &= rows[:count] == rows[size - 1:size - 1 + count]
+        return np.flatnonzero(match)
+
+    def values_after(self, start: int, size: int) -> List[str]:
+        """
+        Candidate values of the label starting at reading-order position `start`,
+        nearest first: the rest of its cell ("Fatura No: ABC123"), the next cell
+        right of it on the row, then the cell just below it
+        """
+        end = start + size - 1  # Reading-order position of the label's last word
+        label = self.order[start:end + 1]
+        row = self.row[label[0]]
+        label_left, label_right, label_bottom = self.left[label].min(), self.right[label].max(), self.bottom[label].max()
+        candidates = []
+
+        label_cell = self.cell[label[-1]]
+        if end + 1 < self.cell_end[label_cell]:
+            candidates.append(self.words(self.order[end + 1:self.cell_end[label_cell]]))
+        next_cell = label_cell + 1
+        if next_cell < len(self.cells) and self.cell_row[next_cell] == row \
+                and self.cell_left[next_cell] - label_right <= self.line_height * MAX_VALUE_DISTANCE:
+            candidates.append(self.words(self.cells[next_cell]))
+
+        # The nearest cell under the label that overlaps it horizontally
+        below = np.flatnonzero((self.cell_row > row) & (self.cell_top >= label_bottom - self.line_height * ROW_TOLERANCE)
+                               & (self.cell_top - label_bottom <= self.line_height * MAX_VALUE_BELOW)
+                               & (self.cell_right >= label_left) & (self.cell_left <= label_right))
+        if below.size:
+            nearest = below[np.lexsort((self.cell_left[below], self.cell_top[below]))[0]]
+            candidates.append(self.words(self.cells[nearest]))
+        return candidates
+
+
+def _header_columns(layout: Layout) -> Dict[int, List[Tuple[str, float, float]]]:
+    """
+    (field, left, right) of the item column headers on each row, left to right;
+    longer phrases claim their words first ("Mal Hizmet Tutarı" before "Tutar")
+    """
+    used = np.zeros(len(layout), dtype=bool)
+    rows: Dict[int, Dict[str, Tuple[str, float, float]]] = {}
+    for name, phrase in ITEM_COLUMNS:
+        for start in layout.find(phrase):
+            words = layout.order[start:start + len(phrase)]
+            if used[words].any():
+                continue
+            used[words] = True
+            # One span per field and row (the leftmost)
+            columns = rows.setdefault(int(layout.row[words[0]]), {})
+            left = float(layout.left[words].min())
+            if name not in columns or left < columns[name][1]:
+                columns[name] = (name, left, float(layout.right[words].max()))
+    return {row: sorted(columns.values(), key=lambda column: column[1]) for row, columns in rows.items()}
+
+
+def _find_header(layout: Layout) -> Optional[Tuple[int, List[Tuple[str, float, float]]]]:
+    """Row number and columns of the item table header: the first row naming MIN_HEADER_COLUMNS columns"""
+    for row, columns in sorted(_header_columns(layout).items()):
+        if len(columns) >= MIN_HEADER_COLUMNS:
+            return row, columns
+    return None
+
+
+def _number(text: Optional[str], parse_number: Callable[[str], Optional[float]]) -> Optional[float]:
+    """First number in a cell ("5 Adet", "%20", "1.234,56 TL")"""
+    if not text:
+        return None
+    match = _NUMBER.search(text)
+    return parse_number(match.group(0)) if match else None
+
+
+def extract_items(layouts: List[Layout], parse_number: Callable[[str], Optional[float]]) -> List[Dict]:
+    """Line items of the item tables, as InvoiceItemCreate dicts"""
+    items = []
+    for layout in layouts:
+        header = _find_header(layout)
+        if header is None:
+            continue
+        header_row, columns = header
+        names = [name for name, _, _ in columns]
+        spans = np.array([(left, right) for _, left, right in columns])
+        ends = set()
+        for _, phrase in ITEM_TABLE_END:
+            ends.update(layout.row[layout.order[layout.find(phrase)]].tolist())
+        end_row = min((row for row in ends if row > header_row), default=len(layout.rows))
+        first_number_column = min((left for name, left, _ in columns if name not in ("position", "description")),
+                                  default=np.inf)
+
+        # Assign every cell below the header to the column it overlaps most (else the nearest one)
+        cells = np.flatnonzero((layout.cell_row > header_row) & (layout.cell_row < end_row))
+        if cells.size == 0:
+            continue
+        left, right = layout.cell_left[cells, None], layout.cell_right[cells, None]
+        overlap = np.minimum(right, spans[None, :, 1]) - np.maximum(left, spans[None, :, 0])
+        distance = np.abs((left + right) / 2 - spans.mean(axis=1)[None, :])
+        aligned = overlap.max(axis=1) > 0
+        column = np.where(aligned, overlap.argmax(axis=1), distance.argmin(axis=1))
+        if "description" in names:
+            # Unaligned text left of the amounts belongs to the description
+            column = np.where(~aligned & (layout.cell_right[cells] < first_number_column),
+                              names.index("description"), column)
+
+        for row in np.unique(layout.cell_row[cells]):
+            in_row = layout.cell_row[cells] == row
+            values = {}
+            for cell, index in zip(cells[in_row], column[in_row]):
+                text = layout.words(layout.cells[cell])
+                values[names[index]] = f"{values[names[index]]} {text}" if names[index] in values else text
+            item = _item(values, parse_number)
+            if item is not None:
+                items.append(item)
+            elif values.get("description") and len(values) == 1 and items:
+                # A wrapped description continues the previous item
+                items[-1]["description"] = f"{items[-1]['description']} {values['description']}"
+    return items
+
+
+def _item(values: Dict[str, str], parse_number: Callable[[str], Optional[float]]) -> Optional[Dict]:
+    numbers = {name: _number(values.get(name), parse_number)
+               for name in ("quantity", "unit_price", "discount", "tax_rate", "tax_amount", "total")}
+    total = numbers["total"]
+    if total is None and numbers["quantity"] and numbers["unit_price"]:
+        total = numbers["quantity"] * numbers["unit_price"]
+    if not total:
+        return None
+    return InvoiceItemCreate(
+        description=values.get("description", "").strip(),
+        quantity=numbers["quantity"] if numbers["quantity"] is not None else 1.0,
+        unit_price=numbers["unit_price"],
+        discount=numbers["discount"] or 0.0,
+        tax_rate=numbers["tax_rate"] or 0.0,
+        tax_amount=numbers["tax_amount"] or 0.0,
+        total=total
+    ).model_dump()
+
+
+def extract_key_values(layouts: List[Layout], parsers: Dict[str, Callable[[str], object]]) -> Dict[str, object]:
+    """
+    Values of the rule table's labels found by position, parsed by parsers[field]
+    (which returns None to reject a candidate); labels are tried in the table's
+    order and the first parsed value wins
+    """
+    values = {}
+    for name, phrases in KEY_LABELS.items():
+        parse = parsers.get(name)
+        if parse is None:
+            continue
+        for phrase in phrases:
+            for layout in layouts:
+                for start in layout.find(phrase):
+                    value = next((parsed for parsed in map(parse, layout.values_after(start, len(phrase)))
+                                  if parsed is not None), None)
+                    if value is not None:
+                        values[name] = value
+                        break
+                if name in values:
+                    break
+            if name in values:
+                break
+    return values
+
+
+def parse_reference(text: str) -> Optional[str]:
+    """Invoice number from a label's value: its first token with a digit"""
+    for token in text.split():
+        token = token.strip(_EDGE_PUNCTUATION)
+        if len(token) >= 3 and any(char.isdigit() for char in token):
+            return token
+    return None
+
+
+def date_text(text: str) -> Optional[str]:
+    """The date-looking part of a label's value"""
+    match = _DATE.search(text)
+    return match.group(0) if match else None
+
+
+def amount_text(text: str) -> Optional[str]:
+    """The amount in a label's value ("(%20): 1.234,56 TL" -> 1.234,56)"""
+    match = _AMOUNT.search(text)
+    return match.group(0) if match else None
@@ -1,15 +1,27 @@
 """
 OCR Service for Invoice Data Extraction
 Supports multiple OCR backends: pytesseract (primary), easyocr (fallback)
+PDF invoices are read from their embedded text layer when they have one
+(PyMuPDF); only scanned pages are rasterized and OCRed.
+Word positions are kept as page layouts (ocr_layout): line items and labelled
+fields are read from them, with the text regexes as the fallback.
 """
 
 import re
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dateutil import parser as date_parser
 from typing import Dict, List, Optional, Tuple
+
+import numpy
 from PIL import Image
 
+from . import ocr_layout, ocr_preprocess
+from .extraction_rules import RULES
+from ..config import settings
+
 # Try to import OCR libraries
 TESSERACT_AVAILABLE = False
 EASYOCR_AVAILABLE = False
@@ -37,6 +49,25 @@ try:
 except ImportError:
     print("⚠️ cv2 not available, using PIL for image processing")
 
+# Try to import PyMuPDF for PDF invoices
+PYMUPDF_AVAILABLE = False
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    print("⚠️ PyMuPDF not available, PDF invoices cannot be processed")
+
+
+# Bump when preprocessing or field extraction changes: cached OCR results of
+# older versions are no longer used (see ocr_cache)
+PREPROCESS_VERSION = 3
+
+# PDF pages with fewer embedded characters than this are treated as scans
+MIN_TEXT_LAYER_CHARS = 20
+PDF_RASTER_DPI = settings.ocr_target_dpi
+PDF_MAX_PAGES = settings.ocr_pdf_max_pages
+PDF_PAGE_WORKERS = settings.ocr_pdf_page_workers
+
 
 class InvoiceOCRService:
     """Service for extracting invoice data using OCR"""
@@ -50,6 +81,7 @@ class InvoiceOCRService:
         """
         self.backend = None
         self.reader = None
+        self.language_codes = list(languages)
         
         # Try pytesseract first (more compatible)
         if TESSERACT_AVAILABLE:
@@ -86,6 +118,10 @@ class InvoiceOCRService:
             print("❌ No OCR backend available!")
             raise RuntimeError("No OCR backend available. Please install pytesseract or easyocr.")
     
+    def cache_fingerprint(self) -> str:
+        """Identifies the OCR configuration in cached results: backend, languages, preprocessing version, rule table"""
+        return f"{self.backend}|{'+'.join(self.language_codes)}|v{PREPROCESS_VERSION}|rules-{RULES.digest[:16]}"
+    
     def preprocess_image(self, image_path: str):
         """
         Preprocess image for better OCR results
@@ -96,28 +132,27 @@ class InvoiceOCRService:
         Returns:
             Preprocessed image (PIL Image or numpy array depending on backend)
         """
-        if CV2_AVAILABLE:
-            # Use OpenCV for preprocessing
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Could not read image from {image_path}")
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Apply denoising
-            denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
-            
-            # Apply thresholding
-            _, thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return self.preprocess(image_path)[0]
+    
+    def preprocess(self, image_path: str) -> Tuple[object, Dict]:
+        """
+        Preprocess image and report what was done (see ocr_preprocess)
+        
+        Args:
+            image_path: Path to the image file
             
-            return thresh
+        Returns:
+            Tuple of (preprocessed image, report with per-stage timings)
+        """
+        if CV2_AVAILABLE:
+            # Staged OpenCV pipeline: downscale, measured denoising, deskew, threshold
+            return ocr_preprocess.preprocess(image_path)
         else:
             # Use PIL for basic preprocessing
             img = Image.open(image_path)
             # Convert to grayscale
             img = img.convert('L')
-            return img
+            return img, {"denoise": "none", "deskewed": False}
     
     def extract_text(self, image_path: str) -> Tuple[str, float, List[str]]:
         """
@@ -129,8 +164,10 @@ class InvoiceOCRService:
         Returns:
             Tuple of (full_text, average_confidence, lines)
         """
-        processed_img = self.preprocess_image(image_path)
-        
+        return self.recognize(self.preprocess_image(image_path))[:3]
+    
+    def recognize(self, processed_img) -> Tuple[str, float, List[str], "ocr_layout.Layout"]:
+        """Run the OCR backend on a preprocessed image: text, confidence, lines and the word layout"""
         if self.backend == "tesseract":
             return self._extract_with_tesseract(processed_img)
         elif self.backend == "easyocr":
@@ -138,7 +175,95 @@ class InvoiceOCRService:
         else:
             raise RuntimeError("No OCR backend available")
     
-    def _extract_with_tesseract(self, image) -> Tuple[str, float, List[str]]:
+    def extract_pdf_text(self, pdf_path: str) -> Tuple[str, float, List[str], List["ocr_layout.Layout"], Dict]:
+        """
+        Extract text from a PDF invoice
+        
+        Pages with an embedded text layer (e-Fatura / e-Arşiv exports) are read
+        directly; the remaining (scanned) pages are rasterized and OCRed in
+        parallel.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            
+        Returns:
+            Tuple of (full_text, average_confidence, lines, page_layouts, report)
+        """
+        if not PYMUPDF_AVAILABLE:
+            raise RuntimeError("PDF support requires PyMuPDF (pip install pymupdf)")
+        
+        started = time.perf_counter()
+        with pymupdf.open(pdf_path) as document:
+            page_count = document.page_count
+            pages = [document.load_page(number) for number in range(min(page_count, PDF_MAX_PAGES))]
+            texts = [page.get_text("text", sort=True) for page in pages]
+            scanned = [number for number, text in enumerate(texts) if len(text.strip()) < MIN_TEXT_LAYER_CHARS]
+            layouts = {number: ocr_layout.Layout.from_pdf_words(page.get_text("words"))
+                       for number, page in enumerate(pages) if number not in scanned}
+            text_layer_ms = round((time.perf_counter() - started) * 1000, 2)
+            
+            # Tesseract runs out of process, so pages OCR in parallel threads;
+            # PyMuPDF is not thread-safe, so rasterizing stays on this thread
+            workers = PDF_PAGE_WORKERS if self.backend == "tesseract" else 1
+            results = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(scanned)))) as executor:
+                futures = {number: executor.submit(self._ocr_pdf_page, self._rasterize(pages[number]))
+                           for number in scanned}
+                for number, future in futures.items():
+                    results[number] = future.result()
+        
+        page_texts, page_lines, page_layouts, page_reports = [], [], [], []
+        word_count, weighted_confidence = 0, 0.0
+        for number, text in enumerate(texts):
+            if number in results:
+                text, confidence, lines, layout, report = results[number]
+            else:
+                layout = layouts[number]
+                # The text layer is exact
+                confidence, lines = 1.0, [line.strip() for line in text.splitlines() if line.strip()]
+                report = {"source": "text_layer"}
+            page_texts.append(text.strip())
+            page_lines.extend(lines)
+            page_layouts.append(layout)
+            page_reports.append({"page": number + 1, **report})
+            words = len(text.split())
+            word_count += words
+            weighted_confidence += confidence * words
+        
+        report = {
+            "pages": page_count,
+            "text_layer_pages": len(pages) - len(scanned),
+            "ocr_pages": len(scanned),
+            "skipped_pages": page_count - len(pages),
+            "text_layer_ms": text_layer_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "page_reports": page_reports
+        }
+        confidence = weighted_confidence / word_count if word_count else 0.0
+        return "\n".join(page_texts), confidence, page_lines, page_layouts, report
+    
+    def _rasterize(self, page) -> numpy.ndarray:
+        """Render a PDF page as a grayscale image at PDF_RASTER_DPI"""
+        pixmap = page.get_pixmap(dpi=PDF_RASTER_DPI, colorspace=pymupdf.csGRAY, alpha=False)
+        image = numpy.frombuffer(pixmap.samples, dtype=numpy.uint8)
+        return image.reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+    
+    def _ocr_pdf_page(self, gray: numpy.ndarray) -> Tuple[str, float, List[str], "ocr_layout.Layout", Dict]:
+        started = time.perf_counter()
+        if CV2_AVAILABLE:
+            processed_img, report = ocr_preprocess.preprocess_page(gray, PDF_RASTER_DPI)
+        else:
+            processed_img, report = Image.fromarray(gray), {}
+        ocr_started = time.perf_counter()
+        text, confidence, lines, layout = self.recognize(processed_img)
+        report.update({
+            "source": "ocr",
+            "ocr_ms": round((time.perf_counter() - ocr_started) * 1000, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
+        return text, confidence, lines, layout, report
+    
+    def _extract_with_tesseract(self, image) -> Tuple[str, float, List[str], "ocr_layout.Layout"]:
         """Extract text using Tesseract OCR"""
         # Convert numpy array to PIL Image if needed
         if CV2_AVAILABLE and not isinstance(image, Image.Image):
@@ -148,28 +273,23 @@ class InvoiceOCRService:
         try:
             data = pytesseract.image_to_data(image, lang=self.languages, output_type=pytesseract.Output.DICT)
             
-            lines = []
-            confidences = []
-            full_text = ""
+            # Words above 30% confidence, with their boxes
+            layout = ocr_layout.Layout.from_tesseract(data, min_confidence=30)
+            lines = list(layout.text)
+            full_text = " ".join(lines)
             
-            for i, text in enumerate(data['text']):
-                conf = int(data['conf'][i])
-                if conf > 30 and text.strip():  # Filter low confidence
-                    lines.append(text)
-                    confidences.append(conf / 100.0)
-                    full_text += text + " "
-            
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-            return full_text.strip(), avg_confidence, lines
+            avg_confidence = float(layout.conf.mean()) if len(layout) else 0.0
+            return full_text.strip(), avg_confidence, lines, layout
             
         except Exception as e:
             print(f"Tesseract detailed extraction failed: {e}")
             # Fallback to simple extraction
             full_text = pytesseract.image_to_string(image, lang=self.languages)
             lines = [line for line in full_text.split('\n') if line.strip()]
-            return full_text, 0.7, lines  # Assume 70% confidence for simple extraction
+            # Assume 70% confidence for simple extraction; no positions
+            return full_text, 0.7, lines, ocr_layout.Layout([], [], [], [], [])
     
-    def _extract_with_easyocr(self, image) -> Tuple[str, float, List[str]]:
+    def _extract_with_easyocr(self, image) -> Tuple[str, float, List[str], "ocr_layout.Layout"]:
         """Extract text using EasyOCR"""
         import numpy as np
         
@@ -189,65 +309,28 @@ class InvoiceOCRService:
         
         avg_confidence = np.mean(confidences) if confidences else 0.0
         
-        return full_text.strip(), avg_confidence, lines
+        return full_text.strip(), avg_confidence, lines, ocr_layout.Layout.from_easyocr(results, min_confidence=0.3)
     
     def extract_invoice_number(self, text: str, lines: List[str]) -> Optional[str]:
         """Extract invoice number from text"""
-        patterns = [
-            # Turkish e-invoice format (ETTN/UUID style)
-            r'ETTN[:\s]*([a-f0-9\-]{36})',
-            # Standard invoice number patterns
-            r'Fatura\s*No[:\s]*([A-Z0-9]{3,}[\-]?[A-Z0-9]+)',
-            r'Invoice\s*No[:\s]*([A-Z0-9]{3,}[\-]?[A-Z0-9]+)',
-            r'Invoice\s*Number[:\s]*([A-Z0-9]{3,}[\-]?[A-Z0-9]+)',
-            # Common Turkish invoice number formats
-            r'([A-Z]{2,4}\d{10,})',  # Pattern like EMR2025000000035, 48Q2025000000267
-            r'(\d{2}[A-Z]\d{10,})',  # Pattern like 48Q2025000000267
-            # Generic alphanumeric invoice numbers (at least 8 chars)
-            r'(?:No|Number|Numara)[:\s]*([A-Z0-9\-]{8,})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                result = match.group(1).strip()
-                # Filter out false positives
-                if result.upper() in ['FATURA', 'INVOICE', 'NO', 'NUMBER']:
-                    continue
-                if len(result) >= 4:  # Invoice numbers are usually at least 4 chars
-                    return result
-        
-        return None
+        return RULES.first("invoice_number", text)
     
     def extract_date(self, text: str, date_type: str = "issue") -> Optional[datetime]:
         """Extract date from text"""
-        patterns = {
-            "issue": [
-                r'Fatura\s*Tarihi[:\s\[\(]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-                r'Invoice\s*Date[:\s\[\(]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-                r'Düzenleme\s*Tarihi[:\s\[\(]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-                r'Date[:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            ],
-            "due": [
-                r'Son\s*Ödeme\s*Tarihi[:\s\[\(]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-                r'Due\s*Date[:\s\[\(]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-                r'Vade[:\s]*(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-            ]
-        }
-        
-        for pattern in patterns.get(date_type, []):
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                date_str = match.group(1)
+        if date_type not in ("issue", "due"):
+            return None
+        return RULES.first(f"{date_type}_date", text, self.parse_date)
+    
+    def parse_date(self, date_str: str) -> Optional[datetime]:
+        """Parse a day-first date string"""
+        try:
+            return date_parser.parse(date_str, dayfirst=True)
+        except:
+            for fmt in ['%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%y', '%d/%m/%y']:
                 try:
-                    return date_parser.parse(date_str, dayfirst=True)
+                    return datetime.strptime(date_str, fmt)
                 except:
-                    for fmt in ['%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%y', '%d/%m/%y']:
-                        try:
-                            return datetime.strptime(date_str, fmt)
-                        except:
-                            continue
-        
+                    continue
         return None
     
     def parse_turkish_number(self, amount_str: str) -> Optional[float]:
@@ -313,49 +396,11 @@ class InvoiceOCRService:
             "total": 0.0
         }
         
-        # More specific patterns for Turkish invoices
-        # Pattern captures the amount that appears NEAR the keyword (before or after)
-        patterns = {
-            "total": [
-                # Amount BEFORE keyword (common in tables)
-                r'([\d.,]+)\s*[₺TL]*\s*(?:TOPLAM|Toplam|ÖDENECEK|Ödenecek)',
-                # Amount AFTER keyword
-                r'(?:GENEL\s*)?TOPLAM\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'ÖDENECEK\s*TUTAR\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Ödenecek\s*Tutar\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Vergiler\s*Dahil\s*Toplam\s*Tutar\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'NET\s*TOPLAM\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                # English fallbacks
-                r'Grand\s*Total\s*[:\s|]*[\$€₺TL\s]*([\d.,]+)',
-                r'Total\s+Amount\s*[:\s|]*[\$€₺TL\s]*([\d.,]+)',
-            ],
-            "subtotal": [
-                # Amount with TL/₺ suffix (common pattern)
-                r'([\d.,]+)\s*(?:TL|TY|₺)\s*(?:Mal\s*Hizmet|KDV\s*Matrah)',
-                r'Mal\s*Hizmet\s*Toplam\s*Tutarı?\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'KDV\s*Matrahı\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Matrah\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Ara\s*Toplam\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Subtotal\s*[:\s|]*[\$€₺TL\s]*([\d.,]+)',
-            ],
-            "tax": [
-                r'KDV\s*Tutarı?\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Hesaplanan\s*KDV\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Vergi\s*[:\s|]*[₺TL\s]*([\d.,]+)',
-                r'Tax\s*[:\s|]*[\$€₺TL\s]*([\d.,]+)',
-                r'VAT\s*[:\s|]*[\$€₺TL\s]*([\d.,]+)',
-            ]
-        }
-        
-        for amount_type, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    amount_str = match.group(1).strip()
-                    parsed = self.parse_turkish_number(amount_str)
-                    if parsed is not None and parsed > 0:
-                        amounts[amount_type] = parsed
-                        break
+        # Patterns capture the amount that appears NEAR the keyword (before or after)
+        for amount_type in ("total", "subtotal", "tax"):
+            parsed = RULES.first(amount_type, text, self._parse_positive_amount)
+            if parsed is not None:
+                amounts[amount_type] = parsed
         
         # If we have subtotal and tax but no total, calculate it
         if amounts["total"] == 0.0 and amounts["subtotal"] > 0:
@@ -364,18 +409,19 @@ class InvoiceOCRService:
         # Try to find the last TL amount in the text as a fallback for total
         # This is common at the end of invoices
         if amounts["total"] == 0.0:
-            # Find all amounts with TL suffix at the end of text
-            tl_amounts = re.findall(r'([\d.,]+)\s*(?:TL|TY|₺)', text, re.IGNORECASE)
-            if tl_amounts:
-                # Try the LAST TL amount (usually the total at bottom of invoice)
-                for amount_str in reversed(tl_amounts):
-                    parsed = self.parse_turkish_number(amount_str)
-                    if parsed is not None and parsed > 50:  # Reasonable minimum
-                        amounts["total"] = parsed
-                        break
+            # Try the LAST TL amount (usually the total at bottom of invoice)
+            for amount_str in reversed(RULES.all("currency_amount", text)):
+                parsed = self.parse_turkish_number(amount_str)
+                if parsed is not None and parsed > 50:  # Reasonable minimum
+                    amounts["total"] = parsed
+                    break
         
         return amounts
     
+    def _parse_positive_amount(self, amount_str: str) -> Optional[float]:
+        parsed = self.parse_turkish_number(amount_str)
+        return parsed if parsed is not None and parsed > 0 else None
+    
     def extract_supplier_info(self, text: str, lines: List[str]) -> Dict[str, Optional[str]]:
         """
         Extract supplier information.
@@ -384,67 +430,13 @@ class InvoiceOCRService:
         - Supplier info is at the TOP of the invoice (before "SAYIN")
         - Supplier's VKN/TCKN appears before the "SAYIN" section
         """
-        supplier = {
-            "name": None,
-            "tax_id": None,
+        return {
+            "name": RULES.first("supplier_name", text),
+            "tax_id": RULES.first("supplier_tax_id", text),
             "address": None,
-            "phone": None,
-            "email": None
+            "phone": RULES.first("supplier_phone", text),
+            "email": RULES.first("supplier_email", text)
         }
-        
-        # Split text at "SAYIN" - supplier info is BEFORE it
-        sayin_match = re.search(r'SAYIN', text, re.IGNORECASE)
-        supplier_section = text[:sayin_match.start()] if sayin_match else text[:len(text)//2]
-        
-        # Extract supplier tax ID (VKN/TCKN) from supplier section only
-        vkn_patterns = [
-            r'(?:VKN|TCKN)[:\s]*(\d{10,11})',
-            r'Vergi\s*(?:Kimlik\s*)?(?:No|Numarası)[:\s]*(\d{10,11})',
-        ]
-        for pattern in vkn_patterns:
-            match = re.search(pattern, supplier_section, re.IGNORECASE)
-            if match:
-                supplier["tax_id"] = match.group(1)
-                break
-        
-        # Extract phone from supplier section
-        phone_match = re.search(r'Tel[:\s]*(\+?[\d\s\-\(\)]{10,})', supplier_section, re.IGNORECASE)
-        if phone_match:
-            supplier["phone"] = re.sub(r'[\s\-\(\)]', '', phone_match.group(1))
-        
-        # Extract email from supplier section
-        email_match = re.search(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', supplier_section)
-        if email_match:
-            supplier["email"] = email_match.group(1)
-        
-        # Extract supplier name - company at the TOP (before SAYIN)
-        # Look for company names with Turkish business suffixes
-        company_patterns = [
-            # Full company name with suffix
-            r'([A-ZÇĞIİÖŞÜ][A-ZÇĞIİÖŞÜa-zçğıiöşü\s]+(?:ANONİM\s*ŞİRKETİ|A\.?Ş\.?|LTD\.?\s*ŞTİ\.?|LİMİTED|TİCARET))',
-            # Well-known companies
-            r'(TTNET|TURKCELL|VODAFONE|TÜRK\s*TELEKOM)',
-            # Name followed by address indicators
-            r'^([A-ZÇĞIİÖŞÜ][A-ZÇĞIİÖŞÜa-zçğıiöşü\s]{5,50})(?=\s+(?:MAH|CAD|SOK|ADRES))',
-        ]
-        
-        for pattern in company_patterns:
-            match = re.search(pattern, supplier_section, re.IGNORECASE)
-            if match:
-                name = match.group(1).strip()
-                name = re.sub(r'\s+', ' ', name)
-                # Remove address parts from name (Turkish address keywords)
-                name = re.sub(r'\s+(MAH|MAHALLE|MAHALLESİ|CAD|CADDE|CADDESİ|SOK|SOKAK|SOKAGI|NO:|ADRES|CUMHURİYET|ATATÜRK|İSTİKLAL|BAĞDAT).*$', '', name, flags=re.IGNORECASE)
-                name = re.sub(r'\s+(MECİDİYEKÖY|ŞİŞLİ|KADIKÖY|ÜSKÜDAR|BEYOĞLU|BEŞİKTAŞ|FATİH|ISTANBUL|İSTANBUL|ANKARA|İZMİR|BURSA|ANTALYA).*$', '', name, flags=re.IGNORECASE)
-                # Remove leading noise
-                name = re.sub(r'^[a-z\s]+', '', name)  # Remove lowercase prefix
-                name = name.strip()
-                # Filter out common false positives
-                if len(name) > 3 and name.upper() not in ['E-FATURA', 'FATURA', 'SAYIN', 'TEL', 'FAX']:
-                    supplier["name"] = name
-                    break
-        
-        return supplier
     
     def extract_customer_info(self, text: str) -> Dict[str, Optional[str]]:
         """
@@ -454,62 +446,37 @@ class InvoiceOCRService:
         - "SAYIN" (Dear/Mr./Ms.) indicates the CUSTOMER name follows
         - Customer's VKN appears AFTER the "SAYIN" section
         """
-        customer = {
-            "name": None,
-            "tax_id": None,
+        return {
+            "name": RULES.first("customer_name", text),
+            "tax_id": RULES.first("customer_tax_id", text),
             "address": None
         }
-        
-        # Find the "SAYIN" section - customer name comes AFTER it
-        # Pattern: SAYIN followed by company/person name
-        customer_patterns = [
-            # SAYIN followed by company name (with suffix)
-            r'SAYIN\s+([A-ZÇĞIİÖŞÜ][A-ZÇĞIİÖŞÜa-zçğıiöşü\s]+(?:ANONİM\s*ŞİRKETİ|A\.?Ş\.?|LTD\.?\s*ŞTİ\.?|LİMİTED|TİCARET))',
-            # SAYIN followed by name until next section
-            r'SAYIN\s+([A-ZÇĞIİÖŞÜ][A-ZÇĞIİÖŞÜa-zçğıiöşü\s]{5,60})(?=\s+(?:VKN|TCKN|Vergi|MAH|CAD|SOK|ADRES|Web|Tel|E-?Posta))',
-            # SAYIN followed by any caps name
-            r'SAYIN\s+([A-ZÇĞIİÖŞÜ][A-ZÇĞIİÖŞÜ\s]{5,60}?)(?=\s+[A-ZÇĞIİÖŞÜ]{2,}\s+(?:MAH|CAD|SOK))',
-            # Simpler: SAYIN followed by text until common delimiters
-            r'SAYIN\s+([A-ZÇĞIİÖŞÜa-zçğıiöşü\s]{5,80}?)(?=\s+(?:No:|VKN|TCKN|Vergi|Adres|Tel|Fax|Web|\d{5,}))',
-            # English patterns
-            r'(?:Bill\s*To|Customer)[:\s]+([A-Za-z\s]{5,60})(?=\s+(?:Address|Phone|Email|$))',
-        ]
-        
-        for pattern in customer_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                name = match.group(1).strip()
-                name = re.sub(r'\s+', ' ', name)
-                # Clean up - remove trailing address/metadata
-                name = re.sub(r'\s+(MAH|MAHALLE|MAHALLESİ|CAD|CADDE|CADDESİ|SOK|SOKAK|NO:|ADRES|VE|VKN|TCKN|Vergi).*$', '', name, flags=re.IGNORECASE)
-                name = re.sub(r'\s+(MECİDİYEKÖY|ŞİŞLİ|KADIKÖY|ÜSKÜDAR|BEYOĞLU|BEŞİKTAŞ|FATİH|ISTANBUL|İSTANBUL|ANKARA|İZMİR).*$', '', name, flags=re.IGNORECASE)
-                name = name.strip()
-                if len(name) > 3 and name.upper() not in ['E-FATURA', 'FATURA', 'SAYIN']:
-                    customer["name"] = name
-                    break
-        
-        # Extract customer tax ID - look in section AFTER "SAYIN"
-        sayin_match = re.search(r'SAYIN', text, re.IGNORECASE)
-        customer_section = text[sayin_match.end():] if sayin_match else text[len(text)//2:]
-        
-        # Find VKN in customer section (not the supplier's VKN)
-        tax_patterns = [
-            r'VKN[:\s]*(\d{10,11})',
-            r'TCKN[:\s]*(\d{10,11})',
-            r'Vergi\s*(?:Kimlik\s*)?(?:No|Numarası)[:\s]*(\d{10,11})',
-        ]
-        for pattern in tax_patterns:
-            match = re.search(pattern, customer_section, re.IGNORECASE)
-            if match:
-                customer["tax_id"] = match.group(1)
-                break
-        
-        return customer
     
-    def extract_invoice_items(self, text: str, lines: List[str]) -> List[Dict]:
-        """Extract line items from invoice"""
-        # Simplified - returns empty list for now
-        return []
+    def extract_invoice_items(self, text: str, lines: List[str],
+                              layouts: Optional[List["ocr_layout.Layout"]] = None) -> List[Dict]:
+        """Extract line items from the item table of the page layouts (none without word positions)"""
+        if not layouts:
+            return []
+        return ocr_layout.extract_items(layouts, self.parse_turkish_number)
+    
+    def extract_layout_fields(self, layouts: List["ocr_layout.Layout"]) -> Dict[str, object]:
+        """Labelled fields read by position: invoice number, dates and amounts"""
+        def date(text):
+            date_str = ocr_layout.date_text(text)
+            return self.parse_date(date_str) if date_str else None
+        
+        def amount(text):
+            amount_str = ocr_layout.amount_text(text)
+            return self._parse_positive_amount(amount_str) if amount_str else None
+        
+        return ocr_layout.extract_key_values(layouts, {
+            "invoice_number": ocr_layout.parse_reference,
+            "issue_date": date,
+            "due_date": date,
+            "subtotal": amount,
+            "tax": amount,
+            "total": amount
+        })
     
     def process_invoice(self, image_path: str) -> Dict:
         """
@@ -522,16 +489,32 @@ class InvoiceOCRService:
             Dictionary containing extracted invoice data
         """
         # Extract text
-        full_text, confidence, lines = self.extract_text(image_path)
-        
-        # Extract structured data
-        invoice_number = self.extract_invoice_number(full_text, lines)
-        issue_date = self.extract_date(full_text, "issue")
-        due_date = self.extract_date(full_text, "due")
+        if is_pdf(image_path):
+            full_text, confidence, lines, layouts, preprocessing = self.extract_pdf_text(image_path)
+            backend = self.backend if preprocessing["ocr_pages"] else "pdf-text"
+        else:
+            processed_img, preprocessing = self.preprocess(image_path)
+            ocr_started = time.perf_counter()
+            full_text, confidence, lines, layout = self.recognize(processed_img)
+            preprocessing["ocr_ms"] = round((time.perf_counter() - ocr_started) * 1000, 2)
+            layouts = [layout]
+            backend = self.backend
+        
+        # Extract structured data: labelled fields by position first, then the text rules
+        layout_started = time.perf_counter()
+        layout_fields = self.extract_layout_fields(layouts)
+        items = self.extract_invoice_items(full_text, lines, layouts)
+        preprocessing["layout_ms"] = round((time.perf_counter() - layout_started) * 1000, 2)
+        
+        invoice_number = layout_fields.get("invoice_number") or self.extract_invoice_number(full_text, lines)
+        issue_date = layout_fields.get("issue_date") or self.extract_date(full_text, "issue")
+        due_date = layout_fields.get("due_date") or self.extract_date(full_text, "due")
         amounts = self.extract_amounts(full_text)
+        for amount_type in ("subtotal", "tax", "total"):
+            if amount_type in layout_fields:
+                amounts[amount_type] = layout_fields[amount_type]
         supplier = self.extract_supplier_info(full_text, lines)
         customer = self.extract_customer_info(full_text)
-        items = self.extract_invoice_items(full_text, lines)
         
         return {
             "invoice_number": invoice_number,
@@ -544,10 +527,15 @@ class InvoiceOCRService:
             "raw_text": full_text,
             "ocr_confidence": float(confidence),
             "word_count": len(full_text.split()),
-            "ocr_backend": self.backend
+            "ocr_backend": backend,
+            "preprocessing": preprocessing
         }
 
 
+def is_pdf(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() == ".pdf"
+
+
 # Global instance (will be initialized on first use)
 _ocr_service_instance = None
 
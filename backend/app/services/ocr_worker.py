@@ -0,0 +1,185 @@
+"""
+OCR worker tier
+Runs InvoiceOCRService.process_invoice in a bounded process pool so image
+preprocessing and Tesseract never block the API event loop.
+
+Each worker process builds its own InvoiceOCRService once when it starts.
+Submissions beyond the queue depth limit are rejected (backpressure) and jobs
+that exceed the per-job timeout raise OCRTimeoutError.
+
+Results are looked up in the OCR result cache (see ocr_cache) by the file's
+content hash and the workers' OCR configuration before a job is submitted.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from ..config import settings
+from .ocr_cache import file_sha256, get_ocr_cache
+
+OCR_WORKERS = settings.ocr_workers
+OCR_MAX_QUEUE = settings.ocr_max_queue
+OCR_JOB_TIMEOUT = settings.ocr_job_timeout
+
+
+class OCRQueueFullError(Exception):
+    """Raised when the number of in-flight OCR jobs reached the queue depth limit"""
+
+
+class OCRTimeoutError(Exception):
+    """Raised when an OCR job did not finish within the per-job timeout"""
+
+
+class OCRUnavailableError(Exception):
+    """Raised when no OCR backend could be initialized in the worker"""
+
+
+# Per-process state, only populated inside worker processes
+_worker_service = None
+_worker_init_error: Optional[str] = None
+
+
+def _init_worker():
+    """Process pool initializer: build the OCR service once per worker"""
+    global _worker_service, _worker_init_error
+    try:
+        from .ocr_service import InvoiceOCRService
+        _worker_service = InvoiceOCRService()
+    except Exception as e:
+        _worker_init_error = str(e)
+
+
+def _run_ocr_job(image_path: str) -> Dict:
+    if _worker_service is None:
+        raise OCRUnavailableError(_worker_init_error or "OCR service not initialized")
+    return _worker_service.process_invoice(image_path)
+
+
+def _worker_fingerprint() -> str:
+    if _worker_service is None:
+        raise OCRUnavailableError(_worker_init_error or "OCR service not initialized")
+    return _worker_service.cache_fingerprint()
+
+
+class OCRWorkerPool:
+    """Bounded process pool for OCR jobs"""
+
+    def __init__(self, workers: int = OCR_WORKERS, max_queue: int = OCR_MAX_QUEUE,
+                 job_timeout: float = OCR_JOB_TIMEOUT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs submitted to the pool that have not finished yet (including timed out ones)"""
+        return self._in_flight
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+                print(f"✅ OCR worker pool started ({self.workers} workers, queue limit {self.max_queue})")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _job_done(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, fn, *args):
+        self.start()
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                raise OCRQueueFullError(
+                    f"OCR queue is full ({self._in_flight} jobs in flight), retry later"
+                )
+            self._in_flight += 1
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self._in_flight -= 1
+            self._reset(executor)
+            raise OCRUnavailableError("OCR worker pool is broken, it will be restarted")
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _reset(self, executor: Optional[ProcessPoolExecutor]):
+        """Drop a broken executor so the next submission starts a fresh pool"""
+        if executor is None:
+            return
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._fingerprint = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def fingerprint(self) -> str:
+        """OCR configuration of the workers (backend, languages, preprocessing version), asked once"""
+        if self._fingerprint is None:
+            future = self._submit(_worker_fingerprint)
+            try:
+                self._fingerprint = await asyncio.wait_for(asyncio.wrap_future(future), self.job_timeout)
+            except asyncio.TimeoutError:
+                raise OCRTimeoutError(f"OCR workers did not start within {self.job_timeout:g}s")
+            except BrokenProcessPool:
+                self._reset(self._executor)
+                raise OCRUnavailableError("OCR worker process crashed")
+        return self._fingerprint
+
+    async def process_invoice(self, image_path: str, timeout: Optional[float] = None,
+                              content_hash: Optional[str] = None) -> Dict:
+        """
+        Run OCR extraction for one file in the worker pool, or return the cached
+        result of an identical file (`content_hash`: the file's SHA-256 if known)
+        """
+        cache = get_ocr_cache()
+        if cache.enabled:
+            content_hash = content_hash or await asyncio.to_thread(file_sha256, image_path)
+            fingerprint = await self.fingerprint()
+            cached = cache.get(content_hash, fingerprint)
+            if cached is not None:
+                return cached
+
+        future = self._submit(_run_ocr_job, image_path)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.job_timeout)
+        except asyncio.TimeoutError:
+            # A running job cannot be interrupted; it keeps its queue slot until it finishes
+            future.cancel()
+            raise OCRTimeoutError(
+                f"OCR timed out after {timeout or self.job_timeout:g}s for {os.path.basename(image_path)}"
+            )
+        except BrokenProcessPool:
+            self._reset(self._executor)
+            raise OCRUnavailableError("OCR worker process crashed")
+
+        if cache.enabled:
+            cache.put(content_hash, fingerprint, result)
+        return result
+
+
+# Global instance (started on application startup)
+_ocr_pool_instance = None
+
+
+def get_ocr_pool() -> OCRWorkerPool:
+    """Get or create the OCR worker pool"""
+    global _ocr_pool_instance
+    if _ocr_pool_instance is None:
+        _ocr_pool_instance = OCRWorkerPool()
+    return _ocr_pool_instance
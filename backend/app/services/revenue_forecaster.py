@@ -0,0 +1,442 @@
+"""
+Daily revenue forecasting
+Forecasts revenue per day (by issue date, cancelled/void invoices excluded)
+from the daily rollup, for the whole portfolio or one customer or supplier.
+
+Forecasters are pluggable (FORECASTERS, selected with the REVENUE_FORECASTER
+setting). The default is additive Holt-Winters with a damped trend and a
+weekly season, on a series adjusted for calendar effects:
+- month-end: the last MONTH_END_DAYS days of each month against the rest
+- yearly: one offset per calendar month, once there is a year of history
+Both are measured against centered rolling means and shrunk toward zero, so
+a short history yields small adjustments.
+
+The smoothing parameters come from a vectorized grid search over the
+forecast error at leads up to the requested horizon. Fits are cached per
+(forecaster, scope, horizon): while the history before the fit's end is
+unchanged, new days are folded into the cached state with the cached
+parameters (O(new days)); the grid search reruns after FULL_REFIT_DAYS new
+days or when older history changes (backdated invoices, deletions).
+
+Customers and suppliers with intermittent revenue (few days with invoices)
+get the portfolio forecast scaled by their recent share of revenue, so they
+reuse the portfolio's cached fit instead of fitting a mostly-zero series.
+"""
+
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from .analytics_service import CLOSED_STATUSES
+
+SEASON_LENGTH = 7
+REVENUE_HISTORY_DAYS = 3 * 365  # Training window
+MAX_FORECAST_HORIZON = 366
+FULL_REFIT_DAYS = 7  # New days folded into a cached fit before the parameters are searched again
+MAX_CACHED_FITS = 256
+
+MONTH_END_DAYS = 3
+CALENDAR_PRIOR = 30.0  # Days of evidence needed for half of a calendar offset to apply
+
+# Scopes with fewer days with revenue than this follow the portfolio forecast
+MIN_ACTIVE_DAYS = 30
+SHARE_WINDOW_DAYS = 90
+
+# Smoothing parameter grid (level, trend, season, damping)
+ALPHAS = (0.05, 0.1, 0.2, 0.35, 0.5)
+BETAS = (0.0, 0.01, 0.05, 0.15)
+GAMMAS = (0.05, 0.1, 0.2, 0.35)
+PHIS = (0.9, 0.98)
+
+Scope = Tuple[str, Optional[int]]
+PORTFOLIO: Scope = ("all", None)
+
+
+def scope_for(customer_id: Optional[int] = None, supplier_id: Optional[int] = None) -> Scope:
+    if customer_id is not None:
+        return ("customer", customer_id)
+    if supplier_id is not None:
+        return ("supplier", supplier_id)
+    return PORTFOLIO
+
+
+def _scope_filter(query, scope: Scope):
+    Rollup = models.DailyInvoiceRollup
+    kind, entity_id = scope
+    if kind == "customer":
+        query = query.filter(Rollup.customer_id == entity_id)
+    elif kind == "supplier":
+        query = query.filter(Rollup.supplier_id == entity_id)
+    return query.filter(Rollup.status.not_in(CLOSED_STATUSES))
+
+
+def history_start(db: Session, scope: Scope, today: date) -> Optional[date]:
+    """First day of the training window (None without any revenue before today)"""
+    Rollup = models.DailyInvoiceRollup
+    first = _scope_filter(db.query(func.min(Rollup.date)), scope).filter(Rollup.date < today).scalar()
+    if first is None:
+        return None
+    return max(first, today - timedelta(days=REVENUE_HISTORY_DAYS))
+
+
+def load_series(db: Session, scope: Scope, start: date, today: date) -> np.ndarray:
+    """Daily revenue from `start` through yesterday (today is still incomplete), one GROUP BY over the rollup"""
+    Rollup = models.DailyInvoiceRollup
+    rows = _scope_filter(
+        db.query(Rollup.date, func.sum(Rollup.sum_total)), scope
+    ).filter(Rollup.date >= start, Rollup.date < today).group_by(Rollup.date).all()
+
+    series = np.zeros(max((today - start).days, 0))
+    if rows:
+        offsets = np.fromiter(((day - start).days for day, _ in rows), dtype=np.int64, count=len(rows))
+        series[offsets] = np.fromiter((amount or 0.0 for _, amount in rows), dtype=float, count=len(rows))
+    return series
+
+
+def _days(start: date, count: int) -> pd.DatetimeIndex:
+    return pd.date_range(start, periods=count, freq="D")
+
+
+def _is_month_end(days: pd.DatetimeIndex) -> np.ndarray:
+    return np.asarray(days.days_in_month - days.day < MONTH_END_DAYS)
+
+
+class CalendarEffects:
+    """Additive month-end and month-of-year offsets (zero mean over a year)"""
+
+    def __init__(self, month_end: float = 0.0, month_end_share: float = 0.0, months: Optional[np.ndarray] = None):
+        self.month_end = month_end
+        self.month_end_share = month_end_share
+        self.months = months if months is not None else np.zeros(12)
+
+    @classmethod
+    def measure(cls, series: np.ndarray, start: date) -> "CalendarEffects":
+        days = _days(start, len(series))
+        values = pd.Series(series, index=days)
+        month_end = _is_month_end(days)
+
+        # A centered 31-day mean spans whole weeks and one month end, so the
+        # month-end gap survives while the weekday pattern averages out
+        deviation = (values - values.rolling(31, center=True).mean()).to_numpy()
+        valid = ~np.isnan(deviation)
+        ends, others = valid & month_end, valid & ~month_end
+        month_end_offset = 0.0
+        if ends.any() and others.any():
+            gap = deviation[ends].mean() - deviation[others].mean()
+            month_end_offset = gap * ends.sum() / (ends.sum() + CALENDAR_PRIOR)
+        share = float(month_end.mean()) if len(month_end) else 0.0
+
+        # Yearly pattern: deviations from the centered 365-day mean per calendar month
+        months = np.zeros(12)
+        deviation = (values - values.rolling(365, center=True).mean()).to_numpy()
+        valid = ~np.isnan(deviation)
+        if valid.any():
+            month = np.asarray(days.month) - 1
+            counts = np.bincount(month[valid], minlength=12)
+            sums = np.bincount(month[valid], weights=deviation[valid], minlength=12)
+            observed = counts > 0
+            months[observed] = sums[observed] / (counts[observed] + CALENDAR_PRIOR)
+            months[observed] -= months[observed].mean()
+        return cls(month_end_offset, share, months)
+
+    def values(self, start: date, count: int) -> np.ndarray:
+        days = _days(start, count)
+        effect = self.months[np.asarray(days.month) - 1]
+        return effect + self.month_end * (_is_month_end(days) - self.month_end_share)
+
+
+def _damped(phi, horizon: int):
+    """phi + phi^2 + ... + phi^h for h = 1..horizon (one row per lead)"""
+    return np.cumsum(np.power.outer(np.atleast_1d(np.asarray(phi, dtype=float)), np.arange(1, horizon + 1)).T, axis=0)
+
+
+def _smooth(series: np.ndarray, alpha, beta, gamma, phi, level, trend, season):
+    """
+    Holt-Winters recursion for G parameter sets at once (arrays of shape (G,),
+    season (m, G)); returns level and trend after each day and the seasonal
+    index history, where seasonal[t + m] is the index updated on day t
+    """
+    count, m = len(series), season.shape[0]
+    levels = np.empty((count, level.shape[0]))
+    trends = np.empty_like(levels)
+    seasonal = np.empty((count + m, level.shape[0]))
+    seasonal[:m] = season
+    for t in range(count):
+        previous_season = seasonal[t]
+        new_level = alpha * (series[t] - previous_season) + (1 - alpha) * (level + phi * trend)
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        level = new_level
+        seasonal[t + m] = gamma * (series[t] - level) + (1 - gamma) * previous_season
+        levels[t] = level
+        trends[t] = trend
+    return levels, trends, seasonal
+
+
+def _evaluation_leads(horizon: int, available: int):
+    leads = {lead for lead in (1, SEASON_LENGTH, 14, 30, 90, horizon) if lead <= min(horizon, available)}
+    return sorted(leads)
+
+
+class RevenueForecaster:
+    """
+    Interface of a daily revenue model
+
+    fit() learns from a full series, extend() folds in days appended after
+    the fitted ones (same prefix), forecast() returns expected revenue for
+    each of the next `horizon` days.
+    """
+    name = ""
+    min_history = 1  # Days of history the model needs
+
+    def __init__(self):
+        self.start: Optional[date] = None
+        self.fitted_length = 0  # Days seen by the last full fit
+        self.length = 0  # Days seen including extensions
+
+    def fit(self, series: np.ndarray, start: date, horizon: int):
+        raise NotImplementedError
+
+    def extend(self, series: np.ndarray):
+        raise NotImplementedError
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+class MovingAverageForecaster(RevenueForecaster):
+    """Flat forecast at the average daily revenue of the last `window` days (the original forecast)"""
+    name = "moving_average"
+
+    def __init__(self, window: int = 30):
+        super().__init__()
+        self.window = max(window, 1)
+        self.average = 0.0
+
+    def fit(self, series: np.ndarray, start: date, horizon: int):
+        self.start = start
+        self.fitted_length = len(series)
+        self.extend(series)
+
+    def extend(self, series: np.ndarray):
+        self.length = len(series)
+        recent = series[-self.window:]
+        if recent.sum() > 0:
+            self.average = float(recent.sum()) / self.window
+        else:
+            self.average = float(series.mean()) if len(series) else 0.0
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        return np.full(horizon, self.average)
+
+
+class HoltWintersForecaster(RevenueForecaster):
+    """Damped additive Holt-Winters with a weekly season on the calendar-adjusted series"""
+    name = "holt_winters"
+    min_history = 4 * SEASON_LENGTH
+
+    def __init__(self):
+        super().__init__()
+        self.params: Optional[np.ndarray] = None  # alpha, beta, gamma, phi
+        self.calendar = CalendarEffects()
+        self._anchor = None  # (level, trend, season) after the fitted days
+        self._state = None  # same, after the extended days
+        self.fit_error = 0.0
+
+    def _adjusted(self, series: np.ndarray, offset: int = 0) -> np.ndarray:
+        return series - self.calendar.values(self.start + timedelta(days=offset), len(series))
+
+    def fit(self, series: np.ndarray, start: date, horizon: int):
+        self.start = start
+        self.calendar = CalendarEffects.measure(series, start)
+        adjusted = self._adjusted(series)
+        m = SEASON_LENGTH
+
+        grid = np.array(np.meshgrid(ALPHAS, BETAS, GAMMAS, PHIS, indexing="ij")).reshape(4, -1)
+        alpha, beta, gamma, phi = grid
+        size = grid.shape[1]
+        level = np.full(size, adjusted[:m].mean())
+        trend = np.full(size, (adjusted[m:2 * m].mean() - adjusted[:m].mean()) / m)
+        season = np.repeat((adjusted[:m] - adjusted[:m].mean())[:, None], size, axis=1)
+        levels, trends, seasonal = _smooth(adjusted, alpha, beta, gamma, phi, level, trend, season)
+
+        # Mean absolute error at a few leads up to the horizon, from every
+        # origin after the first two seasons
+        burn_in = 2 * m
+        count = len(adjusted)
+        damped = _damped(phi, horizon)
+        error = np.zeros(size)
+        leads = _evaluation_leads(horizon, count - burn_in - 1)
+        for lead in leads:
+            origins = slice(burn_in - 1, count - lead)
+            season_offset = lead - m * ((lead - 1) // m)
+            predicted = (levels[origins] + damped[lead - 1] * trends[origins]
+                         + seasonal[burn_in - 1 + season_offset:count - lead + season_offset])
+            error += np.abs(adjusted[burn_in - 1 + lead:, None] - predicted).mean(axis=0)
+
+        best = int(np.argmin(error)) if leads else 0
+        self.params = grid[:, best]
+        self.fit_error = float(error[best] / len(leads)) if leads else 0.0
+        self._anchor = (levels[-1, best], trends[-1, best], seasonal[-m:, best].copy())
+        self._state = self._anchor
+        self.fitted_length = self.length = count
+
+    def extend(self, series: np.ndarray):
+        level, trend, season = self._anchor
+        new_days = series[self.fitted_length:]
+        if len(new_days):
+            alpha, beta, gamma, phi = (np.array([value]) for value in self.params)
+            levels, trends, seasonal = _smooth(
+                self._adjusted(new_days, self.fitted_length), alpha, beta, gamma, phi,
+                np.array([level]), np.array([trend]), season[:, None]
+            )
+            level, trend, season = levels[-1, 0], trends[-1, 0], seasonal[-SEASON_LENGTH:, 0]
+        self._state = (level, trend, season)
+        self.length = len(series)
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        level, trend, season = self._state
+        leads = np.arange(horizon)
+        base = level + _damped(self.params[3], horizon)[:, 0] * trend + season[leads % SEASON_LENGTH]
+        calendar = self.calendar.values(self.start + timedelta(days=self.length), horizon)
+        return np.clip(base + calendar, 0.0, None)
+
+
+FORECASTERS: Dict[str, type] = {
+    HoltWintersForecaster.name: HoltWintersForecaster,
+    MovingAverageForecaster.name: MovingAverageForecaster,
+}
+
+
+def _fittable(series: np.ndarray, forecaster: type, scope: Scope) -> bool:
+    if len(series) < forecaster.min_history:
+        return False
+    return scope == PORTFOLIO or np.count_nonzero(series) >= MIN_ACTIVE_DAYS
+
+
+class _CachedFit:
+    def __init__(self, model: RevenueForecaster, series: np.ndarray):
+        self.model = model
+        self.series = series  # Days the full fit saw, to detect changed history
+        self.extended = series  # Days the last extension saw, to detect late entries
+
+
+class RevenueFitCache:
+    """Fitted models per (forecaster, scope, horizon), least recently used evicted first"""
+
+    def __init__(self, max_fits: int = MAX_CACHED_FITS):
+        self.max_fits = max_fits
+        self._fits: "OrderedDict[tuple, _CachedFit]" = OrderedDict()
+        self.full_fits = 0
+        self.extensions = 0
+
+    def get(self, db: Session, forecaster: type, scope: Scope, horizon: int,
+            today: date) -> Tuple[Optional[RevenueForecaster], np.ndarray]:
+        """Fitted model and the daily series it covers (no model when the series is too short or sparse to fit)"""
+        key = (forecaster.name, scope, horizon)
+        cached = self._fits.get(key)
+        if cached is not None:
+            self._fits.move_to_end(key)
+            series = load_series(db, scope, cached.model.start, today)
+            fitted = len(cached.series)
+            if (fitted <= len(series) <= fitted + FULL_REFIT_DAYS
+                    and np.array_equal(series[:fitted], cached.series)):
+                # Invoices entered late change days already extended over, not only the length
+                if not np.array_equal(series[fitted:], cached.extended[fitted:]):
+                    cached.model.extend(series)
+                    cached.extended = series.copy()
+                    self.extensions += 1
+                return cached.model, series
+
+        self._fits.pop(key, None)
+        start = history_start(db, scope, today)
+        if start is None:
+            return None, np.zeros(0)
+        series = load_series(db, scope, start, today)
+        if not _fittable(series, forecaster, scope):
+            return None, series
+        model = forecaster()
+        model.fit(series, start, horizon)
+        self.full_fits += 1
+        self._fits[key] = _CachedFit(model, series.copy())
+        while len(self._fits) > self.max_fits:
+            self._fits.popitem(last=False)
+        return model, series
+
+    def clear(self):
+        self._fits.clear()
+
+
+# Global fit cache
+_fit_cache = None
+
+
+def get_revenue_fit_cache() -> RevenueFitCache:
+    """Get or create revenue fit cache instance"""
+    global _fit_cache
+    if _fit_cache is None:
+        _fit_cache = RevenueFitCache()
+    return _fit_cache
+
+
+def _configured_forecaster(name: str) -> type:
+    """The forecaster class for REVENUE_FORECASTER, checked once at import so a typo fails at startup"""
+    if name not in FORECASTERS:
+        raise ValueError(f"Unknown REVENUE_FORECASTER {name!r}, expected one of: {', '.join(sorted(FORECASTERS))}")
+    return FORECASTERS[name]
+
+
+REVENUE_FORECASTER = _configured_forecaster(settings.revenue_forecaster)
+
+
+def get_forecaster() -> type:
+    return REVENUE_FORECASTER
+
+
+def _portfolio_share(db: Session, scope: Scope, today: date) -> float:
+    """Scope's share of portfolio revenue over the last SHARE_WINDOW_DAYS (whole history if none)"""
+    Rollup = models.DailyInvoiceRollup
+    for start in (today - timedelta(days=SHARE_WINDOW_DAYS), None):
+        query = db.query(func.sum(Rollup.sum_total)).filter(Rollup.date < today)
+        if start is not None:
+            query = query.filter(Rollup.date >= start)
+        portfolio = _scope_filter(query, PORTFOLIO).scalar() or 0.0
+        if portfolio > 0:
+            return float(_scope_filter(query, scope).scalar() or 0.0) / portfolio
+    return 0.0
+
+
+def forecast_revenue(db: Session, today: date, horizon: int = 30, customer_id: Optional[int] = None,
+                     supplier_id: Optional[int] = None, fallback_window: int = 30) -> np.ndarray:
+    """
+    Expected revenue for each of the `horizon` days starting today
+
+    Series too short for the configured forecaster use the moving average over
+    `fallback_window` days; intermittent customer/supplier series follow the
+    portfolio forecast scaled by their share.
+    """
+    scope = scope_for(customer_id, supplier_id)
+    forecaster = get_forecaster()
+    cache = get_revenue_fit_cache()
+
+    model, series = cache.get(db, forecaster, scope, horizon, today)
+    if model is not None:
+        return model.forecast(horizon)
+    if not len(series):
+        return np.zeros(horizon)
+
+    if scope != PORTFOLIO and np.count_nonzero(series) < MIN_ACTIVE_DAYS:
+        share = _portfolio_share(db, scope, today)
+        if not share:
+            return np.zeros(horizon)
+        return share * forecast_revenue(db, today, horizon, fallback_window=fallback_window)
+
+    fallback = MovingAverageForecaster(fallback_window)
+    fallback.fit(series, today - timedelta(days=len(series)), horizon)
+    return fallback.forecast(horizon)
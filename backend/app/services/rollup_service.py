@@ -0,0 +1,193 @@
+"""
+Daily invoice rollup maintenance
+Keeps the daily_invoice_rollup table in step with invoice writes so analytics
+reads cost O(days in window) instead of O(all invoices).
+
+Every write path applies its delta inside the caller's transaction:
+
+    snapshot = rollup_service.snapshot(invoice)    # before mutating
+    ...
+    rollup_service.replace(db, snapshot, invoice)  # after mutating
+
+Rebuild from scratch with:
+
+    python -m app.services.rollup_service rebuild
+"""
+
+import sys
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+Rollup = models.DailyInvoiceRollup
+
+# (date, status, supplier_id, customer_id), total, tax
+RollupSnapshot = Tuple[tuple, float, float]
+
+
+def rollup_status(status: Optional[str]) -> str:
+    """Normalize a manual invoice status into a rollup key component"""
+    return (status or "").lower()
+
+
+def snapshot(invoice: models.Invoice) -> RollupSnapshot:
+    """Capture the rollup contribution of an invoice before it is modified"""
+    key = (invoice.issue_date, rollup_status(invoice.status), invoice.supplier_id, invoice.customer_id)
+    return key, float(invoice.total or 0.0), float(invoice.tax or 0.0)
+
+
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(Rollup)
+
+
+def apply_delta(db: Session, key: tuple, total: float, tax: float, count: int):
+    """Add a (total, tax, count) delta to one rollup bucket"""
+    day, status, supplier_id, customer_id = key
+    values = {
+        "date": day,
+        "status": status,
+        "supplier_id": supplier_id,
+        "customer_id": customer_id,
+        "sum_total": total,
+        "sum_tax": tax,
+        "count": count,
+    }
+    key_filter = (
+        Rollup.date == day,
+        Rollup.status == status,
+        Rollup.supplier_id == supplier_id,
+        Rollup.customer_id == customer_id,
+    )
+
+    stmt = _upsert_statement(db)
+    if stmt is not None:
+        stmt = stmt.values(**values).on_conflict_do_update(
+            index_elements=["date", "status", "supplier_id", "customer_id"],
+            set_={
+                "sum_total": Rollup.sum_total + stmt.excluded.sum_total,
+                "sum_tax": Rollup.sum_tax + stmt.excluded.sum_tax,
+                "count": Rollup.count + stmt.excluded.count,
+            },
+        )
+        db.execute(stmt)
+    else:
+        row = db.query(Rollup).filter(*key_filter).with_for_update().first()
+        if row is None:
+            db.execute(insert(Rollup).values(**values))
+        else:
+            row.sum_total += total
+            row.sum_tax += tax
+            row.count += count
+            db.flush()
+
+    if count < 0:
+        db.execute(delete(Rollup).where(*key_filter, Rollup.count <= 0))
+
+
+def apply_deltas(db: Session, deltas: Dict[tuple, list]):
+    """Add many (total, tax, count) deltas at once, one executemany upsert (bulk imports)"""
+    if not deltas:
+        return
+    stmt = _upsert_statement(db)
+    if stmt is None or any(count < 0 for _, _, count in deltas.values()):
+        for key, (total, tax, count) in deltas.items():
+            apply_delta(db, key, total, tax, count)
+        return
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date", "status", "supplier_id", "customer_id"],
+        set_={
+            "sum_total": Rollup.sum_total + stmt.excluded.sum_total,
+            "sum_tax": Rollup.sum_tax + stmt.excluded.sum_tax,
+            "count": Rollup.count + stmt.excluded.count,
+        },
+    )
+    db.execute(stmt, [
+        {
+            "date": day, "status": status, "supplier_id": supplier_id, "customer_id": customer_id,
+            "sum_total": total, "sum_tax": tax, "count": count,
+        }
+        for (day, status, supplier_id, customer_id), (total, tax, count) in deltas.items()
+    ])
+
+
+def add_invoice(db: Session, invoice: models.Invoice):
+    """Record a newly created invoice (call after flush so foreign keys are set)"""
+    key, total, tax = snapshot(invoice)
+    apply_delta(db, key, total, tax, 1)
+
+
+def remove_snapshot(db: Session, previous: RollupSnapshot):
+    key, total, tax = previous
+    apply_delta(db, key, -total, -tax, -1)
+
+
+def remove_invoice(db: Session, invoice: models.Invoice):
+    """Remove a deleted invoice's contribution"""
+    remove_snapshot(db, snapshot(invoice))
+
+
+def replace(db: Session, previous: RollupSnapshot, invoice: models.Invoice):
+    """Move an updated invoice's contribution from its old bucket to its new one"""
+    current = snapshot(invoice)
+    if current == previous:
+        return
+    remove_snapshot(db, previous)
+    key, total, tax = current
+    apply_delta(db, key, total, tax, 1)
+
+
+def rebuild(db: Session) -> int:
+    """Regenerate the rollup from the invoices table, returns the number of buckets"""
+    Invoice = models.Invoice
+    status = func.lower(func.coalesce(Invoice.status, ""))
+    source = select(
+        Invoice.issue_date,
+        status,
+        Invoice.supplier_id,
+        Invoice.customer_id,
+        func.sum(Invoice.total),
+        func.sum(Invoice.tax),
+        func.count(Invoice.id),
+    ).group_by(Invoice.issue_date, status, Invoice.supplier_id, Invoice.customer_id)
+
+    db.execute(delete(Rollup))
+    db.execute(insert(Rollup).from_select(
+        ["date", "status", "supplier_id", "customer_id", "sum_total", "sum_tax", "count"],
+        source,
+    ))
+    db.commit()
+    return db.query(func.count(Rollup.id)).scalar() or 0
+
+
+def ensure_populated(db: Session):
+    """Build the rollup for databases that predate it"""
+    has_rollup = db.query(Rollup.id).first() is not None
+    has_invoices = db.query(models.Invoice.id).first() is not None
+    if has_invoices and not has_rollup:
+        buckets = rebuild(db)
+        print(f"✅ Daily invoice rollup built ({buckets} buckets)")
+
+
+if __name__ == "__main__":
+    from ..database import SessionLocal, migrate_database
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python -m app.services.rollup_service rebuild")
+        sys.exit(1)
+
+    migrate_database()
+    session = SessionLocal()
+    try:
+        print(f"✅ Rebuilt daily invoice rollup ({rebuild(session)} buckets)")
+    finally:
+        session.close()
@@ -0,0 +1,167 @@
+"""
+Database load test: legacy vs tuned SQLite engine profile
+
+Runs a mixed workload (invoice listings, the analytics status breakdown and
+invoice inserts) from concurrent threads against two copies of a seeded SQLite
+database:
+- legacy: one shared connection (StaticPool), default rollback journal
+- tuned: the application's engine profile (pooled connections, WAL, pragmas)
+
+Usage (from the backend directory):
+    python -m benchmarks.db_load [--threads 8] [--seconds 10] [--invoices 20000] [--write-ratio 0.1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import joinedload, selectinload, sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import create_db_engine  # noqa: E402
+from app.services import analytics_service, rollup_service  # noqa: E402
+
+
+def seed(engine, invoice_count: int):
+    rng = random.Random(7)
+    today = date.today()
+    now = datetime.utcnow()
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Customer), [{"name": f"Customer {i}", "created_at": now} for i in range(200)])
+        conn.execute(insert(models.Supplier), [{"name": f"Supplier {i}", "created_at": now} for i in range(100)])
+        conn.execute(insert(models.Invoice), [{
+            "invoice_number": f"INV-{i:07d}",
+            "issue_date": today - timedelta(days=rng.randint(0, 730)),
+            "due_date": today + timedelta(days=rng.randint(-60, 60)),
+            "total": round(rng.uniform(50, 5000), 2),
+            "customer_id": rng.randint(1, 200), "supplier_id": rng.randint(1, 100),
+            "raw_text": "OCR TEXT " * 120, "extraction_status": "completed",
+            "created_at": now, "updated_at": now,
+        } for i in range(invoice_count)])
+        conn.execute(insert(models.InvoiceItem), [
+            {"invoice_id": invoice_id, "description": "Service", "total": 60.0, "created_at": now}
+            for invoice_id in range(1, invoice_count + 1)
+        ])
+    session = sessionmaker(bind=engine)()
+    rollup_service.rebuild(session)
+    session.close()
+
+
+def list_customer_invoices(db, rng):
+    db.query(models.Invoice).options(
+        joinedload(models.Invoice.customer),
+        joinedload(models.Invoice.supplier),
+        selectinload(models.Invoice.items)
+    ).filter(
+        models.Invoice.customer_id == rng.randint(1, 200)
+    ).order_by(models.Invoice.issue_date.desc(), models.Invoice.id.desc()).limit(50).all()
+
+
+def status_breakdown(db, rng):
+    analytics_service.status_breakdown(db, date.today())
+
+
+def create_invoice(db, rng):
+    invoice = models.Invoice(
+        invoice_number=f"LOAD-{rng.getrandbits(48):x}",
+        issue_date=date.today(),
+        total=100.0,
+        customer_id=rng.randint(1, 200),
+        supplier_id=rng.randint(1, 100)
+    )
+    db.add(invoice)
+    db.flush()
+    rollup_service.add_invoice(db, invoice)
+    db.commit()
+
+
+def run_load(engine, threads: int, seconds: float, write_ratio: float) -> dict:
+    Session = sessionmaker(bind=engine, autoflush=False)
+    latencies = {"read": [], "write": []}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed_value: int):
+        rng = random.Random(seed_value)
+        while time.perf_counter() < deadline:
+            if rng.random() < write_ratio:
+                kind, operation = "write", create_invoice
+            else:
+                kind, operation = "read", rng.choice([list_customer_invoices, list_customer_invoices, status_breakdown])
+            db = Session()
+            started = time.perf_counter()
+            try:
+                operation(db, rng)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies[kind].append(elapsed)
+            except Exception as e:
+                db.rollback()
+                with lock:
+                    errors.append(type(e).__name__)
+            finally:
+                db.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {"latencies": latencies, "errors": errors, "seconds": seconds}
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name: str, result: dict):
+    reads, writes = result["latencies"]["read"], result["latencies"]["write"]
+    throughput = (len(reads) + len(writes)) / result["seconds"]
+    print(f"{name:>7}: {throughput:8.1f} ops/s | "
+          f"read p50 {percentile(reads, 0.5) * 1000:6.2f} ms p95 {percentile(reads, 0.95) * 1000:7.2f} ms | "
+          f"write p50 {percentile(writes, 0.5) * 1000:6.2f} ms p95 {percentile(writes, 0.95) * 1000:7.2f} ms | "
+          f"errors {len(result['errors'])}" + (f" ({', '.join(sorted(set(result['errors'])))})" if result["errors"] else ""))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--threads", type=int, default=8)
+    arg_parser.add_argument("--seconds", type=float, default=10)
+    arg_parser.add_argument("--invoices", type=int, default=20000)
+    arg_parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="db_load_")
+    legacy_url = f"sqlite:///{os.path.join(workdir, 'legacy.db')}"
+    tuned_url = f"sqlite:///{os.path.join(workdir, 'tuned.db')}"
+    profiles = {
+        "legacy": create_engine(legacy_url, connect_args={"check_same_thread": False}, poolclass=StaticPool),
+        "tuned": create_db_engine(tuned_url),
+    }
+
+    print(f"Seeding {args.invoices} invoices per database in {workdir} ...")
+    for engine in profiles.values():
+        seed(engine, args.invoices)
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes")
+    for name, engine in profiles.items():
+        report(name, run_load(engine, args.threads, args.seconds, args.write_ratio))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
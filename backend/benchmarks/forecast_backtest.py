@@ -0,0 +1,132 @@
+"""
+Payment forecast backtest: accuracy, calibration and throughput
+
+Generates a synthetic ledger whose customers have distinct payment habits
+(prompt, average and slow payers, larger invoices paid later), learns the
+profiles from the payments made before a cutoff date and forecasts every
+invoice still open at the cutoff. The forecasts are scored against the actual
+payment dates and compared to the old placeholder (due date + 30 days) and to
+"paid on the due date".
+
+Usage (from the backend directory):
+    python -m benchmarks.forecast_backtest [--customers 2000] [--invoices 500000] [--seed 7]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import forecast_engine  # noqa: E402
+
+START = date(2023, 1, 1)
+DAYS = 730
+
+
+def synthetic_ledger(customers: int, invoices: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    habit = rng.choice([0, 1, 2], size=customers, p=[0.5, 0.35, 0.15])
+    mean_lateness = np.choose(habit, [rng.normal(-3, 2, customers), rng.normal(8, 4, customers), rng.normal(35, 10, customers)])
+    spread = np.choose(habit, [np.full(customers, 2.0), np.full(customers, 6.0), np.full(customers, 15.0)])
+    typical_amount = rng.lognormal(7, 1, customers)
+    # Customers get invoices at different rates
+    weights = rng.pareto(1.5, customers) + 1
+
+    customer = rng.choice(customers, size=invoices, p=weights / weights.sum())
+    issue = pd.Timestamp(START) + pd.to_timedelta(rng.integers(0, DAYS, invoices), unit="D")
+    terms = rng.choice([15, 30, 45, 60], size=invoices)
+    due = issue + pd.to_timedelta(terms, unit="D")
+    amount = typical_amount[customer] * rng.lognormal(0, 0.6, invoices)
+    # Larger than usual invoices of a customer are paid later
+    lateness = (mean_lateness[customer] + 4 * np.log(amount / typical_amount[customer])
+                + rng.normal(0, spread[customer]))
+    paid = due + pd.to_timedelta(np.round(lateness), unit="D")
+    paid = paid.where(paid >= issue, issue)
+    return pd.DataFrame({
+        "invoice_id": np.arange(1, invoices + 1),
+        "customer_id": customer + 1,
+        "issue_date": issue,
+        "due_date": due,
+        "paid_date": paid,
+        "total": amount.round(2),
+    })
+
+
+def calibration_table(predicted: np.ndarray, observed: np.ndarray, bins: int = 5) -> str:
+    edges = np.quantile(predicted, np.linspace(0, 1, bins + 1))
+    bucket = np.clip(np.searchsorted(edges, predicted, side="right") - 1, 0, bins - 1)
+    lines = []
+    for b in range(bins):
+        mask = bucket == b
+        if mask.any():
+            lines.append(f"    {predicted[mask].mean():5.2f} predicted -> {observed[mask].mean():5.2f} observed  (n={mask.sum()})")
+    return "\n".join(lines)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--customers", type=int, default=2000)
+    arg_parser.add_argument("--invoices", type=int, default=500000)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+
+    ledger = synthetic_ledger(args.customers, args.invoices, args.seed)
+    cutoff = pd.Timestamp(START) + pd.Timedelta(days=int(DAYS * 0.75))
+    history = ledger[ledger["paid_date"] < cutoff]
+    open_invoices = ledger[(ledger["issue_date"] <= cutoff) & (ledger["paid_date"] >= cutoff)]
+    print(f"{len(ledger)} invoices, {args.customers} customers; "
+          f"cutoff {cutoff.date()}: {len(history)} paid (history), {len(open_invoices)} open (scored)")
+
+    started = time.perf_counter()
+    profiles = forecast_engine.build_profiles(history)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    forecast = forecast_engine.predict(profiles, open_invoices, cutoff.date())
+    predict_seconds = time.perf_counter() - started
+
+    actual = open_invoices["paid_date"].to_numpy(dtype="datetime64[D]")
+    due = open_invoices["due_date"].to_numpy(dtype="datetime64[D]")
+    predictions = {
+        "engine": forecast["predicted_payment_date"].to_numpy(dtype="datetime64[D]"),
+        "due date + 30 (old placeholder)": due + np.timedelta64(30, "D"),
+        "due date": due,
+    }
+
+    print(f"\nThroughput: profiles from {len(history)} payments in {build_seconds:.2f}s "
+          f"({len(history) / build_seconds:,.0f} rows/s); "
+          f"{len(open_invoices)} forecasts in {predict_seconds:.3f}s ({len(open_invoices) / predict_seconds:,.0f}/s)")
+
+    print("\nAccuracy (days between predicted and actual payment):")
+    window = forecast_engine.CONFIDENCE_WINDOW_DAYS
+    for name, predicted in predictions.items():
+        error = np.abs((predicted - actual).astype(int))
+        print(f"  {name:>32}: MAE {error.mean():6.2f}  median {np.median(error):5.1f}  "
+              f"within ±{window}d {np.mean(error <= window):6.1%}")
+
+    error = np.abs((predictions["engine"] - actual).astype(int))
+    overdue = (np.datetime64(cutoff.date()) > due)
+    print(f"  engine on invoices already overdue at the cutoff ({overdue.sum()}): MAE {error[overdue].mean():.2f}")
+
+    confidence = forecast["confidence_score"].to_numpy()
+    hits = (error <= window).astype(float)
+    print(f"\nConfidence calibration (share paid within ±{window}d of the forecast), "
+          f"mean {confidence.mean():.3f} vs observed {hits.mean():.3f}:")
+    print(calibration_table(confidence, hits))
+
+    risk = forecast["risk_score"].to_numpy()
+    severe = ((actual - due).astype(int) > forecast_engine.SEVERE_LATE_DAYS).astype(float)
+    brier = np.mean((risk - severe) ** 2)
+    baseline_brier = np.mean((severe.mean() - severe) ** 2)
+    print(f"\nRisk calibration (paid > {forecast_engine.SEVERE_LATE_DAYS}d late), Brier {brier:.4f} "
+          f"vs {baseline_brier:.4f} for a constant rate:")
+    print(calibration_table(risk, severe))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Query plan benchmark for the invoice endpoints
+
+Seeds a throwaway SQLite database, then runs each endpoint twice: without the
+query indexes of migration 0003 (its downgrade) and with them. For every
+SELECT an endpoint issues, prints SQLite's EXPLAIN QUERY PLAN and the best
+request time.
+
+Usage (from the backend directory):
+    python benchmarks/query_plans.py [--invoices 20000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="query_plans_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alembic.config import Config  # noqa: E402
+from alembic.operations import Operations  # noqa: E402
+from alembic.runtime.migration import MigrationContext  # noqa: E402
+from alembic.script import ScriptDirectory  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import engine, get_async_engine, migrate_database  # noqa: E402
+from app.main import app  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(invoice_count: int):
+    """Synthetic ledger: 200 customers, 100 suppliers, 2 items per invoice, forecasts for every fifth invoice"""
+    rng = random.Random(42)
+    today = date.today()
+    now = datetime.utcnow()
+    raw_text = "OCR TEXT " * 120  # Invoice rows carry raw OCR text, as uploads do
+    with engine.begin() as conn:
+        conn.execute(insert(models.Customer), [
+            {"name": f"Customer {i}", "tax_id": f"{1000000000 + i}", "created_at": now, "updated_at": now}
+            for i in range(200)
+        ])
+        conn.execute(insert(models.Supplier), [
+            {"name": f"Supplier {i}", "tax_id": f"{2000000000 + i}", "created_at": now, "updated_at": now}
+            for i in range(100)
+        ])
+        invoices = []
+        for i in range(invoice_count):
+            issue_date = today - timedelta(days=rng.randint(0, 730))
+            invoices.append({
+                "invoice_number": f"INV-{i:07d}",
+                "issue_date": issue_date,
+                "due_date": issue_date + timedelta(days=30),
+                "subtotal": 100.0, "tax": 20.0, "total": round(rng.uniform(50, 5000), 2),
+                "customer_id": rng.randint(1, 200), "supplier_id": rng.randint(1, 100),
+                "raw_text": raw_text, "extraction_status": "completed",
+                "status": rng.choice([None, None, "paid", "pending", "cancelled"]),
+                "created_at": now, "updated_at": now,
+            })
+        conn.execute(insert(models.Invoice), invoices)
+        conn.execute(insert(models.InvoiceItem), [
+            {"invoice_id": invoice_id, "description": "Service", "quantity": 1.0, "total": 60.0, "created_at": now}
+            for invoice_id in range(1, invoice_count + 1) for _ in range(2)
+        ])
+        conn.execute(insert(models.Forecast), [
+            {"invoice_id": invoice_id, "predicted_payment_date": today, "confidence_score": 0.5,
+             "created_at": now, "updated_at": now}
+            for invoice_id in range(1, invoice_count + 1, 5)
+        ])
+
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+    return config
+
+
+def run_migration(revision: str, direction: str):
+    """Run one revision's upgrade() or downgrade() alone, later revisions' schema changes stay in place"""
+    module = ScriptDirectory.from_config(alembic_config()).get_revision(revision).module
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            getattr(module, direction)()
+
+
+def ingest_dedup_lookup(client: TestClient):
+    """The upload dedup query (invoice_ingest.save_extracted_invoice)"""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        db.query(models.Invoice).filter(
+            models.Invoice.invoice_number == "INV-0012345",
+            models.Invoice.supplier_id == 42
+        ).first()
+    finally:
+        db.close()
+
+
+def endpoint_cases(invoice_count: int):
+    middle_id = invoice_count // 2
+    return [
+        ("GET /invoices/?limit=100", lambda c: c.get("/api/v1/invoices/?limit=100")),
+        ("GET /invoices/customer/{id}", lambda c: c.get("/api/v1/invoices/customer/17?limit=100")),
+        ("GET /invoices/supplier/{id}", lambda c: c.get("/api/v1/invoices/supplier/42?limit=100")),
+        ("GET /invoices/{id}", lambda c: c.get(f"/api/v1/invoices/{middle_id}")),
+        ("GET /forecasts/invoice/{id}", lambda c: c.get(f"/api/v1/forecasts/invoice/{middle_id}")),
+        ("GET /analytics/invoices", lambda c: c.get("/api/v1/analytics/invoices")),
+        ("upload dedup lookup", ingest_dedup_lookup),
+    ]
+
+
+def capture_selects(client: TestClient, call):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    # Routers use both the sync and the async engine
+    targets = (engine, get_async_engine().sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        call(client)
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", record)
+    return statements
+
+
+def query_plan(statement: str, parameters) -> list:
+    # Fresh connection: the application's pooled connection may keep statements prepared against the old schema
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    finally:
+        conn.close()
+    return [row[-1] for row in rows]
+
+
+def measure(client: TestClient, cases, repeat: int) -> dict:
+    results = {}
+    for name, call in cases:
+        plans = [query_plan(statement, parameters) for statement, parameters in capture_selects(client, call)]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call(client)
+            timings.append(time.perf_counter() - started)
+        results[name] = (plans, min(timings))
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--invoices", type=int, default=20000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    engine.echo = False
+    migrate_database()
+    print(f"Seeding {args.invoices} invoices into {DB_PATH} ...")
+    seed(args.invoices)
+
+    run_migration("0003", "downgrade")
+    cases = endpoint_cases(args.invoices)
+    with TestClient(app) as client:
+        engine.echo = False
+        before = measure(client, cases, args.repeat)
+        run_migration("0003", "upgrade")
+        after = measure(client, cases, args.repeat)
+
+    for name, _ in cases:
+        (plans_before, time_before), (plans_after, time_after) = before[name], after[name]
+        print(f"\n=== {name}: {time_before * 1000:.2f} ms -> {time_after * 1000:.2f} ms")
+        for index, (plan_before, plan_after) in enumerate(zip(plans_before, plans_after), 1):
+            if plan_before == plan_after:
+                print(f"  query {index} (unchanged): {' | '.join(plan_after)}")
+            else:
+                print(f"  query {index} before: {' | '.join(plan_before)}")
+                print(f"  query {index} after:  {' | '.join(plan_after)}")
+
+
+if __name__ == "__main__":
+    main()
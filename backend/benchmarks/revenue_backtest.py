@@ -0,0 +1,92 @@
+"""
+Revenue forecaster backtest: accuracy and fit cost
+
+Generates daily revenue with a trend, a weekday pattern, month-end peaks, a
+yearly cycle and lumpy noise, then forecasts the days after a series of
+rolling cutoffs with each registered forecaster. Reports the daily and
+cumulative (end of horizon) errors, and the cost of a full fit against
+folding one new day into a cached fit.
+
+Usage (from the backend directory):
+    python benchmarks/revenue_backtest.py [--days 1095] [--horizon 30] [--origins 12] [--seed 7]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import revenue_forecaster  # noqa: E402
+
+START = date(2022, 1, 1)
+WEEKDAY_FACTORS = np.array([1.2, 1.15, 1.1, 1.1, 1.0, 0.35, 0.1])
+
+
+def synthetic_revenue(days: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(START, periods=days, freq="D")
+    t = np.arange(days)
+    base = 10000 * (1 + 0.3 * t / 365)
+    yearly = 1 + 0.25 * np.sin(2 * np.pi * (np.asarray(index.dayofyear) - 80) / 365.25)
+    weekday = WEEKDAY_FACTORS[np.asarray(index.dayofweek)]
+    month_end = np.where(np.asarray(index.days_in_month - index.day) < 3, 1.8, 1.0)
+    expected = base * yearly * weekday * month_end
+    return expected * rng.lognormal(-0.08, 0.4, days)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--days", type=int, default=1095)
+    arg_parser.add_argument("--horizon", type=int, default=30)
+    arg_parser.add_argument("--origins", type=int, default=12)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+
+    series = synthetic_revenue(args.days, args.seed)
+    horizon = args.horizon
+    # Rolling origins over the last year, one every four weeks
+    cutoffs = [args.days - horizon - 28 * i for i in range(args.origins)]
+    cutoffs = [cutoff for cutoff in cutoffs if cutoff >= 2 * 365 // 3]
+    print(f"{args.days} days of revenue, horizon {horizon} days, {len(cutoffs)} forecast origins")
+
+    print("\nAccuracy (mean absolute error, share of mean daily revenue):")
+    for name, forecaster in revenue_forecaster.FORECASTERS.items():
+        daily_errors, total_errors, fit_seconds = [], [], []
+        for cutoff in cutoffs:
+            model = forecaster()
+            started = time.perf_counter()
+            model.fit(series[:cutoff], START, horizon)
+            fit_seconds.append(time.perf_counter() - started)
+            predicted = model.forecast(horizon)
+            actual = series[cutoff:cutoff + horizon]
+            daily_errors.append(np.abs(predicted - actual).mean() / actual.mean())
+            total_errors.append(abs(predicted.sum() - actual.sum()) / actual.sum())
+        print(f"  {name:>15}: daily {np.mean(daily_errors):6.1%}  {horizon}-day total {np.mean(total_errors):6.1%}  "
+              f"(fit {np.mean(fit_seconds) * 1000:.1f} ms)")
+
+    model = revenue_forecaster.HoltWintersForecaster()
+    history = series[:-revenue_forecaster.FULL_REFIT_DAYS]
+    started = time.perf_counter()
+    model.fit(history, START, horizon)
+    full_fit = time.perf_counter() - started
+    started = time.perf_counter()
+    for extra in range(1, revenue_forecaster.FULL_REFIT_DAYS + 1):
+        model.extend(series[:len(history) + extra])
+        model.forecast(horizon)
+    extension = (time.perf_counter() - started) / revenue_forecaster.FULL_REFIT_DAYS
+    print(f"\nHolt-Winters on {len(history)} days: full fit {full_fit * 1000:.1f} ms, "
+          f"cached fit + one new day {extension * 1000:.2f} ms")
+    print(f"  parameters (alpha, beta, gamma, phi): {tuple(round(float(p), 3) for p in model.params)}")
+    print(f"  month-end offset {model.calendar.month_end:,.0f}; "
+          f"month offsets {np.round(model.calendar.months).astype(int).tolist()}")
+    print(f"  forecast from {START + timedelta(days=model.length)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Shared test fixtures
+The app reads its settings at import, so the environment is pointed at a
+throwaway SQLite database (and the on-disk caches are disabled) before any
+app module is imported.
+"""
+
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ["ANALYTICS_CACHE_BACKEND"] = "none"
+os.environ["OCR_CACHE_ENABLED"] = "False"
+
+import pytest  # noqa: E402
+
+from app import database  # noqa: E402
+from app.services import entity_resolver  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables, dropped again afterwards"""
+    database.create_tables()
+    entity_resolver._resolver_instance = None
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        database.drop_tables()
+        entity_resolver._resolver_instance = None
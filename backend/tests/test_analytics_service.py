@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import pytest
+
+from app.models import Customer, Forecast, Invoice, Supplier
+from app.services.analytics_service import cash_flow_projection
+
+TODAY = date(2026, 10, 1)
+
+
+def _open_invoice(db, total: float, days_out: int, confidence: float):
+    customer, supplier = Customer(name="Acme"), Supplier(name="Supplier")
+    db.add_all([customer, supplier])
+    db.flush()
+    invoice = Invoice(invoice_number=f"INV-{total}", issue_date=TODAY - timedelta(days=40),
+                      due_date=TODAY + timedelta(days=days_out), total=total,
+                      customer_id=customer.id, supplier_id=supplier.id)
+    db.add(invoice)
+    db.flush()
+    db.add(Forecast(invoice_id=invoice.id, predicted_payment_date=TODAY + timedelta(days=days_out),
+                    confidence_score=confidence, risk_score=0.0, is_current=True))
+    db.commit()
+
+
+def test_cash_flow_bands_follow_the_timing_model(db):
+    # 1000 predicted in 3 days at c=0.5: 250 / 500 / 250 over days 3-5.
+    # 200 predicted 2 days ago at c=0.8: today 0.9 (its early half included), tomorrow 0.1
+    _open_invoice(db, 1000.0, 3, 0.5)
+    _open_invoice(db, 200.0, -2, 0.8)
+    z = NormalDist().inv_cdf(0.9)
+    spread = 1000 * (0.25 * 0.75) ** 0.5 * z  # Invoice A at p or F = 0.25 or 0.75
+
+    projection = cash_flow_projection(db, TODAY, 7, band_level=0.8)
+    points = projection["points"]
+
+    assert [p["expected"] for p in points] == pytest.approx([180, 20, 250, 500, 250, 0, 0])
+    assert [p["invoice_count"] for p in points] == [1, 0, 0, 1, 0, 0, 0]
+    # sd = amount * sqrt(p * (1 - p)); upper never exceeds the invoices that can land in the bucket
+    assert [p["lower"] for p in points[:2]] == pytest.approx([180 - 60 * z, 0])
+    assert [p["upper"] for p in points] == pytest.approx(
+        [200, 20 + 60 * z, 250 + spread, 1000, 250 + spread, 0, 0]
+    )
+
+    # Running totals from P(paid by the bucket's end): F = 0.9, 1 / 0.25, 0.75, 1
+    assert [p["cumulative_expected"] for p in points] == pytest.approx([180, 200, 450, 950, 1200, 1200, 1200])
+    assert [p["cumulative_lower"] for p in points] == pytest.approx(
+        [180 - 60 * z, 200, 200, 950 - spread, 1200, 1200, 1200]
+    )
+    assert [p["cumulative_upper"] for p in points] == pytest.approx(
+        [200, 200, 450 + spread, 1200, 1200, 1200, 1200]
+    )
+    assert projection["forecast_amount"] == 1200
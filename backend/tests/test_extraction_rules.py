@@ -0,0 +1,24 @@
+from app.services.extraction_rules import DEFAULT_RULES_PATH, ExtractionRules
+from app.services.ocr_service import InvoiceOCRService
+
+
+def _fingerprint(monkeypatch, rules: ExtractionRules) -> str:
+    monkeypatch.setattr("app.services.ocr_service.RULES", rules)
+    # The fingerprint needs no OCR backend
+    service = object.__new__(InvoiceOCRService)
+    service.backend, service.language_codes = "tesseract", ["eng", "tur"]
+    return service.cache_fingerprint()
+
+
+def test_rule_table_edits_change_the_cache_fingerprint(tmp_path, monkeypatch):
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as handle:
+        table = handle.read()
+    commented = tmp_path / "commented.yaml"
+    commented.write_text("# Local copy of the bundled rules\n" + table, encoding="utf-8")
+    edited = tmp_path / "edited.yaml"
+    edited.write_text(table.replace("pattern: 'SAYIN'", "pattern: 'SAYIN|SAYGIDEĞER'"), encoding="utf-8")
+
+    bundled = ExtractionRules.load(DEFAULT_RULES_PATH)
+    assert ExtractionRules.load(str(commented)).digest == bundled.digest
+    assert ExtractionRules.load(str(edited)).digest != bundled.digest
+    assert _fingerprint(monkeypatch, ExtractionRules.load(str(edited))) != _fingerprint(monkeypatch, bundled)
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from app.models import Customer, Forecast, ForecastRun, Invoice, Supplier
+from app.services import forecast_engine
+
+AS_OF = date(2026, 10, 1)
+
+
+def _invoices(db, count: int = 2):
+    customer, supplier = Customer(name="Acme"), Supplier(name="Supplier")
+    db.add_all([customer, supplier])
+    db.flush()
+    invoices = [
+        Invoice(invoice_number=f"INV-{n}", issue_date=AS_OF, due_date=AS_OF + timedelta(days=30), total=100.0,
+                customer_id=customer.id, supplier_id=supplier.id)
+        for n in range(count)
+    ]
+    db.add_all(invoices)
+    db.commit()
+    return [invoice.id for invoice in invoices]
+
+
+def test_single_predictions_share_the_days_manual_run(db):
+    invoice_ids = _invoices(db)
+    batch = forecast_engine.forecast_open_invoices(db, as_of=AS_OF)
+
+    runs = {forecast_engine.forecast_invoices(db, [invoice_ids[n % 2]], as_of=AS_OF).id for n in range(7)}
+    next_day = forecast_engine.forecast_invoices(db, [invoice_ids[0]], as_of=AS_OF + timedelta(days=1))
+
+    assert len(runs) == 1 and next_day.id not in runs
+    assert [run.kind for run in db.query(ForecastRun).order_by(ForecastRun.id)] == ["batch", "manual", "manual"]
+    assert db.get(ForecastRun, runs.pop()).invoice_count == 7
+    # Single predictions never prune: the batch forecasts are all kept as history
+    assert db.query(Forecast).filter(Forecast.run_id == batch.run_id).count() == 2
+
+
+def test_retention_keeps_the_most_recent_batch_runs(db):
+    _invoices(db)
+    batches = [forecast_engine.forecast_open_invoices(db, as_of=AS_OF).run_id for _ in range(4)]
+
+    assert forecast_engine.prune_runs(db, keep=2) == 4
+    db.commit()
+    assert [run.id for run in db.query(ForecastRun).order_by(ForecastRun.id)] == batches[2:]
+    assert db.query(Forecast).filter(Forecast.is_current.is_(True)).count() == 2
@@ -0,0 +1,41 @@
+import io
+
+from app.models import Invoice, InvoiceItem
+from app.services.ledger_import import import_ledger
+
+HEADER = "invoice_number,issue_date,total,supplier_name,customer_name,item_description,item_total\n"
+
+
+def _import(rows: str):
+    return import_ledger(io.BytesIO((HEADER + rows).encode()), "ledger.csv")
+
+
+def test_header_only_file_imports_nothing(db):
+    result = import_ledger(io.BytesIO(b"invoice_number,issue_date,total,supplier_name,customer_name\n"), "ledger.csv")
+
+    assert result.rows_read == 0
+    assert result.rows_failed == 0
+    assert result.invoices_created == 0
+
+
+def test_duplicate_lines_do_not_attach_to_same_number_of_another_supplier(db):
+    _import("A1,2024-01-01,100,SupA,Cust,existing,100\n")
+
+    result = _import(
+        "A1,2024-01-02,100,SupQ,Cust,new,100\n"
+        "A1,2024-01-02,100,SupA,Cust,line 1,50\n"
+        "A1,2024-01-02,100,SupA,Cust,line 2,50\n"
+        "B1,2024-01-02,30,SupA,Cust,other,30\n"
+    )
+
+    assert result.rows_read == 4
+    assert result.invoices_created == 2
+    assert result.items_created == 2
+    assert result.rows_failed == 2
+    assert [(error.row, error.error) for error in result.errors] == [
+        (2, "Invoice already exists"),
+        (3, "Invoice already exists"),
+    ]
+    assert db.query(Invoice).count() == 3
+    descriptions = {item.description for item in db.query(InvoiceItem)}
+    assert descriptions == {"existing", "new", "other"}
@@ -0,0 +1,69 @@
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+
+from app.database import alembic_config, migrate_database
+from app.models import Base
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    config = alembic_config()
+    config.set_main_option("sqlalchemy.url", url)
+    engine = sa.create_engine(url)
+    try:
+        yield engine, config
+    finally:
+        engine.dispose()
+
+
+def _revision(engine) -> str:
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def test_migrations_build_the_model_schema(database):
+    engine, config = database
+
+    assert migrate_database(engine) == _revision(engine)
+
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+
+def test_downgrade_to_base_and_back(database):
+    engine, config = database
+    command.upgrade(config, "head")
+
+    command.downgrade(config, "base")
+    assert sa.inspect(engine).get_table_names() == ["alembic_version"]
+    command.upgrade(config, "head")
+    assert set(Base.metadata.tables) <= set(sa.inspect(engine).get_table_names())
+
+
+def test_database_from_before_migrations_is_stamped_with_the_baseline(database):
+    engine, config = database
+    # Tables as create_tables() built them, without an Alembic revision
+    command.upgrade(config, "0001")
+    with engine.begin() as connection:
+        connection.execute(sa.text("DROP TABLE alembic_version"))
+
+    with pytest.raises(RuntimeError, match="alembic stamp 0001"):
+        migrate_database(engine)
+
+    command.stamp(config, "0001")
+    head = migrate_database(engine)
+    assert _revision(engine) == head
+    assert "paid_date" in {column["name"] for column in sa.inspect(engine).get_columns("invoices")}
+
+
+def test_startup_check_without_upgrade_refuses_an_old_schema(database):
+    engine, config = database
+    command.upgrade(config, "0002")
+
+    with pytest.raises(RuntimeError, match="at revision 0002"):
+        migrate_database(engine, upgrade=False)
+    assert _revision(engine) == "0002"
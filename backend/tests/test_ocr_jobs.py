@@ -0,0 +1,51 @@
+from sqlalchemy import event, text
+
+from app import database
+from app.models import OCRJob
+from app.services.ocr_jobs import OCRJobRunner
+
+
+def _queue(db, job_id: str, attempts: int = 0):
+    db.add(OCRJob(id=job_id, file_path=f"/tmp/{job_id}.png", status="queued", progress=0, attempts=attempts))
+    db.commit()
+
+
+def test_claim_marks_jobs_running(db):
+    _queue(db, "a")
+    _queue(db, "b")
+
+    assert sorted(OCRJobRunner()._claim(5)) == ["a", "b"]
+    assert OCRJobRunner()._claim(5) == []
+    job = db.get(OCRJob, "a")
+    assert (job.status, job.attempts, job.progress) == ("running", 1, 10)
+
+
+def test_job_claimed_by_another_worker_in_between_is_skipped(db):
+    _queue(db, "a")
+    raced = []
+
+    def other_worker_claims(conn, cursor, statement, parameters, context, executemany):
+        # Another worker's claim commits after this one selected its candidates
+        if statement.lstrip().upper().startswith("UPDATE OCR_JOBS") and not raced:
+            raced.append(statement)
+            with database.engine.connect() as other:
+                other.execute(text("UPDATE ocr_jobs SET status = 'running' WHERE id = 'a'"))
+                other.commit()
+
+    event.listen(database.engine, "before_cursor_execute", other_worker_claims)
+    try:
+        assert OCRJobRunner()._claim(5) == []
+    finally:
+        event.remove(database.engine, "before_cursor_execute", other_worker_claims)
+    db.expire_all()
+    assert db.get(OCRJob, "a").attempts == 0
+
+
+def test_claim_fails_jobs_out_of_attempts(db, monkeypatch):
+    monkeypatch.setattr("app.services.ocr_jobs.OCR_JOB_MAX_ATTEMPTS", 2)
+    _queue(db, "a", attempts=2)
+
+    assert OCRJobRunner()._claim(5) == []
+    db.expire_all()
+    job = db.get(OCRJob, "a")
+    assert (job.status, job.error) == ("failed", "Maximum number of attempts exceeded")
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from app.services import ocr_preprocess  # noqa: E402
+
+
+def _text_image(height: int, width: int, lines: int) -> np.ndarray:
+    image = np.full((height, width), 255, np.uint8)
+    for line in range(lines):
+        cv2.putText(image, "TOPLAM 1.234,56 TL FATURA NO 0042 KDV %20", (20, 40 + 50 * line),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return image
+
+
+def test_wide_short_image_is_preprocessed():
+    binary, report = ocr_preprocess.preprocess_page(_text_image(60, 1200, 1), dpi=300)
+
+    assert binary.shape == (60, 1200)
+    assert not report["deskewed"]
+
+
+def test_skew_is_estimated_on_a_page():
+    page = _text_image(1400, 1000, 25)
+    matrix = cv2.getRotationMatrix2D((500, 700), 3.0, 1.0)
+    rotated = cv2.warpAffine(page, matrix, (1000, 1400), borderValue=255)
+
+    assert ocr_preprocess.estimate_skew(rotated) == pytest.approx(3.0, abs=0.3)
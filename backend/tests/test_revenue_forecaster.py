@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.services import revenue_forecaster
+from app.services.revenue_forecaster import HoltWintersForecaster, PORTFOLIO, RevenueFitCache
+
+START = date(2025, 1, 1)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Daily revenue served to the fit cache instead of the rollup table"""
+    rng = np.random.default_rng(7)
+    days = {"series": 500 + rng.normal(0, 20, 200).clip(-400)}
+
+    def load_series(db, scope, start, today):
+        return days["series"][:(today - start).days].copy()
+
+    monkeypatch.setattr(revenue_forecaster, "load_series", load_series)
+    monkeypatch.setattr(revenue_forecaster, "history_start", lambda db, scope, today: START)
+    return days
+
+
+def test_late_invoice_on_an_extended_day_reaches_the_forecast(history):
+    cache = RevenueFitCache()
+    fitted_until = START + timedelta(days=120)
+    cache.get(None, HoltWintersForecaster, PORTFOLIO, 30, fitted_until)
+
+    today = fitted_until + timedelta(days=3)
+    model, _ = cache.get(None, HoltWintersForecaster, PORTFOLIO, 30, today)
+    before = model.forecast(30).mean()
+
+    # An invoice dated yesterday, entered today: same series length, new tail
+    history["series"][(today - START).days - 1] += 500_000
+    model, series = cache.get(None, HoltWintersForecaster, PORTFOLIO, 30, today)
+
+    assert cache.full_fits == 1
+    assert model.forecast(30).mean() > before
+    assert model.forecast(30) == pytest.approx(_extended(series, fitted_until).forecast(30))
+
+
+def _extended(series, fitted_until):
+    model = HoltWintersForecaster()
+    model.fit(series[:(fitted_until - START).days], START, 30)
+    model.extend(series)
+    return model
+
+
+def test_unknown_forecaster_setting_is_rejected():
+    assert revenue_forecaster._configured_forecaster("moving_average") is revenue_forecaster.MovingAverageForecaster
+    with pytest.raises(ValueError, match="holt_winters, moving_average"):
+        revenue_forecaster._configured_forecaster("arima")